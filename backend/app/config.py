@@ -15,6 +15,130 @@ class Settings(BaseSettings):
     
     # Redis (Railway compatible)
     REDIS_URL: str = ""  # Set via Railway Redis plugin or local: redis://localhost:6379
+    REDIS_CLIENT: str = "async"  # "async" (redis.asyncio) or "sync" (blocking client, fallback only)
+    REDIS_MAX_CONNECTIONS: int = 50  # Shared pool size per worker
+    REDIS_POOL_TIMEOUT: float = 1.0  # Seconds to wait for a free pooled connection
+    REDIS_CONNECT_TIMEOUT: float = 1.0
+    REDIS_SOCKET_TIMEOUT: float = 0.5
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30  # Seconds an idle connection may sit before it is pinged on reuse
+    REDIS_RETRY_INTERVAL: float = 5.0  # Seconds to serve from memory after a connection failure
+
+    # In-memory cache (used without Redis and during Redis outages)
+    MEMORY_CACHE_MAX_ENTRIES: int = 10000
+    MEMORY_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    MEMORY_CACHE_SWEEP_INTERVAL: float = 60.0  # Seconds between full sweeps of expired entries
+
+    # Per-process L1 cache in front of Redis
+    CACHE_L1_ENABLED: bool = True
+    CACHE_L1_MAX_ENTRIES: int = 5000
+    CACHE_L1_MAX_BYTES: int = 32 * 1024 * 1024
+    CACHE_L1_TTL: float = 30.0  # Upper bound on L1 staleness if an invalidation is missed
+    CACHE_INVALIDATION_CHANNEL: str = "cache:invalidate"  # Redis pub/sub channel shared by all workers
+
+    # yt-dlp extraction executor
+    EXTRACTION_EXECUTOR: str = "thread"  # "thread" or "process"
+    EXTRACTION_MAX_WORKERS: int = 8
+    EXTRACTION_SEARCH_CONCURRENCY: int = 3  # Max search extractions in flight per worker
+    EXTRACTION_STREAM_CONCURRENCY: int = 5  # Max stream extractions in flight per worker
+    EXTRACTION_SEARCH_TIMEOUT: float = 20.0  # Seconds, including time spent queued
+    EXTRACTION_STREAM_TIMEOUT: float = 30.0
+    YDL_POOL_MAX_USES: int = 100  # Recycle a pooled YoutubeDL instance after this many extractions
+    YDL_POOL_MAX_IDLE: int = 8  # Warm instances kept per options profile, per process
+
+    # Stream URL resolution
+    STREAM_DISTRIBUTED_LOCK: bool = False  # Only one worker in the fleet extracts a given video at a time
+    STREAM_LOCK_LEASE_MS: int = 15000  # Lease on the per-video extraction lock
+    STREAM_LOCK_POLL_INTERVAL: float = 0.1  # Seconds between cache checks while another worker extracts
+    STREAM_URL_EXPIRY_MARGIN: int = 300  # Seconds subtracted from the URL's own `expire` for the cache TTL
+    STREAM_CACHE_DEFAULT_TTL: int = 600  # Used when the URL carries no expiry
+    STREAM_CACHE_MAX_TTL: int = 6 * 3600
+    STREAM_STALE_WINDOW: int = 900  # Last N seconds of an entry's life are served stale while refreshing
+    STREAM_BATCH_MAX_IDS: int = 50  # Max video IDs per /stream/batch request
+    STREAM_BATCH_CONCURRENCY: int = 4  # Cache misses resolved in parallel per batch request
+    NEGATIVE_CACHE_TTL: int = 900  # Remember removed/private/geo-blocked/age-gated videos this long
+    NEGATIVE_CACHE_TRANSIENT_TTL: int = 30  # Remember upstream failures (429s, network errors) this long
+
+    # Stream prefetch for upcoming queue entries
+    PREFETCH_ENABLED: bool = True
+    PREFETCH_AHEAD: int = 3  # Queue entries to warm after the current song
+    PREFETCH_CONCURRENCY: int = 1  # Prefetch extractions in flight per worker
+    PREFETCH_RATE_PER_MINUTE: int = 30  # Prefetch budget of each worker process (a deployment's total is workers x this)
+    PREFETCH_RESERVE_SLOTS: int = 2  # Stream extraction slots always left to interactive requests
+    PREFETCH_QUEUE_SIZE: int = 200
+
+    # Circuit breaker around yt-dlp
+    BREAKER_FAILURE_THRESHOLD: float = 0.5  # Failure rate that opens the circuit
+    BREAKER_MIN_CALLS: int = 10  # Calls needed in the window before the rate counts
+    BREAKER_WINDOW: float = 60.0  # Seconds of history the failure rate covers
+    BREAKER_RESET_TIMEOUT: float = 30.0  # Seconds to fail fast before a trial call
+
+    # Search result cache
+    SEARCH_CACHE_TTL: int = 1800
+    SEARCH_REFRESH_TOP_N: int = 50  # Most popular queries kept warm in the background
+    SEARCH_REFRESH_INTERVAL: float = 60.0
+    SEARCH_REFRESH_AHEAD: int = 300  # Refresh popular entries this many seconds before they expire
+    SEARCH_STREAM_EARLY_MIN_SCORE: int = 0  # Streaming search only sends results scoring at least this before the final list
+
+    # Trending shelf (shared by all users, refreshed by one worker at a time)
+    TRENDING_REFRESH_INTERVAL: int = 1800  # Whole seconds: also part of the snapshot's Redis TTL
+    TRENDING_SNAPSHOT_TTL: int = 86400  # Snapshots outlive failed refreshes by this much
+    TRENDING_SIZE: int = 50  # Results kept per snapshot
+    TRENDING_COUNTRIES: str = ""  # Comma-separated onboarding `country` values that get their own shelf, e.g. "India,US"
+
+    # Home view
+    HOME_CACHE_TTL: int = 120  # Per-user cache of the assembled home payload
+    HOME_SECTION_TIMEOUT: float = 3.0  # A section slower than this is served empty
+
+    # ALS model serving
+    ML_FACTORS_DIR: str = "models/als"  # Versioned .npy factor exports, memory-mapped by every worker
+    ML_RELOAD_CHECK_INTERVAL: float = 30.0  # Seconds between checks for a newly published version
+    ML_KEEP_VERSIONS: int = 3
+    ML_INGEST_PAGE_SIZE: int = 1000  # History entries fetched per request when reading interactions for training
+    ML_FOLD_IN_HISTORY: int = 200  # Recent plays used to solve a user's vector against fixed item factors
+    ML_FOLD_IN_TTL: int = 300  # Seconds a folded-in vector for a new user is reused (dropped on their next play)
+    ML_UPDATE_CONCURRENCY: int = 20  # Parallel history reads in the partial retrain
+
+    # Implicit-feedback weights aggregated from analytics events
+    FEEDBACK_PATH: str = "models/feedback.npz"  # Columnar (user, item) aggregates + per-user read checkpoints
+    FEEDBACK_SKIP_RATIO: float = 0.3  # Plays ending before this share of the track count as skips
+    FEEDBACK_LIKE_WEIGHT: float = 5.0  # Confidence added by a like (a full play adds 1)
+    FEEDBACK_SKIP_WEIGHT: float = 1.0  # Confidence removed per skip
+
+    # Background ALS training (one node at a time, in a child process)
+    ML_TRAIN_INTERVAL: float = 86400.0  # Retrain when the published model is older than this; 0 disables the in-app scheduler
+    ML_TRAIN_CHECK_INTERVAL: float = 300.0  # Seconds between "is a training due?" checks per worker
+    ML_TRAIN_RETRY_INTERVAL: float = 1800.0  # Wait after a failed training before trying again
+    ML_TRAIN_LEASE_TTL: int = 60  # Leader lease in seconds, renewed every third of it while training runs
+    ML_TRAIN_TIMEOUT: float = 3600.0  # Wall-clock limit before the training process is killed
+    ML_TRAIN_THREADS: int = 2  # BLAS/OpenMP threads for the training process
+    ML_TRAIN_NICE: int = 10  # Added to the training process's nice value
+    ML_TRAIN_MAX_CPU_SECONDS: int = 0  # RLIMIT_CPU for the training process (0 = no limit)
+    ML_TRAIN_PROGRESS_EVERY: int = 1_000_000  # Interactions read between progress reports
+    ML_RELOAD_CHANNEL: str = "ml:reload"  # Pub/sub channel telling workers a new version was published
+
+    # Item-item similarity over ALS item factors
+    SIMILARITY_EXACT_MAX_ITEMS: int = 50000  # Up to this many items, brute force; above, the IVF index built at training time
+    SIMILARITY_IVF_LISTS: int = 0  # 0 = about sqrt(n_items)
+    SIMILARITY_IVF_PROBES: int = 8  # Lists scanned per query (recall vs speed)
+
+    # Character n-gram index over catalog titles/artists (similar tracks the ALS model doesn't know)
+    CONTENT_INDEX_PATH: str = "models/content_index.npz"  # Rebuilt from the catalog after each full training
+    CONTENT_SYNC_INTERVAL: float = 60.0  # Seconds between appends of songs cataloged since the last sync
+    CONTENT_SYNC_BATCH: int = 5000  # Catalog rows read per query while catching up
+
+    # Nightly "Made For You" precompute (app/jobs/made_for_you.py)
+    MFY_SIZE: int = 10
+    MFY_BATCH_SIZE: int = 1000  # Users recommended, hydrated and cached per round
+    # Score matrix per batch matrix multiply; users per multiply = this / (12 bytes x catalog items)
+    ML_SCORE_MEMORY_MB: int = 64
+    MFY_CACHE_TTL: int = 26 * 3600  # Outlives one nightly run
+
+    # Local song metadata catalog
+    CATALOG_DB_PATH: str = "models/catalog.db"
+    CATALOG_FLUSH_INTERVAL: float = 1.0  # Seconds new catalog rows are buffered before one batched write
+
+    # Video quality scoring
+    SCORING_KEYWORDS_FILE: str | None = None  # JSON {"title": {keyword: weight}, "channel": {...}} replacing the built-in weights
 
     class Config:
         env_file = ".env"
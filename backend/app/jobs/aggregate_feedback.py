@@ -0,0 +1,83 @@
+"""
+Implicit-feedback aggregation.
+
+    python -m app.jobs.aggregate_feedback
+
+Reads the analytics play and feedback events pushed since the previous run
+(per-user checkpoints in FEEDBACK_PATH), folds them into the per (user,
+item) aggregates and rewrites FEEDBACK_PATH, whose confidence weights
+MLService trains on. The training process runs this first, so it only
+needs scheduling separately to keep the file fresher than training.
+"""
+import asyncio
+import logging
+import time
+from firebase_admin import db
+from app.config import settings
+from app.firebase import initialize_firebase
+from app.utils.cache import cache
+from app.utils.feedback_store import FeedbackStore
+from app.utils.rtdb import child_keys, iter_child_pages
+
+logger = logging.getLogger(__name__)
+
+AGGREGATE_LOCK = "ml:feedback"
+
+async def aggregate(path: str) -> dict:
+    """One incremental pass over analytics/{uid}/events and /feedback."""
+    started = time.monotonic()
+    store = FeedbackStore.load(path)
+    stats = {"users": 0, "plays": 0, "feedback": 0}
+
+    for uid in await child_keys(db.reference('analytics')):
+        last_event, last_feedback = store.checkpoints.get(uid, (None, None))
+        before = stats["plays"] + stats["feedback"]
+
+        async for entries in iter_child_pages(db.reference(f'analytics/{uid}/events'),
+                                              settings.ML_INGEST_PAGE_SIZE, after=last_event):
+            for _, event in entries:
+                if isinstance(event, dict) and event.get("type", "play") == "play":
+                    store.add_play(uid, event.get("song_id"), event.get("duration_played"),
+                                   event.get("duration"), settings.FEEDBACK_SKIP_RATIO)
+                    stats["plays"] += 1
+            last_event = entries[-1][0]
+
+        async for entries in iter_child_pages(db.reference(f'analytics/{uid}/feedback'),
+                                              settings.ML_INGEST_PAGE_SIZE, after=last_feedback):
+            for _, event in entries:
+                if isinstance(event, dict):
+                    store.add_feedback(uid, event.get("song_id"), event.get("feedback"))
+                    stats["feedback"] += 1
+            last_feedback = entries[-1][0]
+
+        if stats["plays"] + stats["feedback"] > before:
+            stats["users"] += 1
+            store.checkpoints[uid] = (last_event, last_feedback)
+
+    # Aggregates and checkpoints are written together, so a failed run is simply redone
+    store.save(path, settings.FEEDBACK_LIKE_WEIGHT, settings.FEEDBACK_SKIP_WEIGHT)
+    stats.update(pairs=len(store), seconds=round(time.monotonic() - started, 2))
+    logger.info(f"📊 Feedback aggregated: {stats}")
+    return stats
+
+async def run() -> dict:
+    """aggregate() unless another process is already doing it (they would count events twice)."""
+    token = await cache.acquire_lock(AGGREGATE_LOCK, int(settings.ML_TRAIN_TIMEOUT * 1000))
+    if token is None:
+        logger.info("Feedback aggregation already running elsewhere, skipping")
+        return {}
+    try:
+        return await aggregate(settings.FEEDBACK_PATH)
+    finally:
+        await cache.release_lock(AGGREGATE_LOCK, token)
+
+async def main():
+    initialize_firebase()
+    try:
+        await run()
+    finally:
+        await cache.close()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
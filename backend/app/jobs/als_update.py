@@ -0,0 +1,32 @@
+"""
+Partial ALS retrain.
+
+    python -m app.jobs.als_update
+
+Meant to run every few minutes between full trainings: re-solves the user
+factors of everyone who played something since the published version's
+watermark (adding users who joined since) against the fixed item factors,
+and publishes the result as a new version that every worker picks up.
+Skipped while a full training holds the ml:train lease.
+"""
+import asyncio
+import logging
+from app.firebase import initialize_firebase
+from app.services.ml_service import ml_service
+from app.utils.cache import cache
+
+logger = logging.getLogger(__name__)
+
+async def run() -> dict:
+    return await ml_service.update_als_model() or {}
+
+async def main():
+    initialize_firebase()
+    try:
+        await run()
+    finally:
+        await cache.close()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,56 @@
+"""
+Nightly "Made For You" precompute.
+
+    python -m app.jobs.made_for_you
+
+Scores every user in the published ALS model with MLService.recommend_batch,
+hydrates the IDs from the song catalog and caches the lists as mfy:{uid},
+which the home view serves before falling back to live recommendations.
+Needs REDIS_URL: without Redis the results would die with this process.
+"""
+import asyncio
+import logging
+import time
+from app.config import settings
+from app.services.catalog_service import catalog_service
+from app.services.ml_service import ml_service
+from app.utils.cache import cache
+
+logger = logging.getLogger(__name__)
+
+async def run() -> dict:
+    started = time.monotonic()
+    user_ids = ml_service.known_users()
+    stats = {"users": len(user_ids), "cached": 0, "empty": 0}
+
+    for start in range(0, len(user_ids), settings.MFY_BATCH_SIZE):
+        chunk = user_ids[start:start + settings.MFY_BATCH_SIZE]
+        recs = ml_service.recommend_batch(chunk, n=settings.MFY_SIZE)
+        songs = await catalog_service.get_many(vid for ids in recs.values() for vid in ids)
+
+        writes = []
+        for uid in chunk:
+            hydrated = [songs[vid] for vid in recs.get(uid, []) if vid in songs]
+            if not hydrated:
+                stats["empty"] += 1
+                continue
+            writes.append(cache.set(f"mfy:{uid}", hydrated, ttl=settings.MFY_CACHE_TTL))
+        await asyncio.gather(*writes)
+        stats["cached"] += len(writes)
+
+    stats["seconds"] = round(time.monotonic() - started, 2)
+    logger.info(f"🎧 Made For You precomputed: {stats}")
+    return stats
+
+async def main():
+    if not cache.use_redis:
+        logger.warning("REDIS_URL is not set; precomputed lists won't be visible to the web workers")
+    try:
+        await run()
+    finally:
+        await catalog_service.close()
+        await cache.close()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+"""
+Full ALS training.
+
+    python -m app.jobs.train            # train now if no other node is training (cron / manual)
+    python -m app.jobs.train --worker   # the training process itself (spawned by TrainingService)
+
+Either way the training runs in a child process with BLAS threads capped
+(see TrainingService). The worker lowers its own CPU priority and applies
+ML_TRAIN_MAX_CPU_SECONDS first thing, rather than in a preexec_fn of the
+threaded parent. After publishing the
+factors, the worker also rebuilds the content index from the catalog. The worker prints one JSON
+object per line on stdout: progress updates, then {"stage": "done", ...}
+with the published version and timings. Logs go to stderr.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import sys
+from app.config import settings
+from app.firebase import initialize_firebase
+from app.jobs import aggregate_feedback
+from app.services.ml_service import ml_service
+from app.services.training_service import training_service
+from app.utils.cache import cache
+
+logger = logging.getLogger(__name__)
+
+def _emit(**update):
+    print(json.dumps(update), flush=True)
+
+def _limit_self():
+    if settings.ML_TRAIN_MAX_CPU_SECONDS:
+        limit = settings.ML_TRAIN_MAX_CPU_SECONDS
+        resource.setrlimit(resource.RLIMIT_CPU, (limit, limit))
+    if not settings.ML_TRAIN_NICE:
+        return
+    # Linux nice values are per thread, and BLAS starts its pool on import: renice all of them
+    priority = min(os.getpriority(os.PRIO_PROCESS, 0) + settings.ML_TRAIN_NICE, 19)
+    try:
+        threads = [int(tid) for tid in os.listdir("/proc/self/task")]
+    except OSError:
+        threads = [0]
+    for tid in threads:
+        try:
+            os.setpriority(os.PRIO_PROCESS, tid, priority)
+        except OSError:
+            pass  # Thread already exited
+
+async def run_worker() -> int:
+    initialize_firebase()
+    _emit(stage="aggregating")
+    try:
+        await aggregate_feedback.run()
+    except Exception as e:
+        # Train on the weights from the previous aggregation
+        logger.error(f"Feedback aggregation failed: {e}")
+    stats = await ml_service.train_als_model(progress=_emit)
+    if not stats:
+        return 1
+    _emit(stage="indexing")
+    try:
+        stats["content_index"] = await asyncio.to_thread(ml_service.rebuild_content_index)
+    except Exception as e:
+        # Workers keep the previous index and append new songs to it
+        logger.error(f"Content index rebuild failed: {e}")
+    _emit(stage="done", **stats)
+    return 0
+
+async def main(worker: bool) -> int:
+    if worker:
+        _limit_self()
+        return await run_worker()
+    try:
+        result = await training_service.run_if_due(force=True)
+        if result is None:
+            logger.warning("Training not run: another node holds the lease, or it failed (see ml:train:status)")
+            return 1
+        return 0
+    finally:
+        await cache.close()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--worker", action="store_true")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.worker)))
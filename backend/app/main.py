@@ -3,6 +3,13 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
 from app.routes import auth, search, stream, user, library, playlist, recommendations, player, admin, ws, test
 from app.firebase import initialize_firebase
+from app.utils.executor import extraction_executor
+from app.utils.cache import cache
+from app.services.search_service import search_service
+from app.services.prefetch_service import prefetch_service
+from app.services.catalog_service import catalog_service
+from app.services.trending_service import trending_service
+from app.services.training_service import training_service
 
 app = FastAPI(
     title=settings.APP_NAME,
@@ -39,6 +46,21 @@ app.include_router(test.router)  # Test endpoints (remove in production)
 @app.on_event("startup")
 async def startup_event():
     initialize_firebase()
+    training_service.start()  # Subscribes to model reloads, so before cache.start()
+    await cache.start()
+    search_service.start()
+    prefetch_service.start()
+    trending_service.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    search_service.stop()
+    prefetch_service.stop()
+    trending_service.stop()
+    training_service.stop()
+    extraction_executor.shutdown()
+    await catalog_service.close()
+    await cache.close()
 
 @app.get("/")
 async def root():
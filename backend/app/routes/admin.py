@@ -1,4 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException
+from app.utils.executor import extraction_executor
+from app.services.yt_service import yt_service
+from app.services.search_service import search_service
+from app.services.prefetch_service import prefetch_service
+from app.services.catalog_service import catalog_service
+from app.services.trending_service import trending_service
+from app.services.similarity_service import similarity_service
+from app.services.training_service import training_service
+from app.utils.cache import cache
+from app.utils.ytdl import pool_stats
 
 # Todo: Add Admin role check dependency
 router = APIRouter(prefix="/admin", tags=["Admin"])
@@ -6,3 +16,20 @@ router = APIRouter(prefix="/admin", tags=["Admin"])
 @router.get("/stats")
 async def get_stats():
     return {"users": 0, "songs": 0}
+
+@router.get("/metrics")
+async def get_metrics():
+    return {
+        "cache": cache.stats(),
+        "extraction": extraction_executor.stats(),
+        "ydl_pools": pool_stats(),  # This process only; empty with the process executor
+        "stream_singleflight": yt_service.stream_flight.stats(),
+        "stream_cache": yt_service.stream_cache_stats(),
+        "youtube_breaker": yt_service.breaker.stats(),
+        "search_cache": search_service.stats,
+        "prefetch": prefetch_service.get_stats(),
+        "catalog": catalog_service.get_stats(),
+        "trending": trending_service.stats,
+        "similarity": similarity_service.stats,
+        "training": dict(training_service.stats, status=await training_service.get_status()),
+    }
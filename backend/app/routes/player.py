@@ -4,6 +4,7 @@ from app.auth_utils import get_current_user
 from models.schemas import PlaybackState
 from app.services.rec_service import rec_service
 from app.services.user_service import user_service
+from app.services.prefetch_service import prefetch_service
 
 router = APIRouter(prefix="/player", tags=["Player"])
 
@@ -24,6 +25,9 @@ async def generate_queue(current_song: PlaybackState, user = Depends(get_current
         
         # Broadcast to devices
         await manager.send_personal_message({"type": "QUEUE_UPDATE", "data": queue}, user['uid'])
+
+        # Warm stream URLs for the first few tracks in the background
+        prefetch_service.schedule([song.get('id') for song in queue])
         
         return {"queue": queue}
     except Exception as e:
@@ -35,4 +39,7 @@ async def get_now_playing(user = Depends(get_current_user)):
 
 @router.post("/now-playing")
 async def update_now_playing(state: PlaybackState, user = Depends(get_current_user)):
+    # Playback moved on: warm the tracks that follow in the stored queue
+    playback = await user_service.get_playback_state(user['uid'])
+    prefetch_service.schedule_after(playback.get('queue') or [], state.song_id)
     return {"status": "updated"}
@@ -1,8 +1,15 @@
+import json
+import logging
 from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi.responses import StreamingResponse
 from app.auth_utils import get_current_user
 from app.services.search_service import search_service
+from app.utils.circuit_breaker import CircuitOpenError
+from app.utils.executor import ExtractionTimeout
 from typing import Optional
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/search", tags=["Search"])
 
 @router.get("/")
@@ -17,9 +24,58 @@ async def search_songs(q: str, limit: int = 10, user = Depends(get_current_user)
         # The service now handles deduplication and strict filtering
         results = await search_service.search(q, limit)
         return results
+    except ExtractionTimeout:
+        raise HTTPException(status_code=504, detail="Search timed out")
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Search temporarily unavailable",
+            headers={"Retry-After": str(int(e.retry_after) + 1)},
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/stream")
+async def search_songs_stream(
+    q: str,
+    limit: int = 10,
+    format: str = Query("ndjson", pattern="^(ndjson|sse)$"),
+    user = Depends(get_current_user),
+):
+    """
+    Streaming Search: sends good results as soon as YouTube returns them,
+    then the final re-ranked list (NDJSON lines or SSE events).
+    Errors arrive as a last {"type": "error", "status_code": ...} event,
+    since the response has already started.
+    """
+    async def events():
+        if not q:
+            yield {"type": "final", "results": []}
+            return
+        try:
+            async for event in search_service.search_stream(q, limit):
+                yield event
+        except ExtractionTimeout:
+            yield {"type": "error", "detail": "Search timed out", "status_code": 504}
+        except CircuitOpenError as e:
+            yield {"type": "error", "detail": "Search temporarily unavailable",
+                   "status_code": 503, "retry_after": int(e.retry_after) + 1}
+        except Exception as e:
+            logger.error(f"Streaming search failed for '{q}': {e}")
+            yield {"type": "error", "detail": str(e), "status_code": 500}
+
+    async def ndjson():
+        async for event in events():
+            yield json.dumps(event) + "\n"
+
+    async def sse():
+        async for event in events():
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+    if format == "sse":
+        return StreamingResponse(sse(), media_type="text/event-stream")
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
 @router.get("/suggestions")
 async def get_suggestions(q: str):
     # For now, suggestions can just be a lighter search or distinct logic
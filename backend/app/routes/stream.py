@@ -1,9 +1,42 @@
-from fastapi import APIRouter, Depends, HTTPException
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from app.auth_utils import get_current_user
+from app.config import settings
+from models.schemas import StreamBatchRequest
 from app.services.stream_service import stream_service
 
 router = APIRouter(prefix="/stream", tags=["Stream"])
 
+@router.post("/batch")
+async def stream_batch(
+    request: StreamBatchRequest,
+    format: str = Query("ndjson", pattern="^(ndjson|sse)$"),
+    user = Depends(get_current_user),
+):
+    """
+    Resolves a queue/playlist worth of streams in one request.
+    Results are streamed back as each video resolves (NDJSON lines or SSE events),
+    in the same shape as GET /stream/{song_id}.
+    """
+    if not request.video_ids:
+        raise HTTPException(status_code=400, detail="video_ids is empty")
+    if len(request.video_ids) > settings.STREAM_BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.STREAM_BATCH_MAX_IDS} video_ids per request")
+
+    async def ndjson():
+        async for item in stream_service.get_stream_batch(request.video_ids):
+            yield json.dumps(item) + "\n"
+
+    async def sse():
+        async for item in stream_service.get_stream_batch(request.video_ids):
+            yield f"event: stream\ndata: {json.dumps(item)}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    if format == "sse":
+        return StreamingResponse(sse(), media_type="text/event-stream")
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
 @router.get("/{song_id}")
 async def stream_song(song_id: str, user = Depends(get_current_user)):
     # In a full app, song_id might map to a database entry which has the yt_video_id
@@ -16,6 +16,7 @@ class AnalyticsService:
                 "artist": song_data.get('artist'),
                 "title": song_data.get('title'),
                 "duration_played": duration_played,
+                "duration": song_data.get('duration'),  # Track length, for completion ratios
                 "timestamp": int(time.time())
             }
             # Log to RTDB for immediate analysis/dashboard
@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# SQLite's default limit on bound parameters is 999
+_LOOKUP_CHUNK = 500
+
+class CatalogService:
+    """
+    Local song metadata catalog, keyed by YouTube video ID.
+
+    Every search result and resolved stream is recorded here, so IDs coming
+    out of the recommender can be turned back into songs without asking
+    YouTube. Rows live in SQLite (WAL, so all workers share one file);
+    writes are buffered for CATALOG_FLUSH_INTERVAL and applied in one
+    transaction off the event loop.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or settings.CATALOG_DB_PATH
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        # video_id -> row, not yet written
+        self._pending: Dict[str, Tuple] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self.stats = {"lookups": 0, "hits": 0, "written": 0, "write_errors": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS songs (
+                    video_id TEXT PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    artist TEXT,
+                    duration INTEGER,
+                    thumbnail TEXT,
+                    updated_at REAL,
+                    channel TEXT
+                ) WITHOUT ROWID
+            """)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(songs)")}
+            if "channel" not in columns:
+                conn.execute("ALTER TABLE songs ADD COLUMN channel TEXT")
+            # Content index catch-up reads songs in update order
+            conn.execute("CREATE INDEX IF NOT EXISTS songs_updated_at ON songs (updated_at)")
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _row(song: Dict[str, Any]) -> Optional[Tuple]:
+        """Catalog row from a search result or stream_data dict (None if it lacks an id/title)."""
+        video_id = song.get('id') or song.get('video_id')
+        title = song.get('title')
+        if not video_id or not title:
+            return None
+        duration = song.get('duration')
+        return (
+            video_id,
+            title,
+            song.get('artist') or song.get('uploader'),
+            int(duration) if duration else None,
+            song.get('thumbnail') or None,
+            song.get('channel') or song.get('uploader'),
+        )
+
+    @staticmethod
+    def _song(row: Tuple) -> Dict[str, Any]:
+        video_id, title, artist, duration, thumbnail = row[:5]
+        return {
+            "id": video_id,
+            "title": title,
+            "artist": artist or "",
+            "duration": duration or 0,
+            "thumbnail": thumbnail or "",
+            "yt_video_id": video_id,
+        }
+
+    def record(self, song: Dict[str, Any]):
+        self.record_many([song])
+
+    def record_many(self, songs: Iterable[Dict[str, Any]]):
+        """Queues songs for the catalog. Never blocks; the write happens in the next flush."""
+        for song in songs:
+            row = self._row(song) if song else None
+            if row:
+                self._pending[row[0]] = row
+        if not self._pending or self._flush_task is not None:
+            return
+        try:
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+        except RuntimeError:
+            # No loop (scripts): write right away
+            rows, self._pending = list(self._pending.values()), {}
+            self._write(rows)
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(settings.CATALOG_FLUSH_INTERVAL)
+        finally:
+            self._flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        if not self._pending:
+            return
+        rows, self._pending = list(self._pending.values()), {}
+        await asyncio.to_thread(self._write, rows)
+
+    def _write(self, rows: List[Tuple]):
+        try:
+            with self._lock:
+                conn = self._connect()
+                with conn:
+                    # Stamped at write time, not when queued, so songs_since readers never miss a row
+                    # that was queued before their watermark but written after it
+                    now = time.time()
+                    # Keep known fields when a newer source lacks them (e.g. flat search entries)
+                    conn.executemany("""
+                        INSERT INTO songs (video_id, title, artist, duration, thumbnail, channel, updated_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT(video_id) DO UPDATE SET
+                            title = excluded.title,
+                            artist = COALESCE(excluded.artist, songs.artist),
+                            duration = COALESCE(excluded.duration, songs.duration),
+                            thumbnail = COALESCE(excluded.thumbnail, songs.thumbnail),
+                            channel = COALESCE(excluded.channel, songs.channel),
+                            updated_at = excluded.updated_at
+                    """, [row + (now,) for row in rows])
+            self.stats["written"] += len(rows)
+        except sqlite3.Error as e:
+            self.stats["write_errors"] += 1
+            logger.error(f"Catalog write failed ({len(rows)} rows): {e}")
+
+    def _read(self, video_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        found = {}
+        with self._lock:
+            conn = self._connect()
+            for i in range(0, len(video_ids), _LOOKUP_CHUNK):
+                chunk = video_ids[i:i + _LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                for row in conn.execute(
+                    f"SELECT video_id, title, artist, duration, thumbnail FROM songs WHERE video_id IN ({placeholders})",
+                    chunk,
+                ):
+                    found[row[0]] = self._song(row)
+        return found
+
+    def songs_since(self, since: float, limit: int) -> List[Tuple[str, str, str, str, float]]:
+        """
+        (video_id, title, artist, channel, updated_at) of up to `limit` songs
+        written after `since`, oldest first. Blocking.
+        """
+        with self._lock:
+            conn = self._connect()
+            return conn.execute(
+                "SELECT video_id, title, artist, channel, updated_at FROM songs WHERE updated_at > ? "
+                "ORDER BY updated_at LIMIT ?",
+                (since, limit),
+            ).fetchall()
+
+    def iter_songs(self, page_size: int) -> Iterator[List[Tuple[str, str, str, str, float]]]:
+        """Every song as pages of (video_id, title, artist, channel, updated_at), in video_id order. Blocking."""
+        after = ""
+        while True:
+            with self._lock:
+                page = self._connect().execute(
+                    "SELECT video_id, title, artist, channel, updated_at FROM songs WHERE video_id > ? "
+                    "ORDER BY video_id LIMIT ?",
+                    (after, page_size),
+                ).fetchall()
+            if not page:
+                return
+            yield page
+            after = page[-1][0]
+
+    async def get_many(self, video_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Metadata for the known video IDs among video_ids (primary-key lookups, one query per 500)."""
+        video_ids = [vid for vid in dict.fromkeys(video_ids) if vid]
+        found = {vid: self._song(self._pending[vid]) for vid in video_ids if vid in self._pending}
+        missing = [vid for vid in video_ids if vid not in found]
+        if missing:
+            try:
+                found.update(await asyncio.to_thread(self._read, missing))
+            except sqlite3.Error as e:
+                logger.error(f"Catalog lookup failed: {e}")
+        self.stats["lookups"] += len(video_ids)
+        self.stats["hits"] += len(found)
+        return found
+
+    async def hydrate(self, video_ids: List[str]) -> List[Dict[str, Any]]:
+        """Songs for video_ids in the same order, skipping IDs the catalog doesn't know."""
+        found = await self.get_many(video_ids)
+        return [found[vid] for vid in video_ids if vid in found]
+
+    def get_stats(self) -> dict:
+        lookups = self.stats["lookups"]
+        return dict(
+            self.stats,
+            pending=len(self._pending),
+            hit_rate=round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+        )
+
+    async def close(self):
+        """Write what's buffered and close the database (app shutdown)."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+catalog_service = CatalogService()
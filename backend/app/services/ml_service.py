@@ -1,24 +1,55 @@
-import pandas as pd
 import numpy as np
 from scipy.sparse import csr_matrix
 import implicit
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from app.config import settings
+from app.services.catalog_service import catalog_service
 from app.services.user_service import user_service
+from app.utils.content_index import ContentIndex, song_text
+from app.utils.interactions import InteractionBuffer
+from app.utils.feedback_store import FeedbackWeights, load_weights
+from app.utils.rtdb import push_key_prefix
+from app.utils.factor_store import ALSFactors, current_version, export_factors, load_factors
+from app.utils.ivf_index import IVFIndex
+import asyncio
 import os
 import pickle
 import logging
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+from app.utils.cache import cache
 
 logger = logging.getLogger(__name__)
 
+ALS_REGULARIZATION = 0.1
+ALS_ITERATIONS = 20
+# Watermarks start this far before the read began: entries pushed while it
+# ran (or stamped by a skewed server clock) are read again, never skipped
+WATERMARK_OVERLAP_MS = 60_000
+# Held by whoever is publishing a new factor version from the current one
+# (full training or partial update), so one can't overwrite the other's
+TRAIN_LOCK = "ml:train"
+# Content index syncs re-read catalog rows written this many seconds before their watermark
+CONTENT_SYNC_OVERLAP = 60.0
+
 class MLService:
     def __init__(self):
         self.model = None
-        self.user_map = {}
+        self.user_map = {}  # Also builds reverse_user_map
         self.item_map = {}
         self.reverse_item_map = {}
-        self.tfidf = TfidfVectorizer(stop_words='english')
-        self.model_path = "models/als_model.pkl"
+        self.model_path = "models/als_model.pkl"  # Legacy pickle, read only if no factor export exists
+        # Memory-mapped factors of the published model version
+        self.factors: Optional[ALSFactors] = None
+        self._reload_checked_at = 0.0
+        # Aggregated confidence weights for fold-in, with the FEEDBACK_PATH mtime they were read at
+        self._feedback: Optional[FeedbackWeights] = None
+        self._feedback_mtime = 0.0
+        # Character n-gram index over catalog songs, loaded on first use
+        self.content_index: Optional[ContentIndex] = None
+        self._content_mtime = 0.0  # Of the index file loaded
+        self._content_synced_at = 0.0  # updated_at of the newest catalog row indexed
+        self._content_checked_at = 0.0
+        self._content_syncing = False
         
         if not os.path.exists("models"):
             os.makedirs("models")
@@ -26,7 +57,26 @@ class MLService:
         # Try loading existing model on init
         self._load_model()
 
+    @property
+    def user_map(self) -> dict:
+        return self._user_map
+
+    @user_map.setter
+    def user_map(self, user_map: dict):
+        # Index -> user id, plus the reverse lookup built once here instead of per request
+        self._user_map = user_map
+        self.reverse_user_map = {v: k for k, v in user_map.items()}
+
     def _load_model(self):
+        try:
+            self.factors = load_factors(settings.ML_FACTORS_DIR)
+        except Exception as e:
+            logger.error(f"Failed to load ALS factors: {e}")
+        if self.factors is not None:
+            logger.info(f"Loaded ALS factors {self.factors.version} "
+                        f"({len(self.factors.user_ids)} users, {len(self.factors.item_ids)} items)")
+            return
+
         if os.path.exists(self.model_path):
             try:
                 with open(self.model_path, 'rb') as f:
@@ -40,56 +90,271 @@ class MLService:
             except Exception as e:
                 logger.error(f"Failed to load ML model: {e}")
 
-    async def train_als_model(self):
+    async def train_als_model(self, progress: Optional[Callable[..., None]] = None) -> Optional[dict]:
         """
         Fetches interaction data from UserService (Firebase) and trains the ALS model.
+        progress(stage=..., **counters) is called as it goes; returns the
+        published version and timings, or None if nothing was published.
         """
-        interactions = await user_service.get_all_interactions()
-        if not interactions:
+        report = progress or (lambda **_: None)
+        stats = {}
+        started = time.monotonic()
+
+        buffer = InteractionBuffer()
+        watermark = push_key_prefix(int(time.time() * 1000) - WATERMARK_OVERLAP_MS)
+        report(stage="reading", interactions=0)
+        next_report = settings.ML_TRAIN_PROGRESS_EVERY
+        try:
+            async for user_id, video_ids in user_service.iter_interactions(settings.ML_INGEST_PAGE_SIZE):
+                buffer.add(user_id, video_ids, weight=1.0)  # Play = 1
+                if len(buffer) >= next_report:
+                    report(stage="reading", interactions=len(buffer))
+                    next_report += settings.ML_TRAIN_PROGRESS_EVERY
+        except Exception as e:
+            # A partial read would publish a model missing users; keep the current one
+            logger.error(f"Error reading interactions for training: {e}")
+            return None
+        # Confidence weights aggregated from analytics (plays, skips, likes) replace plain play counts
+        feedback = load_weights(settings.FEEDBACK_PATH)
+        if feedback is not None and len(feedback):
+            buffer.override_weights(feedback.user_ids.tolist(), feedback.item_ids.tolist(),
+                                    feedback.users, feedback.items, feedback.weights)
+            stats["feedback_pairs"] = len(feedback)
+
+        # implicit expects a user x item matrix
+        matrix = buffer.to_csr()
+        if not matrix.nnz:
             logger.warning("No interactions found for training.")
-            return
+            return None
+        stats["read_seconds"] = round(time.monotonic() - started, 2)
 
-        df = pd.DataFrame(interactions)
-        
-        # Simple implicit feedback weighing
-        # plays=1, likes=5, skips=-1 ?
-        # Ideally, 'weight' column should be pre-calculated or done here.
-        if 'weight' not in df.columns:
-            df['weight'] = 1 # Default weight
-
-        # Create mappings
-        df['user_cat'] = df['user_id'].astype('category')
-        df['item_cat'] = df['video_id'].astype('category')
-        
-        user_ids = df['user_cat'].cat.codes
-        item_ids = df['item_cat'].cat.codes
-        
-        self.user_map = dict(enumerate(df['user_cat'].cat.categories))
-        self.item_map = {id: i for i, id in enumerate(df['item_cat'].cat.categories)}
-        self.reverse_item_map = {i: id for id, i in self.item_map.items()}
-        
-        matrix = csr_matrix((df['weight'], (item_ids, user_ids)))
+        self.user_map = dict(enumerate(buffer.user_ids()))
+        self.item_map = buffer.item_codes
+        self.reverse_item_map = dict(enumerate(buffer.item_ids()))
+
+        stats.update(interactions=len(buffer), users=matrix.shape[0], items=matrix.shape[1])
+        logger.info(f"Training ALS on {len(buffer)} interactions "
+                    f"({matrix.shape[0]} users, {matrix.shape[1]} items)")
+        del buffer
         
         # Train
-        self.model = implicit.als.AlternatingLeastSquares(factors=50, iterations=20, regularization=0.1)
-        self.model.fit(matrix)
+        fit_started = time.monotonic()
+        report(stage="fitting", iteration=0, iterations=ALS_ITERATIONS, **stats)
+        self.model = implicit.als.AlternatingLeastSquares(
+            factors=50, iterations=ALS_ITERATIONS, regularization=ALS_REGULARIZATION)
+        self.model.fit(matrix, show_progress=False,
+                       callback=lambda iteration, elapsed, loss: report(
+                           stage="fitting", iteration=iteration + 1, iterations=ALS_ITERATIONS))
+        stats["fit_seconds"] = round(time.monotonic() - fit_started, 2)
         
-        # Save
-        with open(self.model_path, 'wb') as f:
-            pickle.dump((self.model, self.user_map, self.item_map, self.reverse_item_map), f)
+        # Publish as a new factor version; every worker picks it up from disk
+        export_started = time.monotonic()
+        report(stage="exporting")
+        try:
+            item_factors = self._to_numpy(self.model.item_factors)
+            extras = {}
+            if len(item_factors) > settings.SIMILARITY_EXACT_MAX_ITEMS:
+                # Too many items to brute-force similar-track lookups online
+                extras = IVFIndex.build(item_factors, n_lists=settings.SIMILARITY_IVF_LISTS or None).arrays()
+            version = export_factors(
+                settings.ML_FACTORS_DIR,
+                [self.user_map[i] for i in range(len(self.user_map))],
+                [self.reverse_item_map[i] for i in range(len(self.reverse_item_map))],
+                self._to_numpy(self.model.user_factors),
+                item_factors,
+                keep=settings.ML_KEEP_VERSIONS,
+                extra_arrays=extras,
+                meta={"watermark": watermark, "regularization": ALS_REGULARIZATION, "trained_at": time.time()},
+            )
+            self.factors = load_factors(settings.ML_FACTORS_DIR, version)
+        except Exception as e:
+            logger.error(f"Failed to export ALS factors: {e}")
+            return None
+        stats["export_seconds"] = round(time.monotonic() - export_started, 2)
+        stats.update(version=version, seconds=round(time.monotonic() - started, 2))
             
-        logger.info("ALS Model trained and saved.")
+        logger.info(f"ALS Model trained and saved as {version}: {stats}")
+        return stats
+
+    async def update_als_model(self) -> Optional[dict]:
+        """
+        Partial retrain: re-solves the user factors of everyone with history
+        since the current version's watermark (new users included) against
+        the fixed item factors, and publishes the result as a new version.
+        Items first played since the last full training wait for the next one.
+
+        Runs under the ml:train lease, and publishes nothing if another
+        version became current meanwhile: exporting an update of an older
+        version would roll every worker back to it.
+        """
+        lease_ms = int(settings.ML_TRAIN_LEASE_TTL * 1000)
+        token = await cache.acquire_lock(TRAIN_LOCK, lease_ms)
+        if token is None:
+            logger.info("ALS training or another update is running, skipping the partial update")
+            return None
+        keeper = asyncio.create_task(self._keep_lease(token, lease_ms))
+        try:
+            return await self._update_user_factors(keeper)
+        finally:
+            keeper.cancel()
+            await cache.release_lock(TRAIN_LOCK, token)
+
+    @staticmethod
+    async def _keep_lease(token: str, lease_ms: int):
+        """Renews the ml:train lease; returns once it is lost."""
+        while True:
+            await asyncio.sleep(settings.ML_TRAIN_LEASE_TTL / 3)
+            if not await cache.extend_lock(TRAIN_LOCK, token, lease_ms):
+                logger.error("Lost the ml:train lease during the partial ALS update")
+                return
+
+    async def _update_user_factors(self, keeper: asyncio.Task) -> Optional[dict]:
+        self.reload()
+        factors = self.factors
+        watermark = factors.meta.get("watermark") if factors is not None else None
+        if watermark is None:
+            logger.warning("No watermarked ALS factors to update; run a full training first.")
+            return None
+
+        next_watermark = push_key_prefix(int(time.time() * 1000) - WATERMARK_OVERLAP_MS)
+        touched = set()
+        try:
+            async for user_id, _ in user_service.iter_interactions(settings.ML_INGEST_PAGE_SIZE, since=watermark):
+                touched.add(user_id)
+        except Exception as e:
+            logger.error(f"Error reading interactions since {watermark}: {e}")
+            return None
+
+        stats = {"users": len(touched), "updated": 0, "added": 0}
+        if not touched:
+            return stats
+
+        vectors = {}
+        touched = list(touched)
+        for start in range(0, len(touched), settings.ML_UPDATE_CONCURRENCY):
+            chunk = touched[start:start + settings.ML_UPDATE_CONCURRENCY]
+            histories = await asyncio.gather(*(
+                user_service.get_recent_history(uid, settings.ML_FOLD_IN_HISTORY) for uid in chunk
+            ))
+            for uid, history in zip(chunk, histories):
+                vector = self._fold_in(factors, uid, history)
+                if vector is not None:
+                    vectors[uid] = vector
+
+        user_ids = factors.user_ids.tolist()
+        user_factors = np.array(factors.user_factors)  # Writable copy of the mapped rows
+        added = []
+        for uid, vector in vectors.items():
+            row = factors.user_index.get(uid)
+            if row is None:
+                added.append(uid)
+            else:
+                user_factors[row] = vector
+        if added:
+            user_factors = np.vstack([user_factors, np.stack([vectors[uid] for uid in added])])
+        stats["updated"] = len(vectors) - len(added)
+        stats["added"] = len(added)
+
+        if keeper.done():
+            return None
+        if current_version(settings.ML_FACTORS_DIR) != factors.version:
+            logger.warning(f"ALS factors {factors.version} were replaced while updating them, discarding the update")
+            return None
+        try:
+            version = export_factors(
+                settings.ML_FACTORS_DIR,
+                user_ids + added,
+                factors.item_ids.tolist(),
+                user_factors,
+                factors.item_factors,
+                keep=settings.ML_KEEP_VERSIONS,
+                extra_arrays=factors.extras,
+                meta={"watermark": next_watermark, "regularization": self._regularization(factors),
+                      "trained_at": factors.meta.get("trained_at"), "updated_from": factors.version},
+            )
+            self.factors = load_factors(settings.ML_FACTORS_DIR, version)
+        except Exception as e:
+            logger.error(f"Failed to export updated ALS factors: {e}")
+            return None
+        logger.info(f"ALS user factors updated as {version}: {stats}")
+        return stats
+
+    @staticmethod
+    def _regularization(factors: ALSFactors) -> float:
+        return factors.meta.get("regularization", ALS_REGULARIZATION)
+
+    def _feedback_weights(self) -> Optional[FeedbackWeights]:
+        """The aggregated weights full training used, re-read when the file changes."""
+        path = settings.FEEDBACK_PATH
+        mtime = os.path.getmtime(path) if os.path.exists(path) else 0.0
+        if mtime != self._feedback_mtime:
+            try:
+                self._feedback = load_weights(path)
+            except Exception as e:
+                logger.error(f"Failed to read feedback weights: {e}")
+                self._feedback = None
+            self._feedback_mtime = mtime
+        return self._feedback
+
+    def _fold_in(self, factors: ALSFactors, user_id: str, history: list) -> Optional[np.ndarray]:
+        # Same confidences as full training: play counts, replaced (or joined) by the aggregated weights
+        confidence: Dict[str, float] = {}
+        for h in history:
+            vid = h.get('id') if isinstance(h, dict) else None
+            if vid:
+                confidence[vid] = confidence.get(vid, 0.0) + 1.0
+        feedback = self._feedback_weights()
+        if feedback is not None:
+            confidence.update(feedback.for_user(user_id))
+        # Disliked / "not relevant" pairs have weight 0 and must not count as plays
+        pairs = [(vid, weight) for vid, weight in confidence.items() if weight > 0]
+        return factors.fold_in([vid for vid, _ in pairs], [weight for _, weight in pairs],
+                               regularization=self._regularization(factors))
+
+    @staticmethod
+    def _to_numpy(factors) -> np.ndarray:
+        # GPU models keep factors on the device
+        if hasattr(factors, "to_numpy"):
+            factors = factors.to_numpy()
+        return np.asarray(factors, dtype=np.float32)
+
+    def _maybe_reload(self):
+        """Switches to a newly published factor version (checked every ML_RELOAD_CHECK_INTERVAL)."""
+        now = time.monotonic()
+        if now - self._reload_checked_at < settings.ML_RELOAD_CHECK_INTERVAL:
+            return
+        self._reload_checked_at = now
+        self.reload()
+
+    def reload(self, version: Optional[str] = None):
+        """Switches to `version` (default: the one CURRENT names) unless it is already loaded."""
+        version = version or current_version(settings.ML_FACTORS_DIR)
+        if version is None or (self.factors is not None and self.factors.version == version):
+            return
+        try:
+            self.factors = load_factors(settings.ML_FACTORS_DIR, version)
+            logger.info(f"Switched to ALS factors {version}")
+        except Exception as e:
+            # Keep serving the version we have
+            logger.error(f"Failed to load ALS factors {version}: {e}")
 
     def get_recommendations(self, user_id: str, n=10) -> list:
+        self._maybe_reload()
+        if self.factors is not None:
+            # Score straight against the mapped arrays
+            vector = self.factors.user_vector(user_id)
+            if vector is None:
+                return []
+            return self.factors.top_items(vector, n)
+
         if self.model is None:
             return []
 
         # Reverse lookup for user index
-        reverse_user_map = {v: k for k, v in self.user_map.items()}
-        if user_id not in reverse_user_map:
+        if user_id not in self.reverse_user_map:
             return []
             
-        user_idx = reverse_user_map[user_id]
+        user_idx = self.reverse_user_map[user_id]
         
         try:
             # recommend returns (ids, scores)
@@ -99,12 +364,139 @@ class MLService:
             logger.error(f"Recommendation error: {e}")
             return []
 
-    def get_content_similarity(self, song_title: str, artist: str, n=5) -> list:
+    async def recommend(self, user_id: str, n=10) -> list:
+        """
+        get_recommendations, plus fold-in for users who joined after the
+        published version: their vector is solved from recent history
+        against the item factors and cached for ML_FOLD_IN_TTL (dropped
+        when they play something).
+        """
+        recs = self.get_recommendations(user_id, n)
+        if recs or self.factors is None or user_id in self.factors.user_index:
+            return recs
+
+        factors = self.factors
+        key = f"als_fold:{user_id}"
+        cached = await cache.get(key)
+        if cached and cached.get("version") == factors.version:
+            vector = cached["vector"]
+        else:
+            history = await user_service.get_recent_history(user_id, settings.ML_FOLD_IN_HISTORY)
+            folded = self._fold_in(factors, user_id, history)
+            # Remember "nothing to fold" too, so the history isn't re-read every request
+            vector = folded.tolist() if folded is not None else None
+            await cache.set(key, {"version": factors.version, "vector": vector}, ttl=settings.ML_FOLD_IN_TTL)
+        if vector is None:
+            return []
+        return factors.top_items(np.asarray(vector, dtype=np.float32), n)
+
+    def current_factors(self) -> Optional[ALSFactors]:
+        """The published factor version (after checking for a newer one)."""
+        self._maybe_reload()
+        return self.factors
+
+    def known_users(self) -> List[str]:
+        """Users the current model has factors for (everyone with interactions at training time)."""
+        self._maybe_reload()
+        if self.factors is not None:
+            return self.factors.user_ids.tolist()
+        return list(self.reverse_user_map)
+
+    def recommend_batch(self, user_ids: List[str], n=10) -> Dict[str, List[str]]:
+        """
+        Recommendations for many users at once (nightly precompute). Known
+        users are scored in chunks of ML_SCORE_MEMORY_MB, one matrix multiply
+        each; unknown users are left out of the result.
+        """
+        self._maybe_reload()
+        if self.factors is None:
+            recs = {uid: self.get_recommendations(uid, n) for uid in user_ids}
+            return {uid: items for uid, items in recs.items() if items}
+
+        known = [uid for uid in user_ids if uid in self.factors.user_index]
+        if not known:
+            return {}
+        rows = np.fromiter((self.factors.user_index[uid] for uid in known), dtype=np.int64, count=len(known))
+        return dict(zip(known, self.factors.top_items_batch(
+            self.factors.user_factors[rows], n, memory_budget=settings.ML_SCORE_MEMORY_MB << 20)))
+
+    def _sync_content_index(self):
+        """Loads a newer published index file, then appends songs cataloged since. Blocking."""
+        path = settings.CONTENT_INDEX_PATH
+        mtime = os.path.getmtime(path) if os.path.exists(path) else 0.0
+        if mtime > self._content_mtime:
+            index, synced_at = ContentIndex.load(path)
+            self.content_index, self._content_synced_at, self._content_mtime = index, synced_at, mtime
+            logger.info(f"Loaded content index ({len(index)} songs)")
+        elif self.content_index is None:
+            # Nothing published yet: index the catalog as it is
+            self.content_index = ContentIndex()
+
+        index = self.content_index
+        # Re-read a window before the watermark: other processes' writes can commit out of
+        # timestamp order. Songs already indexed with the same text are skipped by append().
+        after = max(self._content_synced_at - CONTENT_SYNC_OVERLAP, 0.0)
+        while True:
+            rows = catalog_service.songs_since(after, settings.CONTENT_SYNC_BATCH)
+            if not rows:
+                break
+            index.append([row[0] for row in rows], [song_text(*row[1:4]) for row in rows])
+            after = rows[-1][4]
+            self._content_synced_at = max(self._content_synced_at, after)
+            if len(rows) < settings.CONTENT_SYNC_BATCH:
+                break
+
+    async def _maybe_sync_content(self):
+        now = time.monotonic()
+        if self._content_syncing or (
+                self.content_index is not None and now - self._content_checked_at < settings.CONTENT_SYNC_INTERVAL):
+            return
+        self._content_syncing = True
+        self._content_checked_at = now
+        try:
+            await asyncio.to_thread(self._sync_content_index)
+        except Exception as e:
+            logger.error(f"Content index sync failed: {e}")
+        finally:
+            self._content_syncing = False
+
+    async def get_content_similarity(self, song_title: str, artist: str, n=5, exclude: Iterable[str] = ()) -> list:
+        """
+        Video ids of the n catalog songs whose title, artist and channel are
+        closest to these (character n-gram TF-IDF cosine), best first. Works for tracks
+        the ALS model has never seen; [] while no index is loaded.
+        """
+        await self._maybe_sync_content()
+        index = self.content_index
+        text = song_text(song_title, artist)
+        if index is None or not len(index) or not text:
+            return []
+        try:
+            results = await asyncio.to_thread(index.query, [text], n, list(exclude))
+        except Exception as e:
+            logger.error(f"Content similarity error: {e}")
+            return []
+        return [video_id for video_id, _ in results[0]]
+
+    def rebuild_content_index(self) -> Optional[dict]:
         """
-        Fallback content-based similarity using TF-IDF on title+artist strings.
-        Realistically needs a corpus of songs. For now, we mock or return empty 
-        if we don't have a loaded song metadata db.
+        Builds the content index from the whole catalog and publishes it to
+        CONTENT_INDEX_PATH (training worker). Every document is weighted with
+        the final idf, which appends alone never do. Blocking.
         """
-        return []
+        started = time.monotonic()
+        ids, texts, synced_at = [], [], 0.0
+        for page in catalog_service.iter_songs(settings.CONTENT_SYNC_BATCH):
+            for video_id, title, artist, channel, updated_at in page:
+                ids.append(video_id)
+                texts.append(song_text(title, artist, channel))
+                synced_at = max(synced_at, updated_at or 0.0)
+        if not ids:
+            return None
+        index = ContentIndex.build(ids, texts)
+        index.save(settings.CONTENT_INDEX_PATH, synced_at)
+        stats = {"songs": len(index), "seconds": round(time.monotonic() - started, 2)}
+        logger.info(f"Content index rebuilt: {stats}")
+        return stats
 
 ml_service = MLService()
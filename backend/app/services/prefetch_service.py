@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import time
+from typing import List, Optional
+from app.config import settings
+from app.services.yt_service import yt_service
+from app.utils.cache import cache
+from app.utils.executor import extraction_executor
+from app.utils.memory_cache import MemoryCache
+
+logger = logging.getLogger(__name__)
+
+class PrefetchService:
+    """
+    Warms the yt_audio: cache for the next few tracks in a user's queue.
+
+    Prefetching is strictly low priority: it only starts an extraction while
+    no interactive stream job is queued and PREFETCH_RESERVE_SLOTS stream
+    slots stay free, and it is capped by a per-worker budget of
+    PREFETCH_RATE_PER_MINUTE extractions. The budget is not shared: with N
+    worker processes (across all nodes) up to N x PREFETCH_RATE_PER_MINUTE
+    prefetches run per minute, so size it for the whole deployment.
+    """
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending: set = set()
+        self._workers: List[asyncio.Task] = []
+        self._tokens = float(settings.PREFETCH_RATE_PER_MINUTE)
+        self._tokens_at = time.monotonic()
+        # Videos this worker warmed, to count how many actually get played
+        self._warmed = MemoryCache(max_entries=10000, max_bytes=10000, sweep_interval=300)
+        self.stats = {"scheduled": 0, "dropped": 0, "already_cached": 0, "warmed": 0, "failed": 0, "hits": 0}
+
+    def schedule(self, video_ids: List[str]):
+        """Queue videos for prefetch (at most PREFETCH_AHEAD of them)."""
+        if not settings.PREFETCH_ENABLED or self._queue is None:
+            return
+        for video_id in video_ids[:settings.PREFETCH_AHEAD]:
+            if not video_id or video_id in self._pending or video_id in self._warmed:
+                continue
+            try:
+                self._queue.put_nowait(video_id)
+            except asyncio.QueueFull:
+                self.stats["dropped"] += 1
+                continue
+            self._pending.add(video_id)
+            self.stats["scheduled"] += 1
+
+    def schedule_after(self, queue: List[dict], current_id: Optional[str]):
+        """Prefetch the entries that follow current_id in a queue of songs."""
+        ids = [song.get('id') for song in queue if isinstance(song, dict)]
+        if current_id in ids:
+            ids = ids[ids.index(current_id) + 1:]
+        self.schedule(ids)
+
+    def note_request(self, video_id: str):
+        """Called for every stream request; counts plays of prefetched tracks."""
+        if video_id in self._warmed:
+            self._warmed.delete(video_id)
+            self.stats["hits"] += 1
+
+    async def _take_budget(self):
+        """Token bucket: waits until the per-minute prefetch budget allows another extraction."""
+        rate = settings.PREFETCH_RATE_PER_MINUTE / 60
+        while True:
+            now = time.monotonic()
+            self._tokens = min(settings.PREFETCH_RATE_PER_MINUTE, self._tokens + (now - self._tokens_at) * rate)
+            self._tokens_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / rate)
+
+    async def _wait_for_idle(self):
+        while not extraction_executor.has_capacity("stream", reserve=settings.PREFETCH_RESERVE_SLOTS):
+            await asyncio.sleep(0.2)
+
+    async def _prefetch(self, video_id: str):
+        if await cache.get(f"yt_audio:{video_id}"):
+            self.stats["already_cached"] += 1
+            return
+
+        await self._take_budget()
+        await self._wait_for_idle()
+        try:
+            if await yt_service.get_stream_url(video_id):
+                self._warmed.set(video_id, True, ttl=settings.STREAM_CACHE_MAX_TTL)
+                self.stats["warmed"] += 1
+            else:
+                self.stats["failed"] += 1
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.debug(f"Prefetch failed for {video_id}: {e}")
+
+    async def _worker(self):
+        while True:
+            video_id = await self._queue.get()
+            try:
+                await self._prefetch(video_id)
+            finally:
+                self._pending.discard(video_id)
+                self._queue.task_done()
+
+    def start(self):
+        """Start the prefetch workers (app startup)."""
+        if settings.PREFETCH_ENABLED and not self._workers:
+            self._queue = asyncio.Queue(maxsize=settings.PREFETCH_QUEUE_SIZE)
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(settings.PREFETCH_CONCURRENCY)]
+
+    def stop(self):
+        for task in self._workers:
+            task.cancel()
+        self._workers = []
+        self._queue = None
+        self._pending.clear()
+
+    def get_stats(self) -> dict:
+        played = self.stats["hits"]
+        warmed = self.stats["warmed"]
+        return dict(
+            self.stats,
+            queued=self._queue.qsize() if self._queue else 0,
+            hit_rate=round(played / warmed, 3) if warmed else 0.0,
+        )
+
+prefetch_service = PrefetchService()
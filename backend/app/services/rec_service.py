@@ -2,67 +2,133 @@ from app.services.yt_service import yt_service
 from app.services.user_service import user_service
 from app.services.ml_service import ml_service
 from app.services.classifier_service import classifier_service
+from app.services.catalog_service import catalog_service
+from app.services.trending_service import trending_service
+from app.services.similarity_service import similarity_service
+import asyncio
+import logging
 import random
+from typing import Any, Awaitable, Callable
+from app.config import settings
+from app.utils.cache import cache
+
+logger = logging.getLogger(__name__)
 
 class RecService:
     async def get_home_recommendations(self, uid: str):
         """
         Generates the 'Home' view content.
         Uses ML model if available, otherwise fallback heuristics.
+
+        Sections are built concurrently, each with HOME_SECTION_TIMEOUT; a
+        slow or failing section comes back empty instead of holding up the
+        page. Complete payloads are cached per user for HOME_CACHE_TTL.
         """
-        profile = await user_service.get_user_profile(uid)
-        onboarding = profile.get('onboarding', {})
-        
-        # 1. Jump Back In
-        jump_back_in = await user_service.get_recent_history(uid, limit=10)
-        
-        # 2. Made For You (ML + Favorites)
+        cache_key = f"home:{uid}"
+        cached = await cache.get(cache_key)
+        if cached:
+            return cached
+
+        degraded = []
+        profile_task = asyncio.ensure_future(
+            self._section("profile", user_service.get_user_profile(uid), None, degraded)
+        )
+
+        async def onboarding() -> dict:
+            profile = await profile_task
+            return (profile or {}).get('onboarding') or {}
+
+        jump_back_in, made_for_you, trending = await asyncio.gather(
+            # 1. Jump Back In
+            self._section("jump_back_in", user_service.get_recent_history(uid, limit=10), [], degraded),
+            # 2. Made For You (ML + Favorites)
+            self._section("made_for_you", self._made_for_you(uid, onboarding), [], degraded),
+            # 3. Trending (shared snapshot, per country where configured)
+            self._section("trending", self._trending(onboarding), [], degraded),
+        )
+
+        home = {
+            "jump_back_in": jump_back_in,
+            "made_for_you": made_for_you,
+            "trending": trending
+        }
+        # Don't pin a degraded page; the next load retries the missing sections
+        if not degraded:
+            await cache.set(cache_key, home, ttl=settings.HOME_CACHE_TTL)
+        return home
+
+    async def _section(self, name: str, coro: Awaitable, default: Any, degraded: list) -> Any:
+        try:
+            return await asyncio.wait_for(coro, settings.HOME_SECTION_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"Home section '{name}' timed out after {settings.HOME_SECTION_TIMEOUT}s")
+        except Exception as e:
+            logger.error(f"Home section '{name}' failed: {e}")
+        degraded.append(name)
+        return default
+
+    async def _made_for_you(self, uid: str, onboarding: Callable[[], Awaitable[dict]]) -> list:
+        # Precomputed by the nightly job
+        made_for_you = await cache.get(f"mfy:{uid}")
+        if made_for_you:
+            return made_for_you
         made_for_you = []
-        
+
         # Try ML first
-        ml_recs = ml_service.get_recommendations(uid, n=10)
+        ml_recs = await ml_service.recommend(uid, n=10)
         if ml_recs:
-            # ml_recs are IDs, need to fetch metadata (mocked here or via Search)
-            for vid in ml_recs:
-                 # Ideally we should have metadata service. For now, search by ID fallback
-                 res = await yt_service.search_videos(vid, limit=1)
-                 if res: made_for_you.append(res[0])
-        
+            # ml_recs are IDs; metadata comes from the local catalog (no YouTube calls)
+            made_for_you = await catalog_service.hydrate(ml_recs)
+
         # Fallback to artists if ML empty
         if not made_for_you:
-            fav_artists = onboarding.get('artists', [])
+            fav_artists = (await onboarding()).get('artists', [])
             if fav_artists:
                 seed_artist = random.choice(fav_artists)
                 made_for_you = await yt_service.search_videos(f"{seed_artist} mix", limit=10)
-            
-        # 3. Trending (Global)
-        trending = await yt_service.search_videos("Global Top 50 Music", limit=10)
-        
-        return {
-            "jump_back_in": jump_back_in,
-            "made_for_you": made_for_you,
-            "trending": trending
-        }
+        return made_for_you
+
+    async def _trending(self, onboarding: Callable[[], Awaitable[dict]]) -> list:
+        return await trending_service.get_trending((await onboarding()).get('country'), limit=10)
 
     async def generate_smart_queue(self, current_song: dict, history: list, limit: int = 20):
         """
         Generates a 'Next Up' queue based on the current song.
         Uses ML similarity or Heuristic fallbacks.
         """
-        # Heuristic: Search for "Related" or "Mix"
-        query = f"{current_song.get('artist')} {current_song.get('title')} official radio"
-        candidates = await yt_service.search_videos(query, limit=50)
+        played_ids = {h.get('id') for h in history if h.get('id')}
+        seed_id = current_song.get('id') or current_song.get('song_id')
+
+        # Item-item similarity over the ALS factors (no YouTube calls)
+        candidates = []
+        if seed_id:
+            # Over-fetch: the artist variety filter below drops some
+            similar_ids = similarity_service.similar_items(seed_id, n=limit * 3, exclude=played_ids)
+            if similar_ids:
+                candidates = await catalog_service.hydrate(similar_ids)
+
+        if not candidates and current_song.get('title'):
+            # Tracks the ALS model doesn't know: nearest titles/artists in the catalog
+            similar_ids = await ml_service.get_content_similarity(
+                current_song.get('title'), current_song.get('artist'), n=limit * 3,
+                exclude=played_ids | {seed_id})
+            if similar_ids:
+                candidates = await catalog_service.hydrate(similar_ids)
+
+        if not candidates:
+            # Heuristic: Search for "Related" or "Mix"
+            query = f"{current_song.get('artist')} {current_song.get('title')} official radio"
+            candidates = await yt_service.search_videos(query, limit=50)
         
         queue = []
         artist_counts = {}
-        played_ids = {h.get('id') for h in history if h.get('id')}
         
         for song in candidates:
             vid = song.get('id')
             artist = song.get('artist', 'Unknown')
             
             # Anti-repetition
-            if vid in played_ids: continue
+            if vid in played_ids or vid == seed_id: continue
             if any(q.get('id') == vid for q in queue): continue
             
             # Classify Channel Trust (Optional check)
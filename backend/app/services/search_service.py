@@ -1,49 +1,170 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import AsyncIterator, List, Optional, Union
+from app.config import settings
 from app.services.yt_service import yt_service
+from app.utils.cache import cache
+from app.utils.dedup import DedupIndex, normalize_title
+from app.utils.singleflight import SingleFlight
+from utils.helpers import normalize_search_query
+
+logger = logging.getLogger(__name__)
 
 class SearchService:
+    def __init__(self):
+        # In-flight searches, keyed by cache key
+        self.search_flight = SingleFlight()
+        # Recent query popularity (decayed every refresh cycle)
+        self.query_counts: Counter = Counter()
+        self.stats = {"hits": 0, "misses": 0, "refreshes": 0}
+        self._refresher: Optional[asyncio.Task] = None
+
     def _normalize_string(self, s: str) -> str:
         """Helper to normalize strings for comparison"""
-        import re
-        if not s: return ""
-        # Remove brackets, non-alphanumeric, etc.
-        s = re.sub(r"[\(\[].*?[\)\]]", "", s) # Remove content inside brackets
-        s = re.sub(r"[^a-zA-Z0-9\s]", "", s) # Remove special chars
-        return s.lower().strip()
-
-    def _is_duplicate(self, item1: dict, item2: dict) -> bool:
-        """Checks if two items are likely the same song"""
-        # 1. Duration check (within 10s)
-        dur1 = item1.get('duration', 0)
-        dur2 = item2.get('duration', 0)
-        if abs(dur1 - dur2) > 10:
-            return False
-            
-        # 2. Title similarity (Exact match on normalized)
-        t1 = self._normalize_string(item1.get('title'))
-        t2 = self._normalize_string(item2.get('title'))
-        
-        return t1 == t2
+        return normalize_title(s)
+
+    def _is_duplicate(self, item: dict, existing: Union[dict, List[dict], DedupIndex]) -> bool:
+        """Checks if item is likely the same song as `existing` (one item, a list, or an index)"""
+        if isinstance(existing, DedupIndex):
+            return item in existing
+        if isinstance(existing, dict):
+            existing = [existing]
+        index = DedupIndex()
+        for other in existing:
+            index.add(other)
+        return item in index
+
+    def _dedupe(self, raw_results: list) -> list:
+        """Keeps the first of each group of duplicates, in order."""
+        index = DedupIndex()
+        return [item for item in raw_results if index.add_if_new(item)]
 
     async def search(self, query: str, limit: int = 10):
         # Hybrid search logic (Firebase + YT)
+        normalized = normalize_search_query(query)
+        cache_key = f"search:{normalized}"
+        self.query_counts[normalized] += 1
+
+        cached = await cache.get(cache_key)
+        if cached:
+            self.stats["hits"] += 1
+            return {"results": cached["results"][:limit]}
+
+        self.stats["misses"] += 1
+        results = await self.search_flight.do(cache_key, lambda: self._search_and_cache(normalized))
+        return {"results": results[:limit]}
+
+    async def _search_and_cache(self, normalized: str) -> list:
+        """
+        Runs the live search and caches the full deduplicated list, so any
+        `limit` can be served from one entry.
+        """
         # Fetch raw candidates from YT Service (which already scores them)
-        raw_results = await yt_service.search_videos(query, limit=50) # Fetch more to dedupe
-        
-        unique_results = []
-        
-        for item in raw_results:
-            is_dup = False
-            for existing in unique_results:
-                if self._is_duplicate(item, existing):
-                    is_dup = True
-                    break
-            
-            if not is_dup:
-                unique_results.append(item)
-                
-            if len(unique_results) >= limit:
-                break
-                
-        return {"results": unique_results}
+        raw_results = await yt_service.search_videos(normalized, limit=50) # Fetch more to dedupe
+        unique_results = self._dedupe(raw_results)
+
+        # Empty usually means the upstream failed; don't pin that for the whole TTL
+        if unique_results:
+            await cache.set(f"search:{normalized}", {
+                "results": unique_results,
+                "cached_at": time.time(),
+            }, ttl=settings.SEARCH_CACHE_TTL)
+        return unique_results
+
+    async def search_stream(self, query: str, limit: int = 10) -> AsyncIterator[dict]:
+        """
+        Streaming search. Yields {"type": "result", "result": ...} events for
+        unique results scoring at least SEARCH_STREAM_EARLY_MIN_SCORE as soon
+        as yt-dlp produces them (up to `limit`), then one {"type": "final",
+        "results": [...]} event with the same re-ranked list search() returns.
+        Cache hits and searches already in flight go straight to "final".
+        """
+        normalized = normalize_search_query(query)
+        cache_key = f"search:{normalized}"
+        self.query_counts[normalized] += 1
+
+        cached = await cache.get(cache_key)
+        if cached:
+            self.stats["hits"] += 1
+            yield {"type": "final", "results": cached["results"][:limit]}
+            return
+
+        self.stats["misses"] += 1
+        if self.search_flight.is_inflight(cache_key):
+            results = await self.search_flight.do(cache_key, lambda: self._search_and_cache(normalized))
+            yield {"type": "final", "results": results[:limit]}
+            return
+
+        candidates = []
+        early = []
+        early_index = DedupIndex()
+        async for candidate in yt_service.iter_search(normalized, fetch_limit=50):
+            candidates.append(candidate)
+            if len(early) >= limit or candidate["score"] < settings.SEARCH_STREAM_EARLY_MIN_SCORE:
+                continue
+            if not early_index.add_if_new(candidate):
+                continue
+            early.append(candidate)
+            yield {"type": "result", "result": candidate}
+
+        # Same ordering and dedup as the non-streaming path, so both share the cache entry
+        candidates.sort(key=lambda x: x['score'], reverse=True)
+        unique_results = self._dedupe(candidates)
+        if unique_results:
+            await cache.set(cache_key, {
+                "results": unique_results,
+                "cached_at": time.time(),
+            }, ttl=settings.SEARCH_CACHE_TTL)
+        yield {"type": "final", "results": unique_results[:limit]}
+
+    async def refresh_popular(self):
+        """
+        Re-runs the top-N queries whose cached results are about to expire.
+        A short lock per query keeps the other workers from doing the same.
+        """
+        refresh_before = time.time() - (settings.SEARCH_CACHE_TTL - settings.SEARCH_REFRESH_AHEAD)
+
+        for normalized, _ in self.query_counts.most_common(settings.SEARCH_REFRESH_TOP_N):
+            cache_key = f"search:{normalized}"
+            cached = await cache.get(cache_key)
+            if cached and cached.get("cached_at", 0) > refresh_before:
+                continue
+
+            token = await cache.acquire_lock(f"{cache_key}:refresh", settings.SEARCH_REFRESH_AHEAD * 1000)
+            if token is None:
+                continue
+            try:
+                await self.search_flight.do(cache_key, lambda: self._search_and_cache(normalized))
+                self.stats["refreshes"] += 1
+            except Exception as e:
+                logger.warning(f"Search refresh failed for '{normalized}': {e}")
+            finally:
+                await cache.release_lock(f"{cache_key}:refresh", token)
+
+        # Decay so yesterday's hits don't stay hot forever
+        for normalized in list(self.query_counts):
+            self.query_counts[normalized] //= 2
+            if not self.query_counts[normalized]:
+                del self.query_counts[normalized]
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(settings.SEARCH_REFRESH_INTERVAL)
+            try:
+                await self.refresh_popular()
+            except Exception as e:
+                logger.error(f"Search refresh loop error: {e}")
+
+    def start(self):
+        """Start keeping popular searches warm (app startup)."""
+        if self._refresher is None:
+            self._refresher = asyncio.create_task(self._refresh_loop())
+
+    def stop(self):
+        if self._refresher is not None:
+            self._refresher.cancel()
+            self._refresher = None
 
 search_service = SearchService()
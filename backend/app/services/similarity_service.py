@@ -0,0 +1,47 @@
+import logging
+from typing import Iterable, List, Optional
+import numpy as np
+from app.config import settings
+from app.services.ml_service import ml_service
+from app.utils.ivf_index import top_k_cosine
+
+logger = logging.getLogger(__name__)
+
+class SimilarityService:
+    """
+    "More like this" over the ALS item factors of the published model.
+
+    Catalogs up to SIMILARITY_EXACT_MAX_ITEMS are searched exactly; larger
+    ones go through the IVF index saved with the model version (falling
+    back to exact search if that version has none).
+    """
+
+    def __init__(self):
+        self.stats = {"exact": 0, "ivf": 0, "unknown_seed": 0}
+
+    def similar_items(self, video_id: str, n: int = 20, exclude: Iterable[str] = ()) -> Optional[List[str]]:
+        """
+        Video IDs most similar to video_id, best first. None if the model
+        doesn't know the seed (or there is no model), so callers can fall back.
+        """
+        factors = ml_service.current_factors()
+        if factors is None or video_id not in factors.item_index:
+            self.stats["unknown_seed"] += 1
+            return None
+
+        seed = factors.item_index[video_id]
+        skip = [seed] + [factors.item_index[v] for v in exclude if v in factors.item_index]
+
+        rows = None
+        if len(factors.item_ids) > settings.SIMILARITY_EXACT_MAX_ITEMS and factors.ivf is not None:
+            rows = factors.ivf.candidates(factors.item_factors[seed] / factors.item_norms[seed],
+                                          settings.SIMILARITY_IVF_PROBES)
+            self.stats["ivf"] += 1
+        else:
+            self.stats["exact"] += 1
+
+        top, _ = top_k_cosine(factors.item_factors, factors.item_norms, factors.item_factors[seed],
+                              n, rows=rows, exclude=np.asarray(skip))
+        return [str(factors.item_ids[i]) for i in top]
+
+similarity_service = SimilarityService()
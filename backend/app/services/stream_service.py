@@ -1,18 +1,49 @@
 from app.services.yt_service import yt_service
 from app.services.analytics_service import analytics_service
+from app.services.prefetch_service import prefetch_service
+from app.utils.circuit_breaker import CircuitOpenError
+from app.utils.executor import ExtractionTimeout
 from fastapi import HTTPException
 
+# Per-item status codes in batch responses, matching what get_stream would raise
+BATCH_ERROR_STATUS = {"not_found": 404, "unavailable": 503, "timeout": 504}
+
 class StreamService:
     async def get_stream(self, video_id: str):
         """
         Get stream URL with caching support.
         Returns enhanced metadata including cache status and fetch time.
         """
-        stream_data = await yt_service.get_stream_url(video_id)
+        prefetch_service.note_request(video_id)
+        try:
+            stream_data = await yt_service.get_stream_url(video_id)
+        except ExtractionTimeout:
+            raise HTTPException(status_code=504, detail="Stream resolution timed out")
+        except CircuitOpenError as e:
+            raise HTTPException(
+                status_code=503,
+                detail="Stream resolution temporarily unavailable",
+                headers={"Retry-After": str(int(e.retry_after) + 1)},
+            )
         
         if not stream_data:
             raise HTTPException(status_code=404, detail="Stream not found")
         
+        return self._to_response(stream_data)
+
+    async def get_stream_batch(self, video_ids: list):
+        """
+        Resolves several streams, yielding each result as soon as it's ready.
+        Successes use the same shape as get_stream; failures are
+        {"video_id", "error", "status_code"}.
+        """
+        async for video_id, stream_data, error in yt_service.get_stream_urls(video_ids):
+            if stream_data:
+                yield self._to_response(stream_data)
+            else:
+                yield {"video_id": video_id, "error": error, "status_code": BATCH_ERROR_STATUS[error]}
+
+    def _to_response(self, stream_data: dict) -> dict:
         # Return full enhanced response
         return {
             "video_id": stream_data.get("video_id"),
@@ -22,6 +53,7 @@ class StreamService:
             "artist": stream_data.get("artist"),
             "thumbnail": stream_data.get("thumbnail"),
             "cached": stream_data.get("cached", False),
+            "cache_status": stream_data.get("cache_status", "miss"),
             "fetch_time_ms": stream_data.get("fetch_time_ms", 0)
         }
 
@@ -0,0 +1,178 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import sys
+import time
+from typing import Any, Dict, Optional
+from app.config import settings
+from app.services.ml_service import TRAIN_LOCK, ml_service
+from app.utils.cache import cache
+
+logger = logging.getLogger(__name__)
+
+STATUS_KEY = "ml:train:status"
+STATUS_TTL = 7 * 86400
+# Thread pools BLAS, OpenMP and implicit size themselves from
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+class TrainingService:
+    """
+    Full ALS training, run by one node at a time in a separate process.
+
+    Every worker checks every ML_TRAIN_CHECK_INTERVAL whether the published
+    model is older than ML_TRAIN_INTERVAL. The one that takes the "ml:train"
+    lease spawns `python -m app.jobs.train --worker` (BLAS threads capped to
+    ML_TRAIN_THREADS; the worker nices itself), so the request-serving event loop never
+    runs the training itself. The lease is renewed while the child runs;
+    if renewal fails the child is killed, so two nodes never train at once.
+
+    Progress and timings are kept in ml:train:status. When a version is
+    published, workers are told on ML_RELOAD_CHANNEL to switch right away
+    (they would otherwise notice within ML_RELOAD_CHECK_INTERVAL).
+    """
+
+    def __init__(self):
+        self.stats = {"runs": 0, "succeeded": 0, "failed": 0, "lease_lost": 0, "reloads": 0}
+        self._scheduler: Optional[asyncio.Task] = None
+        self.node = f"{socket.gethostname()}:{os.getpid()}"
+
+    async def get_status(self) -> Optional[Dict[str, Any]]:
+        return await cache.get(STATUS_KEY)
+
+    async def _set_status(self, **status):
+        status["updated_at"] = time.time()
+        await cache.set(STATUS_KEY, status, ttl=STATUS_TTL)
+
+    async def is_due(self) -> bool:
+        factors = ml_service.current_factors()
+        trained_at = (factors.meta.get("trained_at") or 0) if factors is not None else 0
+        if time.time() - trained_at < settings.ML_TRAIN_INTERVAL:
+            return False
+        # Don't hammer Firebase with retries after a failed run
+        status = await self.get_status() or {}
+        if status.get("state") == "failed":
+            return time.time() - status.get("finished_at", 0) >= settings.ML_TRAIN_RETRY_INTERVAL
+        return True
+
+    async def run_if_due(self, force: bool = False) -> Optional[Dict[str, Any]]:
+        """Trains if a training is due (or forced) and no other node is training. Returns the run's stats."""
+        if not force and not await self.is_due():
+            return None
+        lease_ms = int(settings.ML_TRAIN_LEASE_TTL * 1000)
+        token = await cache.acquire_lock(TRAIN_LOCK, lease_ms)
+        if token is None:
+            return None
+        try:
+            # Another node may have finished one while we waited for the lease
+            if not force and not await self.is_due():
+                return None
+            return await self._run(token)
+        finally:
+            await cache.release_lock(TRAIN_LOCK, token)
+
+    @staticmethod
+    def _child_env() -> Dict[str, str]:
+        env = dict(os.environ)
+        for var in THREAD_ENV_VARS:
+            env[var] = str(settings.ML_TRAIN_THREADS)
+        env["PYTHONUNBUFFERED"] = "1"
+        return env
+
+    async def _spawn(self) -> asyncio.subprocess.Process:
+        return await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "app.jobs.train", "--worker",
+            stdout=asyncio.subprocess.PIPE,
+            env=self._child_env(),
+        )
+
+    async def _keep_lease(self, token: str, proc: asyncio.subprocess.Process):
+        lease_ms = int(settings.ML_TRAIN_LEASE_TTL * 1000)
+        while True:
+            await asyncio.sleep(settings.ML_TRAIN_LEASE_TTL / 3)
+            if not await cache.extend_lock(TRAIN_LOCK, token, lease_ms):
+                logger.error("🧠 Lost the training lease, stopping the training process")
+                self.stats["lease_lost"] += 1
+                proc.kill()
+                return
+
+    async def _follow(self, proc: asyncio.subprocess.Process, status: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Mirrors the child's progress into the status key; returns its final report."""
+        result = None
+        # One JSON object per line: progress, then {"stage": "done", ...}
+        async for line in proc.stdout:
+            try:
+                update = json.loads(line)
+            except ValueError:
+                continue
+            if update.get("stage") == "done":
+                result = update
+            else:
+                await self._set_status(**status, **update)
+        await proc.wait()
+        return result
+
+    async def _run(self, token: str) -> Optional[Dict[str, Any]]:
+        self.stats["runs"] += 1
+        started_at = time.time()
+        status = {"state": "running", "node": self.node, "started_at": started_at}
+        await self._set_status(**status)
+        logger.info(f"🧠 Starting ALS training on {self.node}")
+
+        proc = await self._spawn()
+        keeper = asyncio.create_task(self._keep_lease(token, proc))
+        result = None
+        try:
+            result = await asyncio.wait_for(self._follow(proc, status), settings.ML_TRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.error(f"🧠 ALS training exceeded {settings.ML_TRAIN_TIMEOUT}s, killing it")
+            proc.kill()
+            await proc.wait()
+        except asyncio.CancelledError:
+            # App shutdown: don't leave an orphaned training behind
+            proc.kill()
+            raise
+        finally:
+            keeper.cancel()
+
+        finished = {"node": self.node, "started_at": started_at, "finished_at": time.time(),
+                    "exit_code": proc.returncode}
+        if proc.returncode != 0 or not result or not result.get("version"):
+            self.stats["failed"] += 1
+            await self._set_status(state="failed", **finished)
+            logger.error(f"🧠 ALS training failed (exit code {proc.returncode})")
+            return None
+
+        self.stats["succeeded"] += 1
+        result.pop("stage", None)
+        await self._set_status(state="succeeded", **finished, **result)
+        ml_service.reload(result["version"])
+        await cache.publish(settings.ML_RELOAD_CHANNEL, {"version": result["version"]})
+        logger.info(f"🧠 ALS training published {result['version']}")
+        return result
+
+    def _on_reload(self, message: Dict[str, Any]):
+        self.stats["reloads"] += 1
+        ml_service.reload(message.get("version"))
+
+    async def _schedule_loop(self):
+        while True:
+            try:
+                await self.run_if_due()
+            except Exception as e:
+                logger.error(f"Training scheduler error: {e}")
+            await asyncio.sleep(settings.ML_TRAIN_CHECK_INTERVAL)
+
+    def start(self):
+        """Subscribe to model reloads and start the training scheduler (app startup, before cache.start())."""
+        cache.subscribe(settings.ML_RELOAD_CHANNEL, self._on_reload)
+        if settings.ML_TRAIN_INTERVAL > 0 and self._scheduler is None:
+            self._scheduler = asyncio.create_task(self._schedule_loop())
+
+    def stop(self):
+        if self._scheduler is not None:
+            self._scheduler.cancel()
+            self._scheduler = None
+
+training_service = TrainingService()
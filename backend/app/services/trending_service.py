@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+from app.config import settings
+from app.services.yt_service import yt_service
+from app.utils.cache import cache
+from app.utils.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_REGION = "global"
+
+class TrendingService:
+    """
+    Trending shelf shared by every user.
+
+    Snapshots ("trending:global", "trending:<country>") are rebuilt every
+    TRENDING_REFRESH_INTERVAL by whichever worker holds the refresh lock and
+    stored in the shared cache; home views only read them. A refresh that
+    fails or comes back empty leaves the previous snapshot in place.
+    """
+
+    def __init__(self):
+        self.refresh_flight = SingleFlight()
+        self.stats = {"refreshes": 0, "refresh_failures": 0, "cold_misses": 0}
+        self._refresher: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _region(country: Optional[str]) -> str:
+        return (country or "").strip().lower() or GLOBAL_REGION
+
+    def regions(self) -> List[str]:
+        countries = [self._region(c) for c in settings.TRENDING_COUNTRIES.split(",")]
+        return [GLOBAL_REGION] + [c for c in dict.fromkeys(countries) if c != GLOBAL_REGION]
+
+    @staticmethod
+    def _query(region: str) -> str:
+        if region == GLOBAL_REGION:
+            return "Global Top 50 Music"
+        return f"Top 50 Music {region}"
+
+    async def get_trending(self, country: Optional[str] = None, limit: int = 10) -> List[Dict]:
+        """The trending snapshot for the user's country if it has one, else the global one."""
+        region = self._region(country)
+        if region not in self.regions():
+            region = GLOBAL_REGION
+
+        snapshot = await cache.get(f"trending:{region}")
+        if snapshot is None:
+            # Cold start: build it now, once per worker
+            self.stats["cold_misses"] += 1
+            snapshot = await self.refresh_flight.do(region, lambda: self.refresh_region(region))
+        return (snapshot or {}).get("results", [])[:limit]
+
+    async def refresh_region(self, region: str) -> Optional[Dict]:
+        """Rebuilds one snapshot. Returns it, or the previous one if the search failed."""
+        cache_key = f"trending:{region}"
+        try:
+            results = await yt_service.search_videos(self._query(region), limit=settings.TRENDING_SIZE)
+        except Exception as e:
+            results = []
+            logger.warning(f"Trending refresh for {region} failed: {e}")
+
+        if not results:
+            self.stats["refresh_failures"] += 1
+            return await cache.get(cache_key)
+
+        snapshot = {"results": results, "updated_at": time.time()}
+        # SETEX only takes whole seconds
+        ttl = int(settings.TRENDING_REFRESH_INTERVAL + settings.TRENDING_SNAPSHOT_TTL)
+        await cache.set(cache_key, snapshot, ttl=ttl)
+        self.stats["refreshes"] += 1
+        return snapshot
+
+    async def refresh_all(self):
+        """Refreshes the snapshots that are due, if no other worker is already doing it."""
+        lease_ms = int(settings.TRENDING_REFRESH_INTERVAL * 1000)
+        token = await cache.acquire_lock("trending:refresh", lease_ms)
+        if token is None:
+            return
+        try:
+            due_before = time.time() - settings.TRENDING_REFRESH_INTERVAL / 2
+            for region in self.regions():
+                snapshot = await cache.get(f"trending:{region}")
+                # Another worker refreshed it recently
+                if snapshot and snapshot.get("updated_at", 0) > due_before:
+                    continue
+                await self.refresh_flight.do(region, lambda: self.refresh_region(region))
+        finally:
+            await cache.release_lock("trending:refresh", token)
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.refresh_all()
+            except Exception as e:
+                logger.error(f"Trending refresh loop error: {e}")
+            await asyncio.sleep(settings.TRENDING_REFRESH_INTERVAL)
+
+    def start(self):
+        """Start refreshing the trending snapshots (app startup)."""
+        if self._refresher is None:
+            self._refresher = asyncio.create_task(self._refresh_loop())
+
+    def stop(self):
+        if self._refresher is not None:
+            self._refresher.cancel()
+            self._refresher = None
+
+trending_service = TrendingService()
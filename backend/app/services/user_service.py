@@ -1,5 +1,9 @@
 from firebase_admin import firestore, db
+import asyncio
 import logging
+from typing import Optional
+from app.utils.cache import cache
+from app.utils.rtdb import child_keys, iter_child_pages
 
 logger = logging.getLogger(__name__)
 
@@ -22,7 +26,8 @@ class UserService:
 
     async def get_user_profile(self, uid: str):
         try:
-            doc = self.collection.document(uid).get()
+            # The Firebase SDK blocks; keep it off the event loop
+            doc = await asyncio.to_thread(self.collection.document(uid).get)
             if doc.exists:
                 return doc.to_dict()
             return None
@@ -74,6 +79,7 @@ class UserService:
             
             rtdb_ref = db.reference(f'users/{uid}/preferences')
             rtdb_ref.set(data)
+            await cache.delete(f"home:{uid}")
             
             logger.info(f"Saved onboarding data for {uid}")
             return True
@@ -84,46 +90,46 @@ class UserService:
     async def update_playback_state(self, uid: str, state: dict):
         try:
             ref = db.reference(f'users/{uid}/state')
-            ref.update(state)
+            await asyncio.to_thread(ref.update, state)
         except Exception as e:
             logger.error(f"Error updating playback state for {uid}: {e}")
 
+    async def get_playback_state(self, uid: str) -> dict:
+        try:
+            # Read on every now-playing update: keep the blocking call off the event loop
+            state = await asyncio.to_thread(db.reference(f'users/{uid}/state').get)
+            return state or {}
+        except Exception as e:
+            logger.error(f"Error fetching playback state for {uid}: {e}")
+            return {}
+
     async def add_to_history(self, uid: str, song: dict):
         try:
             ref = db.reference(f'users/{uid}/history')
             new_ref = ref.push(song)
+            await cache.delete(f"home:{uid}")
+            await cache.delete(f"als_fold:{uid}")  # Re-fold a cold-start user with the new play
         except Exception as e:
             logger.error(f"Error adding to history for {uid}: {e}")
 
-    async def get_all_interactions(self):
+    async def iter_interactions(self, page_size: int = 1000, since: Optional[str] = None):
         """
-        Fetch all interactions (plays) for ML training.
+        Yields (user_id, [video_id, ...]) for ML training, one page of a
+        user's history at a time. Only user keys and history entries are
+        fetched (not profiles, queues or devices), and never more than one
+        page at once. With `since` (a push key or push_key_prefix), only
+        entries with keys from there on are read.
         """
-        try:
-            ref = db.reference('users')
-            snapshot = ref.get()
-            if not snapshot:
-                return []
-                
-            interactions = []
-            for user_id, user_data in snapshot.items():
-                history = user_data.get('history', {})
+        for user_id in await child_keys(db.reference('users')):
+            ref = db.reference(f'users/{user_id}/history')
+            async for entries in iter_child_pages(ref, page_size, start_at=since):
                 # History here is a dict of push_ids -> song_data
-                for entry_id, song_data in history.items():
-                    interactions.append({
-                        'user_id': user_id,
-                        'video_id': song_data.get('id'), # Assumes 'id' is stored
-                        'weight': 1 # Play = 1
-                    })
-            return interactions
-        except Exception as e:
-            logger.error(f"Error fetching all interactions: {e}")
-            return []
+                yield user_id, [song_data.get('id') for _, song_data in entries if isinstance(song_data, dict)]
 
     async def get_recent_history(self, uid: str, limit: int = 20):
         try:
             ref = db.reference(f'users/{uid}/history')
-            snapshot = ref.order_by_key().limit_to_last(limit).get()
+            snapshot = await asyncio.to_thread(ref.order_by_key().limit_to_last(limit).get)
             if not snapshot:
                 return []
             return list(snapshot.values())
@@ -1,11 +1,56 @@
-import yt_dlp
+import asyncio
 import logging
-from typing import List, Optional, Dict, Any
+import threading
+from typing import AsyncIterator, List, Optional, Dict, Any, Tuple
 import time
+from urllib.parse import urlparse, parse_qs
+from app.config import settings
+from app.services.catalog_service import catalog_service
 from app.utils.cache import cache
+from app.utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.utils.executor import extraction_executor, ExtractionTimeout
+from app.utils.scoring import VideoScorer
+from app.utils.singleflight import SingleFlight
+from app.utils.ytdl import extract_info, iter_entries
 
 logger = logging.getLogger(__name__)
 
+def _stream_url_expiry(stream_url: Optional[str]) -> Optional[int]:
+    """Reads the unix `expire` timestamp googlevideo URLs carry (query or path form)."""
+    if not stream_url:
+        return None
+    parsed = urlparse(stream_url)
+    expire = parse_qs(parsed.query).get('expire', [None])[0]
+    if expire is None:
+        # Manifest URLs use /expire/<ts>/ path segments
+        parts = parsed.path.split('/')
+        if 'expire' in parts and parts.index('expire') + 1 < len(parts):
+            expire = parts[parts.index('expire') + 1]
+    try:
+        return int(expire) if expire is not None else None
+    except ValueError:
+        return None
+
+# Substrings of yt-dlp error messages, checked in order
+FAILURE_PATTERNS = [
+    ("geo_blocked", ("available in your country", "geo restrict", "geo-restrict")),
+    ("age_restricted", ("confirm your age", "age-restricted", "age restricted", "inappropriate for some users")),
+    ("unavailable", ("video unavailable", "private video", "has been removed", "been terminated",
+                     "members-only", "is not available", "does not exist")),
+    ("rate_limited", ("http error 429", "too many requests", "not a bot")),
+]
+# Failures that say something about the upstream rather than the video
+UPSTREAM_FAILURES = {"rate_limited", "upstream"}
+# Lock holders a waiter follows before extracting without the lease
+STREAM_LOCK_ATTEMPTS = 3
+
+def _classify_failure(error: Exception) -> str:
+    message = str(error).lower()
+    for reason, patterns in FAILURE_PATTERNS:
+        if any(p in message for p in patterns):
+            return reason
+    return "upstream"
+
 class YTService:
     def __init__(self):
         self.ydl_opts_search = {
@@ -24,51 +69,67 @@ class YTService:
             'no_warnings': True,
         }
 
+        # In-flight stream extractions, keyed by cache key
+        self.stream_flight = SingleFlight()
+        self.stream_stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_failures": 0}
+        self._background_tasks = set()
+        self.negative_hits = 0
+        # Shared by search and stream extractions
+        self.breaker = CircuitBreaker(
+            "youtube",
+            failure_threshold=settings.BREAKER_FAILURE_THRESHOLD,
+            min_calls=settings.BREAKER_MIN_CALLS,
+            window=settings.BREAKER_WINDOW,
+            reset_timeout=settings.BREAKER_RESET_TIMEOUT,
+        )
+        # Keyword/duration scorer, compiled once
+        self.scorer = VideoScorer.from_file(settings.SCORING_KEYWORDS_FILE)
+
     def _score_video(self, title: str, duration: int, channel: str) -> int:
         """
         Scores a video to determine if it's a high-quality music track.
         Higher score = better match.
         """
-        title_lower = title.lower()
-        score = 0
-        
-        # Block words (Severe penalty)
-        BLOCK_WORDS = [
-            "trailer", "teaser", "reaction", "interview", "dialogue", "scene", 
-            "bgm", "remix", "cover", "shorts", "status", "video song", # sometimes video song is okay, but we prefer audio
-            "full movie", "movie review", "podcast", "episode", "discussion",
-            "8d", "16d", "3d", "slowed", "reverb", "bass boosted", "nightcore",
-            "mashup", "karaoke", "instrumental" 
-        ]
-        
-        for w in BLOCK_WORDS:
-            if w in title_lower:
-                score -= 50 # Heavy penalty
-
-        # Boost words (Reward)
-        BOOST_WORDS = [
-            "official audio", "lyrical", "full song", "soundtrack", "audio", 
-            "original", "topic" # Artist - Topic
-        ]
-        
-        for w in BOOST_WORDS:
-            if w in title_lower:
-                score += 10
+        return self.scorer.score(title, duration, channel)
+
+    def _candidate(self, entry: Optional[Dict[str, Any]], score: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Scores one search entry (unless a batch score is passed in); returns
+        the result dict, or None if it isn't music.
+        """
+        if not entry:
+            return None
+        title = entry.get('title', '')
+        duration = entry.get('duration') or 0
+        channel = entry.get('uploader') or entry.get('channel') or ''
+        video_id = entry.get('id')
         
-        # Duration scoring
-        if duration:
-            if 120 <= duration <= 420: # 2 to 7 mins
-                score += 10
-            elif duration < 60: # Shorts/Snippets
-                score -= 20
-            elif duration > 720: # > 12 mins (likely jukebox/full movie)
-                score -= 10
+        if not title or not video_id:
+            return None
+
+        if score is None:
+            score = self._score_video(title, duration, channel)
         
-        # Channel Trust (Heuristic)
-        if "topic" in channel.lower() or "vevo" in channel.lower() or "records" in channel.lower():
-            score += 5
-            
-        return score
+        # Threshold for accepting a video as "music"
+        # We can adjust this. 
+        # If score is too low, we skip.
+        if score <= -10:
+            return None
+
+        thumbnail = entry.get('thumbnail')
+        if not thumbnail and entry.get('thumbnails'):
+            # Unprocessed entries only carry the list, largest last
+            thumbnail = entry['thumbnails'][-1].get('url')
+        return {
+            "id": video_id,
+            "title": title,
+            "artist": channel, # Use uploader as artist roughly
+            "channel": channel,
+            "duration": duration,
+            "thumbnail": thumbnail or '',
+            "yt_video_id": video_id,
+            "score": score
+        }
 
     async def search_videos(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
         """
@@ -79,89 +140,368 @@ class YTService:
             fetch_limit = 50 
             search_query = f"ytsearch{fetch_limit}:{query}" 
             
-            with yt_dlp.YoutubeDL(self.ydl_opts_search) as ydl:
-                info = ydl.extract_info(search_query, download=False)
+            self.breaker.check()
+            try:
+                info = await extraction_executor.run(
+                    "search", extract_info, "search", self.ydl_opts_search, search_query,
+                    settings.YDL_POOL_MAX_USES, settings.YDL_POOL_MAX_IDLE,
+                )
+            except Exception:
+                self.breaker.record_failure()
+                raise
+            # ignoreerrors turns extraction failures into None
+            if info is None:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
                 
             candidates = []
-            if 'entries' in info:
-                for entry in info['entries']:
-                    title = entry.get('title', '')
-                    duration = entry.get('duration', 0)
-                    channel = entry.get('uploader', '')
-                    video_id = entry.get('id')
-                    
-                    if not title or not video_id:
-                        continue
-
-                    score = self._score_video(title, duration, channel)
-                    
-                    # Threshold for accepting a video as "music"
-                    # We can adjust this. 
-                    # If score is too low, we skip.
-                    if score > -10: 
-                        candidates.append({
-                            "id": video_id,
-                            "title": title,
-                            "artist": channel, # Use uploader as artist roughly
-                            "duration": duration,
-                            "thumbnail": entry.get('thumbnail', ''),
-                            "yt_video_id": video_id,
-                            "score": score
-                        })
+            if info and 'entries' in info:
+                entries = [entry for entry in info['entries'] if entry]
+                for entry, score in zip(entries, self.scorer.score_many(entries)):
+                    candidate = self._candidate(entry, int(score))
+                    if candidate:
+                        candidates.append(candidate)
             
+            catalog_service.record_many(candidates)
+
             # Sort by score descending
             candidates.sort(key=lambda x: x['score'], reverse=True)
             
             # Return top N
             return candidates[:limit]
 
+        except (ExtractionTimeout, CircuitOpenError):
+            raise
         except Exception as e:
             logger.error(f"YT Search Error: {e}")
             return []
 
+    async def iter_search(self, query: str, fetch_limit: int = 50) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of search_videos: yields scored, accepted candidates
+        (unsorted) as yt-dlp pages through the results, instead of after the
+        whole extraction. With the process executor entries can't be handed
+        back early, so they all arrive at the end.
+
+        Raises ExtractionTimeout / CircuitOpenError only if nothing was yielded
+        yet; a failure mid-way just ends the stream early.
+        """
+        search_query = f"ytsearch{fetch_limit}:{query}"
+        self.breaker.check()
+
+        loop = asyncio.get_running_loop()
+        entries: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        done = object()
+
+        def emit(entry: Dict[str, Any]) -> bool:
+            # Runs on the extraction thread
+            try:
+                loop.call_soon_threadsafe(entries.put_nowait, entry)
+            except RuntimeError:
+                return False  # Loop closed
+            return not stop.is_set()
+
+        if settings.EXTRACTION_EXECUTOR == "process":
+            job = asyncio.ensure_future(extraction_executor.run(
+                "search", extract_info, "search", self.ydl_opts_search, search_query,
+                settings.YDL_POOL_MAX_USES, settings.YDL_POOL_MAX_IDLE,
+            ))
+        else:
+            job = asyncio.ensure_future(extraction_executor.run(
+                "search", iter_entries, "search", self.ydl_opts_search, search_query, emit,
+                settings.YDL_POOL_MAX_USES, settings.YDL_POOL_MAX_IDLE,
+            ))
+        # Scheduled after every entry the worker already emitted
+        job.add_done_callback(lambda _: entries.put_nowait(done))
+
+        yielded = 0
+        try:
+            while True:
+                entry = await entries.get()
+                if entry is done:
+                    break
+                candidate = self._candidate(entry)
+                if candidate:
+                    yielded += 1
+                    catalog_service.record(candidate)
+                    yield candidate
+
+            try:
+                result = job.result()
+            except Exception as e:
+                self.breaker.record_failure()
+                if not yielded:
+                    raise
+                logger.warning(f"YT streaming search for '{query}' ended early: {e}")
+                return
+            if result is None:
+                self.breaker.record_failure()
+                return
+            self.breaker.record_success()
+
+            if isinstance(result, dict):
+                for entry in result.get('entries') or ():
+                    candidate = self._candidate(entry)
+                    if candidate:
+                        catalog_service.record(candidate)
+                        yield candidate
+        finally:
+            # Consumer went away (or we're done): let the worker stop paging
+            stop.set()
+            if not job.done():
+                job.cancel()
+
     async def get_stream_url(self, video_id: str) -> Optional[Dict[str, Any]]:
         """
         Gets the direct stream URL for a video ID with Redis caching.
-        Cache TTL: 10 minutes for premium performance.
+        Entries live until shortly before the URL's own expiry; near the end
+        they are served stale while a background refresh runs.
+        Concurrent misses for the same video share one extraction.
         """
         start_time = time.time()
         cache_key = f"yt_audio:{video_id}"
         
         # Try cache first
-        cached_data = await cache.get(cache_key)
+        cached_data = self._serve_cached(video_id, cache_key, await cache.get(cache_key), start_time)
         if cached_data:
-            fetch_time = int((time.time() - start_time) * 1000)
-            logger.info(f"⚡ Cache HIT for {video_id} ({fetch_time}ms)")
-            cached_data['cached'] = True
-            cached_data['fetch_time_ms'] = fetch_time
             return cached_data
-        
-        # Cache miss - fetch from YouTube
+        return await self._resolve_miss(video_id, cache_key, start_time)
+
+    async def get_stream_urls(self, video_ids: List[str]) -> AsyncIterator[Tuple[str, Optional[Dict[str, Any]], Optional[str]]]:
+        """
+        Resolves several videos, yielding (video_id, stream_data, error) as
+        each one is ready. Cache hits come from a single MGET and are yielded
+        first; misses are resolved with at most STREAM_BATCH_CONCURRENCY in
+        parallel. error is "not_found", "timeout" or "unavailable".
+        """
+        start_time = time.time()
+        video_ids = list(dict.fromkeys(video_ids))  # Dedupe, keep order
+        cache_keys = [f"yt_audio:{vid}" for vid in video_ids]
+
+        misses = []
+        for vid, key, value in zip(video_ids, cache_keys, await cache.mget(cache_keys)):
+            cached_data = self._serve_cached(vid, key, value, start_time)
+            if cached_data:
+                yield vid, cached_data, None
+            else:
+                misses.append((vid, key))
+        if not misses:
+            return
+
+        semaphore = asyncio.Semaphore(settings.STREAM_BATCH_CONCURRENCY)
+
+        async def resolve(vid: str, key: str):
+            async with semaphore:
+                try:
+                    data = await self._resolve_miss(vid, key, start_time)
+                    return vid, data, None if data else "not_found"
+                except ExtractionTimeout:
+                    return vid, None, "timeout"
+                except CircuitOpenError:
+                    return vid, None, "unavailable"
+
+        tasks = [asyncio.ensure_future(resolve(vid, key)) for vid, key in misses]
         try:
-            url = f"https://www.youtube.com/watch?v={video_id}"
-            
-            with yt_dlp.YoutubeDL(self.ydl_opts_stream) as ydl:
-                info = ydl.extract_info(url, download=False)
-                
-                stream_data = {
-                    "video_id": video_id,
-                    "stream_url": info.get('url'),
-                    "duration": info.get('duration'),
-                    "title": info.get('title'),
-                    "artist": info.get('uploader'),
-                    "thumbnail": info.get('thumbnail'),
-                    "cached": False,
-                    "fetch_time_ms": int((time.time() - start_time) * 1000)
-                }
-                
-                # Cache for 10 minutes (600 seconds)
-                await cache.set(cache_key, stream_data, ttl=600)
-                
-                logger.info(f"🔄 Cache MISS for {video_id} ({stream_data['fetch_time_ms']}ms) - Cached for 10min")
-                return stream_data
-                
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Client went away: stop waiting on the rest
+            for task in tasks:
+                task.cancel()
+
+    def _serve_cached(self, video_id: str, cache_key: str, cached_data: Optional[Dict[str, Any]],
+                      start_time: float) -> Optional[Dict[str, Any]]:
+        """Annotates a cached entry for the caller, or returns None if it can't be served."""
+        if not cached_data or cached_data.get('expires_at', float('inf')) <= start_time:
+            return None
+
+        cached_data = dict(cached_data)  # Don't annotate the cached object itself
+        cache_status = "hit"
+        if cached_data.get('stale_at', float('inf')) <= start_time:
+            cache_status = "stale"
+            self._refresh_in_background(video_id, cache_key)
+        self.stream_stats["stale_hits" if cache_status == "stale" else "hits"] += 1
+
+        fetch_time = int((time.time() - start_time) * 1000)
+        logger.info(f"⚡ Cache {cache_status.upper()} for {video_id} ({fetch_time}ms)")
+        cached_data['cached'] = True
+        cached_data['cache_status'] = cache_status
+        cached_data['fetch_time_ms'] = fetch_time
+        return cached_data
+
+    async def _resolve_miss(self, video_id: str, cache_key: str, start_time: float) -> Optional[Dict[str, Any]]:
+        # Known-bad video: don't re-extract until the negative entry expires
+        failure = await cache.get(f"yt_neg:{video_id}")
+        if failure:
+            self.negative_hits += 1
+            logger.info(f"🚫 Negative cache HIT for {video_id} ({failure.get('reason')})")
+            return None
+
+        # Cache miss - join the in-flight extraction for this video or start one
+        self.stream_stats["misses"] += 1
+        stream_data = await self.stream_flight.do(cache_key, lambda: self._resolve_stream(video_id, cache_key))
+        if not stream_data:
+            return None
+
+        # Each caller gets its own copy with its own timing
+        stream_data = dict(stream_data)
+        stream_data['fetch_time_ms'] = int((time.time() - start_time) * 1000)
+        return stream_data
+
+    def _refresh_in_background(self, video_id: str, cache_key: str):
+        """Re-extracts a stale entry without making the caller wait."""
+        # While the upstream is failing, keep serving the stale entry as is
+        if self.stream_flight.is_inflight(cache_key) or self.breaker.state != "closed":
+            return
+
+        async def refresh():
+            self.stream_stats["refreshes"] += 1
+            fresh = await self._resolve_stream(video_id, cache_key)
+            if not fresh:
+                self.stream_stats["refresh_failures"] += 1
+            return fresh
+
+        task = asyncio.ensure_future(self.stream_flight.do(cache_key, refresh))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._on_refresh_done)
+
+    def _on_refresh_done(self, task: asyncio.Task):
+        self._background_tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.warning(f"Background stream refresh failed: {task.exception()}")
+
+    def _stream_cache_ttl(self, stream_url: Optional[str], now: float) -> int:
+        """
+        TTL for a resolved stream: the URL's own expiry minus a safety margin,
+        capped at STREAM_CACHE_MAX_TTL. Never longer than the URL stays valid.
+        Returns 0 when the URL is too close to expiry to be worth caching.
+        """
+        expire = _stream_url_expiry(stream_url)
+        if expire is None:
+            return settings.STREAM_CACHE_DEFAULT_TTL
+
+        remaining = int(expire - now)
+        ttl = remaining - settings.STREAM_URL_EXPIRY_MARGIN
+        if ttl <= 0:
+            # Short-lived URL: keep it for half of what's left
+            ttl = remaining // 2
+        return max(0, min(ttl, settings.STREAM_CACHE_MAX_TTL))
+
+    def stream_cache_stats(self) -> Dict[str, int]:
+        return dict(self.stream_stats, negative_hits=self.negative_hits)
+
+    async def _resolve_stream(self, video_id: str, cache_key: str) -> Optional[Dict[str, Any]]:
+        """
+        Extracts and caches the stream for a video. With STREAM_DISTRIBUTED_LOCK
+        only the worker holding the per-video lease extracts; the others wait
+        for its result to land in the cache.
+        """
+        if not settings.STREAM_DISTRIBUTED_LOCK:
+            return await self._extract_stream(video_id, cache_key)
+
+        for _ in range(STREAM_LOCK_ATTEMPTS):
+            token = await cache.acquire_lock(cache_key, settings.STREAM_LOCK_LEASE_MS)
+            if token is not None:
+                break
+            settled, peer_data = await self._wait_for_peer(video_id, cache_key)
+            if settled:
+                return peer_data
+            # The holder let go without a result (e.g. its breaker was open): take the lease ourselves
+        else:
+            # Still no result after several holders; extract ourselves
+            return await self._extract_stream(video_id, cache_key)
+
+        try:
+            return await self._extract_stream(video_id, cache_key)
+        finally:
+            await cache.release_lock(cache_key, token)
+
+    async def _wait_for_peer(self, video_id: str, cache_key: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        Polls the cache while the lock holder extracts. Returns (True, result)
+        once it publishes one, (True, None) if it negative-cached the video,
+        and (False, None) if the lock went away without either or the lease ran out.
+        """
+        deadline = time.monotonic() + settings.STREAM_LOCK_LEASE_MS / 1000
+        while time.monotonic() < deadline:
+            await asyncio.sleep(settings.STREAM_LOCK_POLL_INTERVAL)
+            locked = await cache.is_locked(cache_key)
+            # Read after the lock check, so a result cached just before the release is seen
+            cached_data = await cache.get(cache_key)
+            if cached_data:
+                cached_data = dict(cached_data)
+                cached_data['cached'] = True
+                cached_data['cache_status'] = "hit"
+                return True, cached_data
+            failure = await cache.get(f"yt_neg:{video_id}")
+            if failure:
+                self.negative_hits += 1
+                logger.info(f"🚫 Peer failed to resolve {video_id} ({failure.get('reason')})")
+                return True, None
+            if not locked:
+                return False, None
+        return False, None
+
+    async def _extract_stream(self, video_id: str, cache_key: str) -> Optional[Dict[str, Any]]:
+        start_time = time.time()
+        url = f"https://www.youtube.com/watch?v={video_id}"
+
+        self.breaker.check()
+        try:
+            info = await extraction_executor.run(
+                "stream", extract_info, "stream", self.ydl_opts_stream, url,
+                settings.YDL_POOL_MAX_USES, settings.YDL_POOL_MAX_IDLE,
+            )
+            if not info:
+                raise ValueError("Empty extraction result")
+        except ExtractionTimeout:
+            self.breaker.record_failure()
+            raise
         except Exception as e:
-            logger.error(f"YT Stream Error for {video_id}: {e}")
+            await self._record_stream_failure(video_id, e)
             return None
+        self.breaker.record_success()
+            
+        stream_data = {
+            "video_id": video_id,
+            "stream_url": info.get('url'),
+            "duration": info.get('duration'),
+            "title": info.get('title'),
+            # YouTube Music tracks carry the real artist; others only the uploader
+            "artist": info.get('artist') or info.get('uploader'),
+            "channel": info.get('channel') or info.get('uploader'),
+            "thumbnail": info.get('thumbnail'),
+            "cached": False,
+            "cache_status": "miss",
+            "fetch_time_ms": int((time.time() - start_time) * 1000)
+        }
+        catalog_service.record(stream_data)
+        
+        now = time.time()
+        ttl = self._stream_cache_ttl(stream_data['stream_url'], now)
+        if ttl > 0:
+            stale_window = min(settings.STREAM_STALE_WINDOW, ttl // 2)
+            stream_data['expires_at'] = now + ttl
+            stream_data['stale_at'] = now + ttl - stale_window
+            await cache.set(cache_key, stream_data, ttl=ttl)
+        
+        logger.info(f"🔄 Cache MISS for {video_id} ({stream_data['fetch_time_ms']}ms) - Cached for {ttl}s")
+        return stream_data
+
+    async def _record_stream_failure(self, video_id: str, error: Exception):
+        """Classifies a failed extraction, feeds the breaker and negative-caches the video."""
+        reason = _classify_failure(error)
+        if reason in UPSTREAM_FAILURES:
+            self.breaker.record_failure()
+            ttl = settings.NEGATIVE_CACHE_TRANSIENT_TTL
+        else:
+            # The upstream answered; the video itself is the problem
+            self.breaker.record_success()
+            ttl = settings.NEGATIVE_CACHE_TTL
+
+        logger.error(f"YT Stream Error for {video_id} ({reason}): {error}")
+        await cache.set(f"yt_neg:{video_id}", {"reason": reason, "error": str(error)[:200]}, ttl=ttl)
 
 yt_service = YTService()
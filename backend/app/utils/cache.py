@@ -1,59 +1,195 @@
+import asyncio
 import redis
+import redis.asyncio as aioredis
 import json
 import logging
-from typing import Optional, Any
-from datetime import timedelta
-import os
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional
+from app.config import settings
+from app.utils.memory_cache import MemoryCache
 
 logger = logging.getLogger(__name__)
 
+# Delete the lock only if we still own it (token matches)
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# Push the lease expiry out only if we still own it
+EXTEND_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
 class CacheService:
     """
     Redis cache with in-memory fallback for premium streaming performance.
+
+    Uses redis.asyncio over a shared, bounded connection pool so cache calls
+    never block the event loop. Connections are opened lazily and re-opened
+    by the pool after failures; while Redis is unreachable we serve from
+    memory and retry every REDIS_RETRY_INTERVAL seconds.
+    Set REDIS_CLIENT=sync to use the blocking client instead (its calls run
+    in a thread); this is a fallback only.
+
+    With Redis, a small per-process L1 (MemoryCache) sits in front of it as
+    L2. Writes and deletes are broadcast on CACHE_INVALIDATION_CHANNEL so
+    every worker drops its L1 copy; L1 entries also expire after
+    CACHE_L1_TTL in case a message is missed. L1 needs the async client.
     """
     def __init__(self):
-        self.redis_client: Optional[redis.Redis] = None
-        self.memory_cache: dict = {}  # Fallback in-memory cache
-        self.use_redis = False
-        
-        # Try to connect to Redis
-        redis_url = os.getenv("REDIS_URL")
-        if redis_url:
-            try:
-                self.redis_client = redis.from_url(
-                    redis_url,
-                    decode_responses=True,
-                    socket_connect_timeout=2,
-                    socket_timeout=2
-                )
-                # Test connection
-                self.redis_client.ping()
-                self.use_redis = True
-                logger.info("✅ Redis connected successfully")
-            except Exception as e:
-                logger.warning(f"⚠️ Redis unavailable, using in-memory cache: {e}")
-                self.redis_client = None
+        self.redis_url = settings.REDIS_URL
+        self.client_mode = settings.REDIS_CLIENT
+        self.redis_client: Optional[Any] = None  # Created on first use
+        # Fallback in-memory cache (also used during Redis outages)
+        self.memory_cache = MemoryCache(
+            max_entries=settings.MEMORY_CACHE_MAX_ENTRIES,
+            max_bytes=settings.MEMORY_CACHE_MAX_BYTES,
+            sweep_interval=settings.MEMORY_CACHE_SWEEP_INTERVAL,
+        )
+        self.memory_locks: dict = {}  # lock name -> (token, expires_at)
+        self._redis_down_until = 0.0
+
+        # Two-tier mode: L1 in this process, Redis as L2
+        self.l1_enabled = settings.CACHE_L1_ENABLED and self.client_mode != "sync"
+        self.l1 = MemoryCache(
+            max_entries=settings.CACHE_L1_MAX_ENTRIES,
+            max_bytes=settings.CACHE_L1_MAX_BYTES,
+            sweep_interval=settings.MEMORY_CACHE_SWEEP_INTERVAL,
+        )
+        self.l2_hits = 0
+        self.l2_misses = 0
+        self.instance_id = uuid.uuid4().hex  # Lets us ignore our own invalidations
+        self._listener: Optional[asyncio.Task] = None
+        self._handlers: Dict[str, Callable[[Any], None]] = {}  # pub/sub channel -> handler
+
+        if self.redis_url:
+            logger.info(f"ℹ️ Redis configured ({self.client_mode} client), connecting on first use")
         else:
             logger.info("ℹ️ REDIS_URL not set, using in-memory cache")
-    
+
+    @property
+    def use_redis(self) -> bool:
+        """True when Redis is configured and not in a failure back-off."""
+        return bool(self.redis_url) and time.monotonic() >= self._redis_down_until
+
+    def _client(self):
+        if self.redis_client is None:
+            options = dict(
+                decode_responses=True,
+                max_connections=settings.REDIS_MAX_CONNECTIONS,
+                socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
+                socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+                retry_on_timeout=True,
+            )
+            if self.client_mode == "sync":
+                self.redis_client = redis.Redis(connection_pool=redis.BlockingConnectionPool.from_url(
+                    self.redis_url, timeout=settings.REDIS_POOL_TIMEOUT, **options))
+            else:
+                self.redis_client = aioredis.Redis(connection_pool=aioredis.BlockingConnectionPool.from_url(
+                    self.redis_url, timeout=settings.REDIS_POOL_TIMEOUT, **options))
+        return self.redis_client
+
+    async def _redis(self, command: str, *args, **kwargs) -> Any:
+        """Runs a Redis command on whichever client is configured."""
+        method = getattr(self._client(), command)
+        if self.client_mode == "sync":
+            return await asyncio.to_thread(method, *args, **kwargs)
+        return await method(*args, **kwargs)
+
+    async def _redis_pipeline(self, *commands) -> list:
+        """Runs several (command, *args) tuples in one round trip."""
+        client = self._client()
+
+        def queue(pipe):
+            for command, *args in commands:
+                getattr(pipe, command)(*args)
+            return pipe
+
+        if self.client_mode == "sync":
+            return await asyncio.to_thread(lambda: queue(client.pipeline(transaction=False)).execute())
+        return await queue(client.pipeline(transaction=False)).execute()
+
+    def _redis_failed(self, op: str, e: Exception):
+        """Back off to the memory cache for a while after a connection-level failure."""
+        if isinstance(e, (redis.ConnectionError, redis.TimeoutError)):
+            self._redis_down_until = time.monotonic() + settings.REDIS_RETRY_INTERVAL
+            logger.warning(f"⚠️ Redis unavailable during {op}, using in-memory cache for {settings.REDIS_RETRY_INTERVAL}s: {e}")
+        else:
+            logger.error(f"Cache {op} error: {e}")
+
     async def get(self, key: str) -> Optional[Any]:
-        """Get value from cache (Redis or memory)."""
+        """Get value from cache (L1, then Redis, or memory)."""
+        if self.use_redis:
+            if self.l1_enabled:
+                value = self.l1.get(key)
+                if value is not None:
+                    return value
+            try:
+                if self.l1_enabled:
+                    # Fetch the remaining TTL in the same round trip so L1 never outlives L2
+                    raw, pttl = await self._redis_pipeline(("get", key), ("pttl", key))
+                else:
+                    raw, pttl = await self._redis("get", key), None
+            except Exception as e:
+                self._redis_failed(f"GET {key}", e)
+                return self.memory_cache.get(key)
+
+            if not raw:
+                self.l2_misses += 1
+                return None
+            self.l2_hits += 1
+            value = json.loads(raw)
+            if self.l1_enabled and pttl and pttl > 0:
+                self.l1.set(key, value, min(settings.CACHE_L1_TTL, pttl / 1000), size=len(raw))
+            return value
+        # In-memory fallback
+        return self.memory_cache.get(key)
+
+    async def mget(self, keys: list) -> list:
+        """
+        Get several values at once, in the order of `keys` (None for misses).
+        L1 is checked first; everything else is one Redis round trip.
+        """
+        if not self.use_redis:
+            return [self.memory_cache.get(key) for key in keys]
+
+        values = [self.l1.get(key) if self.l1_enabled else None for key in keys]
+        missing = [i for i, value in enumerate(values) if value is None]
+        if not missing:
+            return values
+
+        missing_keys = [keys[i] for i in missing]
         try:
-            if self.use_redis and self.redis_client:
-                value = self.redis_client.get(key)
-                if value:
-                    return json.loads(value)
+            if self.l1_enabled:
+                raws, *pttls = await self._redis_pipeline(("mget", missing_keys), *[("pttl", k) for k in missing_keys])
             else:
-                # In-memory fallback
-                return self.memory_cache.get(key)
+                raws, pttls = await self._redis("mget", missing_keys), [None] * len(missing_keys)
         except Exception as e:
-            logger.error(f"Cache GET error for {key}: {e}")
-            return None
-    
+            self._redis_failed("MGET", e)
+            return [self.memory_cache.get(key) for key in keys]
+
+        for i, raw, pttl in zip(missing, raws, pttls):
+            if not raw:
+                self.l2_misses += 1
+                continue
+            self.l2_hits += 1
+            values[i] = json.loads(raw)
+            if self.l1_enabled and pttl and pttl > 0:
+                self.l1.set(keys[i], values[i], min(settings.CACHE_L1_TTL, pttl / 1000), size=len(raw))
+        return values
+
     async def set(self, key: str, value: Any, ttl: int = 600):
         """
         Set value in cache with TTL (default 10 minutes).
-        
+
         Args:
             key: Cache key
             value: Value to cache (will be JSON serialized)
@@ -61,41 +197,209 @@ class CacheService:
         """
         try:
             serialized = json.dumps(value)
-            
-            if self.use_redis and self.redis_client:
-                self.redis_client.setex(key, ttl, serialized)
-            else:
-                # In-memory fallback (no TTL enforcement for simplicity)
-                self.memory_cache[key] = value
-                
-                # Simple memory cleanup: keep only last 1000 items
-                if len(self.memory_cache) > 1000:
-                    # Remove oldest 200 items
-                    keys_to_remove = list(self.memory_cache.keys())[:200]
-                    for k in keys_to_remove:
-                        del self.memory_cache[k]
         except Exception as e:
             logger.error(f"Cache SET error for {key}: {e}")
-    
+            return
+
+        if self.use_redis:
+            try:
+                await self._redis("setex", key, ttl, serialized)
+                if self.l1_enabled:
+                    self.l1.set(key, value, min(settings.CACHE_L1_TTL, ttl), size=len(serialized))
+                    await self._publish_invalidation(keys=[key])
+                return
+            except Exception as e:
+                self._redis_failed(f"SET {key}", e)
+
+        # In-memory fallback, sized by the serialized length
+        self.memory_cache.set(key, value, ttl, size=len(serialized))
+
     async def delete(self, key: str):
         """Delete key from cache."""
-        try:
-            if self.use_redis and self.redis_client:
-                self.redis_client.delete(key)
-            else:
-                self.memory_cache.pop(key, None)
-        except Exception as e:
-            logger.error(f"Cache DELETE error for {key}: {e}")
-    
+        self.memory_cache.delete(key)
+        self.l1.delete(key)
+        if self.use_redis:
+            try:
+                await self._redis("delete", key)
+                await self._publish_invalidation(keys=[key])
+            except Exception as e:
+                self._redis_failed(f"DELETE {key}", e)
+
     async def clear(self):
         """Clear all cache."""
+        self.memory_cache.clear()
+        self.l1.clear()
+        if self.use_redis:
+            try:
+                await self._redis("flushdb")
+                await self._publish_invalidation(clear=True)
+            except Exception as e:
+                self._redis_failed("CLEAR", e)
+
+    async def acquire_lock(self, name: str, ttl_ms: int) -> Optional[str]:
+        """
+        Try to take a short-lived lock shared by all workers.
+
+        Returns an ownership token, or None if someone else holds the lock.
+        The lease expires on its own after ttl_ms, so a crashed holder
+        can't block others for long. Without Redis the lock is per-process.
+        """
+        token = uuid.uuid4().hex
+        if self.use_redis:
+            try:
+                acquired = await self._redis("set", f"lock:{name}", token, nx=True, px=ttl_ms)
+                return token if acquired else None
+            except Exception as e:
+                self._redis_failed(f"LOCK {name}", e)
+                return None
+
+        now = time.monotonic()
+        held = self.memory_locks.get(name)
+        if held and held[1] > now:
+            return None
+        self.memory_locks[name] = (token, now + ttl_ms / 1000)
+        return token
+
+    async def release_lock(self, name: str, token: str):
+        """Release a lock taken with acquire_lock, if we still own it."""
+        held = self.memory_locks.get(name)
+        if held and held[0] == token:
+            del self.memory_locks[name]
+            return
+        if self.use_redis:
+            try:
+                await self._redis("eval", RELEASE_LOCK_SCRIPT, 1, f"lock:{name}", token)
+            except Exception as e:
+                self._redis_failed(f"UNLOCK {name}", e)
+
+    async def is_locked(self, name: str) -> bool:
+        """Whether someone holds the lock right now. True if Redis can't tell (keep waiting)."""
+        if self.use_redis:
+            try:
+                return bool(await self._redis("exists", f"lock:{name}"))
+            except Exception as e:
+                self._redis_failed(f"LOCKED {name}", e)
+                return True
+
+        held = self.memory_locks.get(name)
+        return bool(held and held[1] > time.monotonic())
+
+    async def extend_lock(self, name: str, token: str, ttl_ms: int) -> bool:
+        """Renew a lease taken with acquire_lock. False if it expired or someone else holds it now."""
+        if self.use_redis:
+            try:
+                return bool(await self._redis("eval", EXTEND_LOCK_SCRIPT, 1, f"lock:{name}", token, ttl_ms))
+            except Exception as e:
+                self._redis_failed(f"EXTEND {name}", e)
+                return False
+
+        now = time.monotonic()
+        held = self.memory_locks.get(name)
+        if not held or held[0] != token or held[1] <= now:
+            return False
+        self.memory_locks[name] = (token, now + ttl_ms / 1000)
+        return True
+
+    async def publish(self, channel: str, data: Any):
+        """Broadcast a JSON message to every worker subscribed to channel (no-op without Redis)."""
+        if not self.use_redis:
+            return
         try:
-            if self.use_redis and self.redis_client:
-                self.redis_client.flushdb()
-            else:
-                self.memory_cache.clear()
+            await self._redis("publish", channel, json.dumps(data))
         except Exception as e:
-            logger.error(f"Cache CLEAR error: {e}")
+            self._redis_failed(f"PUBLISH {channel}", e)
+
+    def subscribe(self, channel: str, handler: Callable[[Any], None]):
+        """
+        Call handler with each decoded message published on channel. Register
+        before start(); needs Redis and the async client.
+        """
+        self._handlers[channel] = handler
+
+    def _dispatch(self, channel: str, raw: str):
+        if channel == settings.CACHE_INVALIDATION_CHANNEL:
+            self._apply_invalidation(raw)
+            return
+        handler = self._handlers.get(channel)
+        if handler is None:
+            return
+        try:
+            handler(json.loads(raw))
+        except Exception as e:
+            logger.error(f"Handler for {channel} failed: {e}")
+
+    async def _publish_invalidation(self, keys: Optional[list] = None, clear: bool = False):
+        if not self.l1_enabled:
+            return
+        message = json.dumps({"origin": self.instance_id, "keys": keys or [], "clear": clear})
+        await self._redis("publish", settings.CACHE_INVALIDATION_CHANNEL, message)
+
+    def _apply_invalidation(self, raw: str):
+        try:
+            message = json.loads(raw)
+        except (TypeError, ValueError):
+            return
+        if message.get("origin") == self.instance_id:
+            return
+        if message.get("clear"):
+            self.l1.clear()
+        for key in message.get("keys", []):
+            self.l1.delete(key)
+
+    async def start(self):
+        """Start listening for cross-worker L1 invalidations and subscribed channels (app startup)."""
+        listen = self.l1_enabled or (self._handlers and self.client_mode != "sync")
+        if self.redis_url and listen and self._listener is None:
+            self._listener = asyncio.create_task(self._listen_for_invalidations())
+
+    async def _listen_for_invalidations(self):
+        while True:
+            try:
+                pubsub = self._client().pubsub()
+                await pubsub.subscribe(settings.CACHE_INVALIDATION_CHANNEL, *self._handlers)
+                # Anything cached before (re)subscribing may have missed messages
+                self.l1.clear()
+                try:
+                    async for message in pubsub.listen():
+                        if message.get("type") == "message":
+                            self._dispatch(message.get("channel"), message.get("data"))
+                finally:
+                    await pubsub.aclose()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Cache invalidation listener lost Redis, retrying: {e}")
+                self.l1.clear()
+                await asyncio.sleep(settings.REDIS_RETRY_INTERVAL)
+
+    def stats(self) -> dict:
+        l1 = self.l1.stats()
+        l2_lookups = self.l2_hits + self.l2_misses
+        return {
+            "backend": "redis" if self.use_redis else "memory",
+            "l1": l1,
+            "l2": {
+                "hits": self.l2_hits,
+                "misses": self.l2_misses,
+                "hit_ratio": round(self.l2_hits / l2_lookups, 3) if l2_lookups else 0.0,
+            },
+            "memory": self.memory_cache.stats(),
+        }
+
+    async def close(self):
+        """Close pooled Redis connections (app shutdown)."""
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        if self.redis_client is not None:
+            try:
+                if self.client_mode == "sync":
+                    self.redis_client.close()
+                else:
+                    await self.redis_client.aclose()
+            except Exception as e:
+                logger.error(f"Cache CLOSE error: {e}")
+            self.redis_client = None
 
 # Global cache instance
 cache = CacheService()
@@ -0,0 +1,105 @@
+import logging
+import time
+from collections import deque
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} circuit open, retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Error-rate circuit breaker for one upstream.
+
+    Closed: calls go through and outcomes are tracked over a rolling window.
+    Once at least min_calls happened in the window and the failure rate
+    reaches failure_threshold, the circuit opens and calls fail fast for
+    reset_timeout seconds. Then it goes half-open and lets one trial call
+    through: success closes it, failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: float = 0.5, min_calls: int = 10,
+                 window: float = 60.0, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.min_calls = min_calls
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._outcomes: deque = deque()  # (timestamp, ok)
+        self._opened_at = 0.0
+        self._next_trial_at = 0.0
+        self.rejected = 0
+        self.times_opened = 0
+
+    def allow(self) -> bool:
+        """Whether a call may go to the upstream right now."""
+        now = time.monotonic()
+        if self.state == "closed":
+            return True
+        if self.state == "open" and now - self._opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            self._next_trial_at = now
+        if self.state == "half_open" and now >= self._next_trial_at:
+            # One trial at a time; if it never reports back, allow another later
+            self._next_trial_at = now + self.reset_timeout
+            return True
+        self.rejected += 1
+        return False
+
+    def check(self):
+        """Like allow(), but raises CircuitOpenError when the call must not go through."""
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_after())
+
+    def retry_after(self) -> float:
+        if self.state == "open":
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+        return max(0.0, self._next_trial_at - time.monotonic())
+
+    def record_success(self):
+        if self.state == "half_open":
+            logger.info(f"✅ {self.name} circuit closed")
+            self.state = "closed"
+            self._outcomes.clear()
+        self._record(True)
+
+    def record_failure(self):
+        if self.state == "half_open":
+            self._open()
+            return
+        self._record(False)
+        if self.state == "closed" and len(self._outcomes) >= self.min_calls:
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            if failures / len(self._outcomes) >= self.failure_threshold:
+                self._open()
+
+    def _record(self, ok: bool):
+        now = time.monotonic()
+        self._outcomes.append((now, ok))
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            self._outcomes.popleft()
+
+    def _open(self):
+        logger.warning(f"🚨 {self.name} circuit opened, failing fast for {self.reset_timeout}s")
+        self.state = "open"
+        self._opened_at = time.monotonic()
+        self.times_opened += 1
+
+    def stats(self) -> Dict[str, Any]:
+        failures = sum(1 for _, ok in self._outcomes if not ok)
+        return {
+            "state": self.state,
+            "window_calls": len(self._outcomes),
+            "window_failures": failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,277 @@
+"""
+Character n-gram TF-IDF index over song titles, artists and channels.
+
+Gives "more like this" for tracks the ALS model has never seen. Texts are
+hashed into n_features buckets (HashingVectorizer, so appending songs needs
+no vocabulary refit), weighted by sublinear tf x idf and L2-normalized once
+when added, so a query is just sparse dot products.
+
+Storage is split in two, LSM style:
+
+    main    feature x doc CSR (posting lists), built in bulk
+    delta   doc x feature CSR of songs appended since the last merge
+
+A query is scored in two steps, so it never walks the huge posting lists
+of common n-grams ("the", "ove", ...) and never builds the dense
+doc x doc cosine_similarity matrix:
+
+    1. the query's rarer n-grams (df <= QUERY_MAX_DF of the corpus) are
+       multiplied against main, one sparse product for a whole batch of
+       queries; the best RERANK_CANDIDATES documents per query are kept
+    2. the common n-grams left out of step 1 are added to those documents'
+       scores by binary search in their posting lists, giving the exact
+       cosine, and the top k are returned
+
+The delta is small and always scored exactly; it is merged into main once
+it reaches max_delta rows.
+
+A song whose text changes is re-added as a new document and its old one
+is dropped from results. Appended documents use the idf at the time they
+are added; a rebuild re-weights everything with the current document
+frequencies and drops replaced documents.
+"""
+import os
+import threading
+import zlib
+from typing import Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+from app.utils.dedup import normalize_title
+
+N_FEATURES = 1 << 20
+# n-grams in more than this share of the corpus (and more than QUERY_MIN_DF
+# documents) are left out of candidate generation
+QUERY_MAX_DF = 0.01
+QUERY_MIN_DF = 1000
+RERANK_CANDIDATES = 500
+
+
+def song_text(title: Optional[str], artist: Optional[str], channel: Optional[str] = None) -> str:
+    # normalize_title drops "(Official Audio)"-style noise shared by unrelated songs
+    parts = [normalize_title(title), normalize_title(artist)]
+    channel = normalize_title(channel)
+    if channel and channel != parts[1]:
+        parts.append(channel)
+    return " ".join(part for part in parts if part)
+
+
+def _checksum(text: str) -> int:
+    # Stable across processes (unlike hash()), so it can be saved with the index
+    return zlib.crc32(text.encode("utf-8"))
+
+
+class ContentIndex:
+    def __init__(self, n_features: int = N_FEATURES, ngram: int = 3, max_delta: int = 20000):
+        self.n_features = n_features
+        self.ngram = ngram
+        self.max_delta = max_delta
+        self.ids: List[str] = []  # Per document; a re-indexed song appears more than once
+        self.positions = {}  # video id -> its current document
+        self.df = np.zeros(n_features, dtype=np.int32)
+        self._checksums = np.empty(0, dtype=np.uint32)  # Per document, of the indexed text
+        self._live = np.empty(0, dtype=bool)  # False once a document was replaced
+        self._main = sparse.csr_matrix((n_features, 0), dtype=np.float32)
+        self._delta = sparse.csr_matrix((0, n_features), dtype=np.float32)
+        self._delta_t = self._delta.T.tocsr()  # Kept transposed for queries
+        self._vectorizer = HashingVectorizer(
+            analyzer="char_wb", ngram_range=(ngram, ngram), n_features=n_features,
+            alternate_sign=False, norm=None, lowercase=True, dtype=np.float32,
+        )
+        # Appends replace the matrices; queries read whichever pair is current
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def __contains__(self, video_id: str) -> bool:
+        return video_id in self.positions
+
+    def _tf(self, texts: Sequence[str]) -> sparse.csr_matrix:
+        tf = self._vectorizer.transform(texts)
+        tf.data = 1 + np.log(tf.data)  # Sublinear tf: repeated n-grams count less
+        return tf
+
+    def _weigh(self, tf: sparse.csr_matrix) -> sparse.csr_matrix:
+        """tf -> L2-normalized tf-idf rows with the current document frequencies."""
+        n = max(len(self.ids), 1)
+        df = self.df[tf.indices]
+        weighted = tf.copy()
+        weighted.data = tf.data * (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+        rows = np.repeat(np.arange(weighted.shape[0]), np.diff(weighted.indptr))
+        norms = np.sqrt(np.bincount(rows, weighted.data.astype(np.float64) ** 2, minlength=weighted.shape[0]))
+        norms[norms == 0] = 1
+        weighted.data = (weighted.data / norms[rows]).astype(np.float32)
+        return weighted
+
+    def _count_df(self, tf: sparse.csr_matrix):
+        np.add.at(self.df, tf.indices, 1)
+
+    @classmethod
+    def build(cls, ids: Sequence[str], texts: Sequence[str], **kwargs) -> "ContentIndex":
+        """Bulk build: every document is weighted with the final idf."""
+        index = cls(**kwargs)
+        keep = {}
+        for vid, text in zip(ids, texts):
+            keep.setdefault(vid, text)
+        index.ids = list(keep)
+        index.positions = {vid: i for i, vid in enumerate(index.ids)}
+        index._checksums = np.fromiter((_checksum(text) for text in keep.values()), dtype=np.uint32, count=len(keep))
+        index._live = np.ones(len(keep), dtype=bool)
+        tf = index._tf(list(keep.values()))
+        index._count_df(tf)
+        index._main = index._weigh(tf).T.tocsr()
+        index._main.sort_indices()
+        return index
+
+    def append(self, ids: Iterable[str], texts: Iterable[str]) -> int:
+        """Adds songs not indexed yet and re-indexes songs whose text changed; returns how many."""
+        new = {}
+        for vid, text in zip(ids, texts):
+            if vid in new:
+                continue
+            checksum = _checksum(text)
+            doc = self.positions.get(vid)
+            if doc is None or self._checksums[doc] != checksum:
+                new[vid] = (text, checksum)
+        if not new:
+            return 0
+        tf = self._tf([text for text, _ in new.values()])
+        with self._lock:
+            self._count_df(tf)
+            replaced = [self.positions[vid] for vid in new if vid in self.positions]
+            start = len(self.ids)
+            self.ids.extend(new)
+            self.positions.update((vid, start + i) for i, vid in enumerate(new))
+            self._checksums = np.concatenate([
+                self._checksums, np.fromiter((checksum for _, checksum in new.values()), dtype=np.uint32)])
+            live = np.concatenate([self._live, np.ones(len(new), dtype=bool)])
+            live[replaced] = False
+            self._live = live
+            self._delta = sparse.vstack([self._delta, self._weigh(tf)], format="csr")
+            self._delta_t = self._delta.T.tocsr()
+            if self._delta.shape[0] >= self.max_delta:
+                self._merge()
+        return len(new)
+
+    def _merge(self):
+        if self._delta.shape[0]:
+            self._main = sparse.hstack([self._main, self._delta_t], format="csr")
+            self._main.sort_indices()
+        self._delta = sparse.csr_matrix((0, self.n_features), dtype=np.float32)
+        self._delta_t = self._delta.T.tocsr()
+
+    def _candidates(self, q: sparse.csr_matrix, main: sparse.csr_matrix) -> Tuple[sparse.csr_matrix, np.ndarray]:
+        """
+        Partial scores against main from each query row's rarer n-grams, and
+        a mask over q's entries of the n-grams left out (still to be added).
+        """
+        common = self.df[q.indices] > max(QUERY_MAX_DF * len(self.ids), QUERY_MIN_DF)
+        # A query made only of common n-grams still needs candidates: keep its rarest one
+        rows = np.repeat(np.arange(q.shape[0]), np.diff(q.indptr))
+        kept = np.bincount(rows[~common], minlength=q.shape[0])
+        for row in np.flatnonzero((kept == 0) & (np.diff(q.indptr) > 0)):
+            lo, hi = q.indptr[row], q.indptr[row + 1]
+            common[lo + np.argmin(self.df[q.indices[lo:hi]])] = False
+        gen = q.copy()
+        gen.data[common] = 0
+        gen.eliminate_zeros()
+        return gen @ main, common
+
+    @staticmethod
+    def _rescore(main: sparse.csr_matrix, features: np.ndarray, weights: np.ndarray,
+                 docs: np.ndarray) -> np.ndarray:
+        """Dot products of docs (sorted columns of main) with the given query entries."""
+        scores = np.zeros(len(docs), dtype=np.float32)
+        for feature, weight in zip(features, weights):
+            lo, hi = main.indptr[feature], main.indptr[feature + 1]
+            if lo == hi:
+                continue
+            posting = main.indices[lo:hi]
+            pos = np.minimum(np.searchsorted(posting, docs), hi - lo - 1)
+            hit = posting[pos] == docs
+            scores[hit] += weight * main.data[lo + pos[hit]]
+        return scores
+
+    def query(self, texts: Sequence[str], k: int, exclude: Iterable[str] = ()) -> List[List[Tuple[str, float]]]:
+        """Top k (video id, cosine) per query text, best first."""
+        with self._lock:
+            main, delta_t, ids = self._main, self._delta_t, self.ids
+            live = self._live.copy()
+        for vid in exclude:
+            doc = self.positions.get(vid)
+            if doc is not None and doc < len(live):
+                live[doc] = False
+        q = self._weigh(self._tf(texts))
+        candidates, common = self._candidates(q, main)
+        delta = q @ delta_t if delta_t.shape[1] else None
+        n_main = main.shape[1]
+
+        results = []
+        for row in range(q.shape[0]):
+            lo, hi = candidates.indptr[row], candidates.indptr[row + 1]
+            docs, values = candidates.indices[lo:hi], candidates.data[lo:hi]
+            keep = live[docs]
+            docs, values = docs[keep], values[keep]
+            if len(docs) > RERANK_CANDIDATES:
+                best = np.argpartition(-values, RERANK_CANDIDATES - 1)[:RERANK_CANDIDATES]
+                docs, values = docs[best], values[best]
+            qlo, qhi = q.indptr[row], q.indptr[row + 1]
+            left_out = common[qlo:qhi]
+            if left_out.any():
+                # Sorted, so the binary searches walk each posting list in order
+                order = np.argsort(docs)
+                docs, values = docs[order], values[order]
+                values = values + self._rescore(main, q.indices[qlo:qhi][left_out], q.data[qlo:qhi][left_out], docs)
+
+            if delta is not None:
+                dlo, dhi = delta.indptr[row], delta.indptr[row + 1]
+                delta_docs = delta.indices[dlo:dhi] + n_main
+                keep = live[delta_docs]
+                docs = np.concatenate([docs, delta_docs[keep]])
+                values = np.concatenate([values, delta.data[dlo:dhi][keep]])
+
+            top = min(k, len(values))
+            if top <= 0:
+                results.append([])
+                continue
+            best = np.argpartition(-values, top - 1)[:top]
+            best = best[np.argsort(-values[best])]
+            results.append([(ids[docs[i]], float(values[i])) for i in best])
+        return results
+
+    def save(self, path: str, synced_at: float = 0.0):
+        """Writes the index (delta merged in) atomically."""
+        with self._lock:
+            self._merge()
+            main = self._main
+            ids = list(self.ids)
+            checksums, live = self._checksums, self._live
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp.npz"
+        np.savez(
+            tmp,
+            ids=np.asarray(ids, dtype=str),
+            df=self.df,
+            checksums=checksums,
+            live=live,
+            data=main.data, indices=main.indices, indptr=main.indptr,
+            meta=np.array([self.n_features, self.ngram, self.max_delta, synced_at], dtype=np.float64),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> Tuple["ContentIndex", float]:
+        """(index, synced_at) from a file written by save()."""
+        with np.load(path) as data:
+            n_features, ngram, max_delta, synced_at = data["meta"].tolist()
+            index = cls(n_features=int(n_features), ngram=int(ngram), max_delta=int(max_delta))
+            index.ids = data["ids"].tolist()
+            index.df = data["df"]
+            index._checksums = data["checksums"]
+            index._live = data["live"]
+            index._main = sparse.csr_matrix(
+                (data["data"], data["indices"], data["indptr"]), shape=(index.n_features, len(index.ids)))
+            index._main.has_sorted_indices = True  # save() only writes sorted matrices
+        index.positions = {vid: i for i, vid in enumerate(index.ids) if index._live[i]}
+        return index, synced_at
@@ -0,0 +1,73 @@
+import re
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+
+# Compiled once: these run for every candidate of every search
+_BRACKETED = re.compile(r"[\(\[].*?[\)\]]")
+_NON_ALNUM = re.compile(r"[^a-zA-Z0-9\s]")
+
+# Two items are the same song if their titles normalize equal and their
+# durations are at most this many seconds apart
+DURATION_WINDOW = 10
+
+
+def normalize_title(s: Optional[str]) -> str:
+    """Title comparison key: bracketed parts and special chars removed, lowercased."""
+    if not s:
+        return ""
+    s = _BRACKETED.sub("", s)  # Remove content inside brackets
+    s = _NON_ALNUM.sub("", s)  # Remove special chars
+    return s.lower().strip()
+
+
+class DedupIndex:
+    """
+    Set of accepted results that answers "is this a duplicate?" in O(1).
+
+    Each item's normalized title is computed once when it is checked, and
+    items are bucketed by (title key, duration // DURATION_WINDOW). A match
+    within the window can only sit in the item's own bucket or the two next
+    to it, so lookups never scan the other accepted results.
+    """
+
+    def __init__(self):
+        self._buckets: Dict[Tuple[str, int], List[int]] = {}
+        self._ids: Set[Hashable] = set()
+
+    @staticmethod
+    def _key(item: Dict[str, Any]) -> Tuple[str, int]:
+        return normalize_title(item.get('title')), item.get('duration') or 0
+
+    def _find(self, title: str, duration: int) -> bool:
+        bucket = duration // DURATION_WINDOW
+        for b in (bucket - 1, bucket, bucket + 1):
+            for other in self._buckets.get((title, b), ()):
+                if abs(duration - other) <= DURATION_WINDOW:
+                    return True
+        return False
+
+    def __contains__(self, item: Dict[str, Any]) -> bool:
+        if item.get('id') is not None and item['id'] in self._ids:
+            return True
+        return self._find(*self._key(item))
+
+    def add(self, item: Dict[str, Any]):
+        title, duration = self._key(item)
+        self._insert(item, title, duration)
+
+    def add_if_new(self, item: Dict[str, Any]) -> bool:
+        """Adds the item unless it duplicates one already in; returns whether it was added."""
+        if item.get('id') is not None and item['id'] in self._ids:
+            return False
+        title, duration = self._key(item)
+        if self._find(title, duration):
+            return False
+        self._insert(item, title, duration)
+        return True
+
+    def _insert(self, item: Dict[str, Any], title: str, duration: int):
+        self._buckets.setdefault((title, duration // DURATION_WINDOW), []).append(duration)
+        if item.get('id') is not None:
+            self._ids.add(item['id'])
+
+    def __len__(self) -> int:
+        return sum(len(durations) for durations in self._buckets.values())
@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionTimeout(asyncio.TimeoutError):
+    """Raised when an extraction job does not finish within its deadline."""
+
+
+class _JobLimiter:
+    """Concurrency limit plus queue/wait metrics for one kind of job."""
+
+    def __init__(self, name: str, limit: int, timeout: float):
+        self.name = name
+        self.loop = asyncio.get_running_loop()
+        self.limit = limit
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(limit)
+        self.waiting = 0
+        self.running = 0
+        self.max_queue_depth = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.cancelled = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def record_wait(self, wait_ms: float):
+        self.total_wait_ms += wait_ms
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+    def stats(self) -> Dict[str, Any]:
+        started = self.submitted - self.waiting
+        return {
+            "limit": self.limit,
+            "timeout_s": self.timeout,
+            "queue_depth": self.waiting,
+            "max_queue_depth": self.max_queue_depth,
+            "running": self.running,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timed_out": self.timed_out,
+            "cancelled": self.cancelled,
+            "avg_wait_ms": round(self.total_wait_ms / started, 1) if started > 0 else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 1),
+        }
+
+
+class ExtractionExecutor:
+    """
+    Runs blocking yt-dlp extractions off the event loop.
+
+    Jobs are grouped by kind ("search", "stream") and each kind has its own
+    concurrency limit, so a burst of searches can't starve stream lookups.
+    A slot stays taken until the worker really finishes, even if the caller
+    timed out or was cancelled, which keeps the pool bounded.
+    """
+
+    def __init__(self):
+        self._executor: Optional[Executor] = None
+        self._limiters: Dict[str, _JobLimiter] = {}
+        self._limits = {
+            "search": (settings.EXTRACTION_SEARCH_CONCURRENCY, settings.EXTRACTION_SEARCH_TIMEOUT),
+            "stream": (settings.EXTRACTION_STREAM_CONCURRENCY, settings.EXTRACTION_STREAM_TIMEOUT),
+        }
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            workers = settings.EXTRACTION_MAX_WORKERS
+            if settings.EXTRACTION_EXECUTOR == "process":
+                self._executor = ProcessPoolExecutor(max_workers=workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="yt-extract")
+            logger.info(f"Extraction executor started ({settings.EXTRACTION_EXECUTOR}, {workers} workers)")
+        return self._executor
+
+    def _limiter(self, kind: str) -> _JobLimiter:
+        # Semaphores bind to the running loop, so create them lazily
+        limiter = self._limiters.get(kind)
+        if limiter is None or limiter.loop is not asyncio.get_running_loop():
+            limit, timeout = self._limits.get(kind, self._limits["stream"])
+            limiter = _JobLimiter(kind, limit, timeout)
+            self._limiters[kind] = limiter
+        return limiter
+
+    async def run(self, kind: str, fn: Callable, *args, timeout: Optional[float] = None) -> Any:
+        """
+        Runs fn(*args) in the pool under the limits for `kind`.
+
+        The timeout covers queueing and execution. Raises ExtractionTimeout
+        when it expires; cancelling the caller cancels the pending job.
+        """
+        limiter = self._limiter(kind)
+        deadline = timeout if timeout is not None else limiter.timeout
+        limiter.submitted += 1
+        try:
+            return await asyncio.wait_for(self._acquire_and_run(limiter, fn, args), deadline)
+        except asyncio.TimeoutError:
+            limiter.timed_out += 1
+            logger.warning(f"⏱️ {kind} extraction timed out after {deadline}s")
+            raise ExtractionTimeout(f"{kind} extraction timed out after {deadline}s")
+        except asyncio.CancelledError:
+            limiter.cancelled += 1
+            raise
+        except Exception:
+            limiter.failed += 1
+            raise
+
+    async def _acquire_and_run(self, limiter: _JobLimiter, fn: Callable, args: tuple) -> Any:
+        loop = asyncio.get_running_loop()
+        queued_at = time.monotonic()
+
+        limiter.waiting += 1
+        limiter.max_queue_depth = max(limiter.max_queue_depth, limiter.waiting)
+        try:
+            await limiter.semaphore.acquire()
+        finally:
+            limiter.waiting -= 1
+        limiter.record_wait((time.monotonic() - queued_at) * 1000)
+
+        def _release():
+            limiter.running -= 1
+            limiter.semaphore.release()
+
+        def _on_done(_):
+            try:
+                loop.call_soon_threadsafe(_release)
+            except RuntimeError:
+                pass  # Loop already closed (shutdown)
+
+        try:
+            future = self.executor.submit(fn, *args)
+        except Exception:
+            limiter.semaphore.release()
+            raise
+        limiter.running += 1
+        future.add_done_callback(_on_done)
+
+        result = await asyncio.wrap_future(future)
+        limiter.completed += 1
+        return result
+
+    def has_capacity(self, kind: str, reserve: int = 0) -> bool:
+        """True if nothing is queued for `kind` and more than `reserve` slots are free."""
+        limiter = self._limiters.get(kind)
+        if limiter is None:
+            return True
+        return limiter.waiting == 0 and limiter.running < limiter.limit - reserve
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": settings.EXTRACTION_EXECUTOR,
+            "max_workers": settings.EXTRACTION_MAX_WORKERS,
+            "jobs": {kind: limiter.stats() for kind, limiter in self._limiters.items()},
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Global executor instance
+extraction_executor = ExtractionExecutor()
@@ -0,0 +1,210 @@
+"""
+Versioned on-disk export of ALS factors.
+
+Layout under the store root:
+
+    CURRENT                  name of the live version (swapped with os.replace)
+    <version>/meta.json
+    <version>/user_factors.npy   float32 (n_users, factors)
+    <version>/item_factors.npy   float32 (n_items, factors)
+    <version>/user_ids.npy       fixed-width unicode (n_users,)
+    <version>/item_ids.npy       fixed-width unicode (n_items,)
+    <version>/<extra>.npy        optional derived arrays (e.g. the ivf_* similarity index)
+
+Arrays are opened with mmap_mode="r", so every worker on the host shares
+the same pages through the OS page cache instead of holding its own copy.
+Old versions are left on disk (up to `keep`) so workers still mapping them
+keep working until they pick up the new CURRENT.
+"""
+import json
+import os
+import shutil
+import time
+from functools import cached_property
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from app.utils.ivf_index import IVFIndex
+
+CURRENT_FILE = "CURRENT"
+ARRAYS = ("user_factors", "item_factors", "user_ids", "item_ids")
+# Bytes top_items_batch may spend per chunk on scores (float32) plus argpartition's indices (int64)
+SCORE_MEMORY_BUDGET = 64 << 20
+
+
+class ALSFactors:
+    """One loaded (memory-mapped) factor version plus its id -> row indexes."""
+
+    def __init__(self, version: str, path: str, user_factors: np.ndarray, item_factors: np.ndarray,
+                 user_ids: np.ndarray, item_ids: np.ndarray, meta: Dict,
+                 extras: Optional[Dict[str, np.ndarray]] = None):
+        self.version = version
+        self.path = path
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        self.user_ids = user_ids
+        self.item_ids = item_ids
+        self.meta = meta
+        self.extras = extras or {}
+        self.user_index: Dict[str, int] = {uid: i for i, uid in enumerate(user_ids.tolist())}
+
+    # Only needed for item-item similarity, so built on first use
+
+    @cached_property
+    def item_index(self) -> Dict[str, int]:
+        return {vid: i for i, vid in enumerate(self.item_ids.tolist())}
+
+    @cached_property
+    def item_norms(self) -> np.ndarray:
+        return np.maximum(np.linalg.norm(self.item_factors, axis=1), 1e-12)
+
+    @cached_property
+    def item_gram(self) -> np.ndarray:
+        """Y^T Y over all item factors, shared by every fold-in."""
+        item_factors = np.asarray(self.item_factors, dtype=np.float64)
+        return item_factors.T @ item_factors
+
+    @cached_property
+    def ivf(self) -> Optional[IVFIndex]:
+        return IVFIndex.from_arrays(self.extras)
+
+    def user_vector(self, user_id: str) -> Optional[np.ndarray]:
+        idx = self.user_index.get(user_id)
+        return None if idx is None else self.user_factors[idx]
+
+    def fold_in(self, video_ids: Sequence[str], weights: Optional[Sequence[float]] = None,
+                regularization: float = 0.1) -> Optional[np.ndarray]:
+        """
+        User vector for a list of interactions with the item factors held
+        fixed: the exact ALS user step (confidence = summed weight per item).
+        Ids the model doesn't know are ignored; None if none are known.
+        """
+        if weights is None:
+            weights = [1.0] * len(video_ids)
+        index = self.item_index
+        pairs = [(index[vid], w) for vid, w in zip(video_ids, weights) if vid in index]
+        if not pairs:
+            return None
+        rows, confidence = np.unique([r for r, _ in pairs], return_inverse=True)
+        confidence = np.bincount(confidence, weights=[w for _, w in pairs])
+        Y = np.asarray(self.item_factors[rows], dtype=np.float64)
+        A = self.item_gram + Y.T @ ((confidence - 1)[:, None] * Y) + regularization * np.eye(Y.shape[1])
+        return np.linalg.solve(A, Y.T @ confidence).astype(np.float32)
+
+    def top_items(self, vector: np.ndarray, n: int, exclude: Sequence[int] = ()) -> List[str]:
+        """Item ids with the highest dot product against vector, best first."""
+        scores = self.item_factors @ vector
+        if len(exclude):
+            scores = scores.copy()
+            scores[list(exclude)] = -np.inf
+        n = min(n, len(scores))
+        if n <= 0:
+            return []
+        top = np.argpartition(-scores, n - 1)[:n]
+        top = top[np.argsort(-scores[top])]
+        return [str(self.item_ids[i]) for i in top if np.isfinite(scores[i])]
+
+
+    def top_items_batch(self, vectors: np.ndarray, n: int,
+                        memory_budget: int = SCORE_MEMORY_BUDGET) -> List[List[str]]:
+        """
+        top_items for many vectors: one matrix multiply and row-wise partition
+        per chunk, with as many rows per chunk as fit in memory_budget bytes.
+        """
+        n_items = len(self.item_ids)
+        n = min(n, n_items)
+        results: List[List[str]] = []
+        if n <= 0:
+            return [[] for _ in range(len(vectors))]
+        chunk = max(1, memory_budget // (n_items * 12))
+        for start in range(0, len(vectors), chunk):
+            scores = np.asarray(vectors[start:start + chunk]) @ self.item_factors.T
+            # Partitioning scores itself (no negated copy): the top n end up in the last n columns
+            top = np.argpartition(scores, n_items - n, axis=1)[:, n_items - n:]
+            order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            results.extend([str(self.item_ids[i]) for i in row] for row in top)
+        return results
+
+
+def current_version(root: str) -> Optional[str]:
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def export_factors(root: str, user_ids: Sequence[str], item_ids: Sequence[str],
+                   user_factors: np.ndarray, item_factors: np.ndarray, keep: int = 3,
+                   extra_arrays: Optional[Dict[str, np.ndarray]] = None, meta: Optional[Dict] = None) -> str:
+    """
+    Writes a new version (plus any extra arrays and meta.json fields) and
+    makes it CURRENT. Returns the version name.
+    """
+    user_factors = np.ascontiguousarray(user_factors, dtype=np.float32)
+    item_factors = np.ascontiguousarray(item_factors, dtype=np.float32)
+    if user_factors.shape[0] != len(user_ids) or item_factors.shape[0] != len(item_ids):
+        raise ValueError("factor rows don't match the id lists")
+
+    os.makedirs(root, exist_ok=True)
+    # Sorts chronologically (pruning relies on it)
+    now_ns = time.time_ns()
+    version = time.strftime("%Y%m%dT%H%M%S", time.gmtime(now_ns // 10**9)) + f"-{now_ns % 10**9:09d}"
+    staging = os.path.join(root, f".{version}.tmp")
+    os.makedirs(staging)
+
+    np.save(os.path.join(staging, "user_factors.npy"), user_factors)
+    np.save(os.path.join(staging, "item_factors.npy"), item_factors)
+    np.save(os.path.join(staging, "user_ids.npy"), np.asarray(list(user_ids), dtype=str))
+    np.save(os.path.join(staging, "item_ids.npy"), np.asarray(list(item_ids), dtype=str))
+    for name, array in (extra_arrays or {}).items():
+        np.save(os.path.join(staging, f"{name}.npy"), array)
+    with open(os.path.join(staging, "meta.json"), "w") as f:
+        json.dump({
+            "version": version,
+            "created_at": time.time(),
+            "factors": int(user_factors.shape[1]),
+            "n_users": len(user_ids),
+            "n_items": len(item_ids),
+            **(meta or {}),
+        }, f)
+
+    # Complete directory first, then flip the pointer; readers see old or new, never half
+    os.rename(staging, os.path.join(root, version))
+    pointer_tmp = os.path.join(root, f".{CURRENT_FILE}.{version}.tmp")
+    with open(pointer_tmp, "w") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer_tmp, os.path.join(root, CURRENT_FILE))
+
+    _prune(root, keep, version)
+    return version
+
+
+def load_factors(root: str, version: Optional[str] = None) -> Optional[ALSFactors]:
+    """Memory-maps the given (default: CURRENT) version, or returns None if there is none."""
+    version = version or current_version(root)
+    if not version:
+        return None
+    path = os.path.join(root, version)
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    arrays = {
+        name[:-4]: np.load(os.path.join(path, name), mmap_mode="r")
+        for name in os.listdir(path) if name.endswith(".npy")
+    }
+    core = {name: arrays.pop(name) for name in ARRAYS}
+    return ALSFactors(version, path, meta=meta, extras=arrays, **core)
+
+
+def _prune(root: str, keep: int, current: str):
+    versions = sorted(
+        name for name in os.listdir(root)
+        if not name.startswith(".") and name != CURRENT_FILE and os.path.isdir(os.path.join(root, name))
+    )
+    for name in versions[:-keep] if keep > 0 else versions:
+        if name == current:
+            continue
+        # Workers still mapping it keep their (now unlinked) pages until they reload
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
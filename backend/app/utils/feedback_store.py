@@ -0,0 +1,198 @@
+"""
+Per (user, item) implicit-feedback aggregates for ALS, kept in one
+columnar .npz file.
+
+Columns, one row per (user, item) pair, sorted by pair:
+
+    users, items   int32 codes into user_ids / item_ids
+    plays          float32 summed completion ratio of plays that weren't skips
+    skips          int32 plays abandoned before FEEDBACK_SKIP_RATIO of the track
+    feedback       int8 latest explicit feedback (LIKE, DISLIKE, NOT_RELEVANT or 0)
+    weights        float32 training confidence derived from the above
+
+plus per-user checkpoints (the last analytics event and feedback keys
+aggregated), so every run only reads events pushed since the previous one.
+New events are merged into the columns with vectorized group-bys; no
+per-pair Python objects are kept.
+"""
+import os
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+LIKE, DISLIKE, NOT_RELEVANT = 1, -1, -2
+FEEDBACK_CODES = {"like": LIKE, "dislike": DISLIKE, "not_relevant": NOT_RELEVANT}
+WEIGHT_COLUMNS = ("user_ids", "item_ids", "users", "items", "weights")
+
+
+class FeedbackWeights:
+    """Just the columns training needs, read straight from the file."""
+
+    def __init__(self, user_ids: np.ndarray, item_ids: np.ndarray, users: np.ndarray,
+                 items: np.ndarray, weights: np.ndarray):
+        self.user_ids = user_ids
+        self.item_ids = item_ids
+        self.users = users
+        self.items = items
+        self.weights = weights
+
+        self._user_codes: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.weights)
+
+    def for_user(self, user_id: str) -> Dict[str, float]:
+        """Item id -> confidence of one user's pairs (0 for dislikes and "not relevant")."""
+        if self._user_codes is None:
+            self._user_codes = {uid: i for i, uid in enumerate(self.user_ids.tolist())}
+        code = self._user_codes.get(user_id)
+        if code is None:
+            return {}
+        # Rows are sorted by pair, so one user's rows are contiguous
+        lo, hi = np.searchsorted(self.users, [code, code + 1])
+        return {str(self.item_ids[item]): float(weight)
+                for item, weight in zip(self.items[lo:hi], self.weights[lo:hi])}
+
+
+def load_weights(path: str) -> Optional[FeedbackWeights]:
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return FeedbackWeights(*(data[name] for name in WEIGHT_COLUMNS))
+
+
+class FeedbackStore:
+    def __init__(self):
+        self.user_ids: List[str] = []
+        self.item_ids: List[str] = []
+        self.user_codes: Dict[str, int] = {}
+        self.item_codes: Dict[str, int] = {}
+        self.keys = np.empty(0, dtype=np.int64)  # (user << 32) | item, sorted
+        self.plays = np.empty(0, dtype=np.float32)
+        self.skips = np.empty(0, dtype=np.int32)
+        self.feedback = np.empty(0, dtype=np.int8)
+        # user id -> (last event key, last feedback key) aggregated
+        self.checkpoints: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+        self._pending: Dict[str, list] = {"keys": [], "plays": [], "skips": [], "feedback": []}
+
+    @classmethod
+    def load(cls, path: str) -> "FeedbackStore":
+        """The saved store, or an empty one if there is none yet."""
+        store = cls()
+        if not os.path.exists(path):
+            return store
+        with np.load(path) as data:
+            store.user_ids = data["user_ids"].tolist()
+            store.item_ids = data["item_ids"].tolist()
+            store.keys = (data["users"].astype(np.int64) << 32) | data["items"]
+            store.plays = data["plays"]
+            store.skips = data["skips"]
+            store.feedback = data["feedback"]
+            store.checkpoints = {
+                uid: (event or None, feedback or None)
+                for uid, event, feedback in zip(data["checkpoint_users"].tolist(),
+                                                data["checkpoint_events"].tolist(),
+                                                data["checkpoint_feedback"].tolist())
+            }
+        store.user_codes = {uid: i for i, uid in enumerate(store.user_ids)}
+        store.item_codes = {vid: i for i, vid in enumerate(store.item_ids)}
+        return store
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _key(self, user_id: str, item_id: str) -> int:
+        user = self.user_codes.get(user_id)
+        if user is None:
+            user = self.user_codes[user_id] = len(self.user_ids)
+            self.user_ids.append(user_id)
+        item = self.item_codes.get(item_id)
+        if item is None:
+            item = self.item_codes[item_id] = len(self.item_ids)
+            self.item_ids.append(item_id)
+        return (user << 32) | item
+
+    def _append(self, key: int, plays: float = 0.0, skips: int = 0, feedback: int = 0):
+        pending = self._pending
+        pending["keys"].append(key)
+        pending["plays"].append(plays)
+        pending["skips"].append(skips)
+        pending["feedback"].append(feedback)
+
+    def add_play(self, user_id: str, item_id: str, duration_played: Optional[float],
+                 duration: Optional[float], skip_ratio: float):
+        """One play event: counts its completion ratio, or a skip if it ended early."""
+        if not item_id:
+            return
+        played = max(float(duration_played or 0), 0.0)
+        if duration:
+            completion = min(played / float(duration), 1.0)
+        else:
+            # Older events have no track length: anything past 30s counts as a full play
+            completion = 1.0 if played >= 30 else 0.0
+        if completion < skip_ratio:
+            self._append(self._key(user_id, item_id), skips=1)
+        else:
+            self._append(self._key(user_id, item_id), plays=completion)
+
+    def add_feedback(self, user_id: str, item_id: str, kind: str):
+        """Explicit feedback; the latest one per pair wins."""
+        code = FEEDBACK_CODES.get(kind)
+        if item_id and code is not None:
+            self._append(self._key(user_id, item_id), feedback=code)
+
+    def merge(self):
+        """Folds the events added since the last merge into the columns."""
+        if not self._pending["keys"]:
+            return
+        pending = self._pending
+        keys = np.concatenate([self.keys, np.array(pending["keys"], dtype=np.int64)])
+        unique, inverse = np.unique(keys, return_inverse=True)
+        plays = np.bincount(inverse, weights=np.concatenate([self.plays, pending["plays"]]), minlength=len(unique))
+        skips = np.bincount(inverse, weights=np.concatenate([self.skips, pending["skips"]]), minlength=len(unique))
+
+        # Latest non-zero feedback per pair (existing rows come first, then events in order)
+        feedback = np.concatenate([self.feedback, np.array(pending["feedback"], dtype=np.int8)])
+        given = np.flatnonzero(feedback)
+        latest = np.full(len(unique), -1, dtype=np.int64)
+        np.maximum.at(latest, inverse[given], given)
+        merged_feedback = np.zeros(len(unique), dtype=np.int8)
+        has = latest >= 0
+        merged_feedback[has] = feedback[latest[has]]
+
+        self.keys = unique
+        self.plays = plays.astype(np.float32)
+        self.skips = skips.astype(np.int32)
+        self.feedback = merged_feedback
+        self._pending = {"keys": [], "plays": [], "skips": [], "feedback": []}
+
+    def weights(self, like_weight: float, skip_weight: float) -> np.ndarray:
+        """
+        Confidence per pair: completed plays (repeats add up), plus like_weight
+        for a like, minus skip_weight per skip, never below 0. Dislikes and
+        "not relevant" zero the pair out.
+        """
+        weights = self.plays + like_weight * (self.feedback == LIKE) - skip_weight * self.skips
+        weights[(self.feedback == DISLIKE) | (self.feedback == NOT_RELEVANT)] = 0
+        return np.maximum(weights, 0).astype(np.float32)
+
+    def save(self, path: str, like_weight: float, skip_weight: float):
+        """Merges pending events and atomically replaces the file at path."""
+        self.merge()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        checkpoints = list(self.checkpoints.items())
+        tmp = f"{path}.tmp.npz"
+        np.savez(
+            tmp,
+            user_ids=np.asarray(self.user_ids, dtype=str),
+            item_ids=np.asarray(self.item_ids, dtype=str),
+            users=(self.keys >> 32).astype(np.int32),
+            items=(self.keys & 0xFFFFFFFF).astype(np.int32),
+            plays=self.plays,
+            skips=self.skips,
+            feedback=self.feedback,
+            weights=self.weights(like_weight, skip_weight),
+            checkpoint_users=np.asarray([uid for uid, _ in checkpoints], dtype=str),
+            checkpoint_events=np.asarray([event or "" for _, (event, _) in checkpoints], dtype=str),
+            checkpoint_feedback=np.asarray([feedback or "" for _, (_, feedback) in checkpoints], dtype=str),
+        )
+        os.replace(tmp, path)
@@ -0,0 +1,88 @@
+"""
+Growable typed arrays of (user, item, weight) interactions for ALS training.
+
+Events are appended straight into int32 code arrays and a float32 weight
+array (doubling capacity when full), with user/item ids interned to codes
+as they arrive. Memory is ~12 bytes per event plus one dict entry per
+distinct user and item, instead of a Python dict per event and a DataFrame
+copy of all of them.
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from scipy.sparse import csr_matrix
+
+
+class InteractionBuffer:
+    def __init__(self, capacity: int = 1 << 16):
+        self._users = np.empty(capacity, dtype=np.int32)
+        self._items = np.empty(capacity, dtype=np.int32)
+        self._weights = np.empty(capacity, dtype=np.float32)
+        self._size = 0
+        # id -> code, codes assigned in order of first appearance
+        self.user_codes: Dict[str, int] = {}
+        self.item_codes: Dict[str, int] = {}
+        self._overrides: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _reserve(self, extra: int):
+        needed = self._size + extra
+        capacity = len(self._users)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in ("_users", "_items", "_weights"):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def add(self, user_id: str, video_ids: Iterable[str], weight: float = 1.0):
+        """Appends one event per video id (ids that are empty are skipped)."""
+        items = self.item_codes
+        codes = [items.setdefault(vid, len(items)) for vid in video_ids if vid]
+        if not codes:
+            return
+        user = self.user_codes.setdefault(user_id, len(self.user_codes))
+        n = len(codes)
+        self._reserve(n)
+        end = self._size + n
+        self._users[self._size:end] = user
+        self._items[self._size:end] = codes
+        self._weights[self._size:end] = weight
+        self._size = end
+
+    def override_weights(self, user_ids: Sequence[str], item_ids: Sequence[str],
+                         users: np.ndarray, items: np.ndarray, weights: np.ndarray):
+        """
+        Replaces the summed event weights of the given (user, item) pairs
+        (codes into user_ids / item_ids) with `weights`; a 0 drops the pair.
+        Pairs and users that had no events are added.
+        """
+        user_map = np.fromiter((self.user_codes.setdefault(u, len(self.user_codes)) for u in user_ids),
+                               dtype=np.int32, count=len(user_ids))
+        item_map = np.fromiter((self.item_codes.setdefault(i, len(self.item_codes)) for i in item_ids),
+                               dtype=np.int32, count=len(item_ids))
+        self._overrides = (user_map[users], item_map[items], np.asarray(weights, dtype=np.float32))
+
+    def user_ids(self) -> List[str]:
+        """User ids in code order (row i of the matrix is user_ids()[i])."""
+        return list(self.user_codes)
+
+    def item_ids(self) -> List[str]:
+        return list(self.item_codes)
+
+    def to_csr(self) -> csr_matrix:
+        """user x item matrix; repeated (user, item) events add up, then overrides apply."""
+        n = self._size
+        shape = (len(self.user_codes), len(self.item_codes))
+        matrix = csr_matrix((self._weights[:n], (self._users[:n], self._items[:n])), shape=shape)
+        if self._overrides is None:
+            return matrix
+        users, items, weights = self._overrides
+        overridden = csr_matrix((np.ones(len(users), dtype=np.float32), (users, items)), shape=shape)
+        matrix = matrix - matrix.multiply(overridden) + csr_matrix((weights, (users, items)), shape=shape)
+        matrix.eliminate_zeros()
+        return matrix.tocsr()
@@ -0,0 +1,96 @@
+"""
+Inverted-file (IVF) index for approximate cosine nearest neighbours.
+
+Vectors are clustered with spherical k-means; a query only scores the items
+in its n_probe closest clusters. Everything is plain NumPy arrays so the
+index can be saved next to the factors and memory-mapped by every worker.
+"""
+from typing import Dict, Optional, Sequence, Tuple
+import numpy as np
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class IVFIndex:
+    """
+    centroids: (n_lists, dim) unit vectors
+    offsets:   (n_lists + 1,) list boundaries into items
+    items:     (n,) row numbers of the indexed vectors, grouped by list
+    """
+
+    ARRAYS = ("ivf_centroids", "ivf_offsets", "ivf_items")
+
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray, items: np.ndarray):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.items = items
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, n_lists: Optional[int] = None, iterations: int = 10,
+              sample: int = 100_000, seed: int = 0, chunk: int = 65536) -> "IVFIndex":
+        """Clusters unit vectors (rows of `vectors`) into n_lists lists (default ~sqrt(n))."""
+        vectors = normalize(vectors)
+        n = len(vectors)
+        n_lists = max(1, min(n, n_lists or int(np.sqrt(n))))
+        rng = np.random.default_rng(seed)
+
+        # Fit centroids on a sample; assigning all rows afterwards is one more pass
+        train = vectors[rng.choice(n, min(n, sample), replace=False)]
+        centroids = train[rng.choice(len(train), n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(train @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, train)
+            empty = np.bincount(assign, minlength=n_lists) == 0
+            # Re-seed empty lists from random training rows
+            sums[empty] = train[rng.choice(len(train), int(empty.sum()))]
+            centroids = normalize(sums)
+
+        assign = np.concatenate([
+            np.argmax(vectors[i:i + chunk] @ centroids.T, axis=1) for i in range(0, n, chunk)
+        ])
+        items = np.argsort(assign, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=n_lists))])
+        return cls(centroids.astype(np.float32), offsets.astype(np.int64), items.astype(np.int64))
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return dict(zip(self.ARRAYS, (self.centroids, self.offsets, self.items)))
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> Optional["IVFIndex"]:
+        if not all(name in arrays for name in cls.ARRAYS):
+            return None
+        return cls(*(arrays[name] for name in cls.ARRAYS))
+
+    def candidates(self, query: np.ndarray, n_probe: int) -> np.ndarray:
+        """Rows in the n_probe lists whose centroids are closest to the (unit) query."""
+        n_probe = min(n_probe, len(self.centroids))
+        probes = np.argpartition(-(self.centroids @ query), n_probe - 1)[:n_probe]
+        return np.concatenate([self.items[self.offsets[p]:self.offsets[p + 1]] for p in probes])
+
+
+def top_k_cosine(vectors: np.ndarray, norms: np.ndarray, query: np.ndarray, k: int,
+                 rows: Optional[np.ndarray] = None, exclude: Sequence[int] = ()) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Exact top-k by cosine similarity among `rows` (default: all rows of
+    vectors). Returns (rows, scores), best first.
+    """
+    query = normalize(query)
+    if rows is None:
+        scores = (vectors @ query) / norms
+        rows = np.arange(len(vectors))
+    else:
+        scores = (vectors[rows] @ query) / norms[rows]
+    if len(exclude):
+        keep = ~np.isin(rows, np.asarray(exclude))
+        rows, scores = rows[keep], scores[keep]
+    k = min(k, len(rows))
+    if k <= 0:
+        return rows[:0], scores[:0]
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return rows[top], scores[top]
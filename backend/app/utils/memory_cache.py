@@ -0,0 +1,118 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class MemoryCache:
+    """
+    In-process LRU cache with per-entry TTLs.
+
+    Bounded by entry count and by approximate size in bytes (the length of
+    the entry's JSON encoding). Expiry is checked on every read, and expired
+    entries are also swept from the whole cache at most once per
+    sweep_interval seconds, piggybacking on normal get/set traffic.
+    Values are stored as-is, so callers must copy before mutating them.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, sweep_interval: float = 60.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        # key -> (value, expires_at, size)
+        self._entries: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._last_sweep = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and entry[1] > time.monotonic()
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.monotonic()
+        self._maybe_sweep(now)
+
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry[1] <= now:
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def ttl(self, key: str) -> float:
+        """Seconds left before the entry expires, 0 when absent or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return 0.0
+        return max(0.0, entry[1] - time.monotonic())
+
+    def set(self, key: str, value: Any, ttl: float, size: int = 1):
+        now = time.monotonic()
+        self._maybe_sweep(now)
+
+        if key in self._entries:
+            self._remove(key)
+        if ttl <= 0 or size > self.max_bytes:
+            return
+
+        self._entries[key] = (value, now + ttl, size)
+        self._bytes += size
+
+        # Evict least recently used entries until we're back within bounds
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def delete(self, key: str):
+        if key in self._entries:
+            self._remove(key)
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def sweep(self) -> int:
+        """Drops every expired entry. Returns how many were removed."""
+        now = time.monotonic()
+        self._last_sweep = now
+        expired = [key for key, (_, expires_at, _) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            self._remove(key)
+        self.expirations += len(expired)
+        return len(expired)
+
+    def _maybe_sweep(self, now: float):
+        if now - self._last_sweep >= self.sweep_interval:
+            self.sweep()
+
+    def _remove(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
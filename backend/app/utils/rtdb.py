@@ -0,0 +1,49 @@
+"""
+Paged reads over the Realtime Database for jobs that walk every user.
+
+The Firebase Admin SDK blocks, so each request runs in a thread. Only one
+page of children is held at a time.
+"""
+import asyncio
+from typing import Any, AsyncIterator, List, Optional, Tuple
+
+PUSH_CHARS = "-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz"
+
+def push_key_prefix(timestamp_ms: int) -> str:
+    """
+    The 8-character timestamp prefix of Firebase push keys. Every key
+    pushed at or after timestamp_ms sorts at or after it.
+    """
+    chars = []
+    for _ in range(8):
+        chars.append(PUSH_CHARS[timestamp_ms % 64])
+        timestamp_ms //= 64
+    return "".join(reversed(chars))
+
+async def child_keys(ref) -> List[str]:
+    """Keys directly under ref, without their data (shallow read)."""
+    return list(await asyncio.to_thread(ref.get, shallow=True) or {})
+
+async def iter_child_pages(ref, page_size: int, start_at: Optional[str] = None,
+                           after: Optional[str] = None) -> AsyncIterator[List[Tuple[str, Any]]]:
+    """
+    Yields the children of ref as lists of (key, value) in key order, at
+    most page_size per list. start_at includes that key; after skips
+    everything up to and including it (e.g. the last key already processed).
+    """
+    start, exclusive = (after, True) if after is not None else (start_at, False)
+    while True:
+        query = ref.order_by_key()
+        if start is not None:
+            query = query.start_at(start)
+        # start_at is inclusive: for an exclusive bound fetch one extra and drop it
+        page = await asyncio.to_thread(query.limit_to_first(page_size + exclusive).get)
+        entries = list((page or {}).items())
+        if exclusive and entries and entries[0][0] == start:
+            entries = entries[1:]
+        if not entries:
+            return
+        yield entries
+        if len(entries) < page_size:
+            return
+        start, exclusive = entries[-1][0], True
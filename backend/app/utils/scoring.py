@@ -0,0 +1,149 @@
+import json
+import logging
+from itertools import chain
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set
+import ahocorasick
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Built-in keyword weights (title matches are summed, each keyword counted once)
+DEFAULT_TITLE_WEIGHTS: Dict[str, int] = {
+    # Block words (Severe penalty)
+    **{w: -50 for w in [
+        "trailer", "teaser", "reaction", "interview", "dialogue", "scene",
+        "bgm", "remix", "cover", "shorts", "status", "video song", # sometimes video song is okay, but we prefer audio
+        "full movie", "movie review", "podcast", "episode", "discussion",
+        "8d", "16d", "3d", "slowed", "reverb", "bass boosted", "nightcore",
+        "mashup", "karaoke", "instrumental",
+    ]},
+    # Boost words (Reward)
+    **{w: 10 for w in [
+        "official audio", "lyrical", "full song", "soundtrack", "audio",
+        "original", "topic", # Artist - Topic
+    ]},
+}
+
+# Channel Trust (Heuristic): the best matching keyword counts
+DEFAULT_CHANNEL_WEIGHTS: Dict[str, int] = {"topic": 5, "vevo": 5, "records": 5}
+
+
+class KeywordMatcher:
+    """
+    Finds which of a fixed set of keywords occur in a text in one pass,
+    using an Aho-Corasick automaton built once. Overlapping and nested
+    keywords ("audio" inside "official audio") are all reported, like the
+    per-keyword `in` checks this replaces.
+    """
+
+    def __init__(self, weights: Dict[str, int]):
+        lowered = {k.lower(): w for k, w in weights.items() if k}
+        self.keywords: List[str] = list(lowered)
+        self._weights: List[int] = list(lowered.values())
+        self.weights = np.array(self._weights, dtype=np.int64)
+        self._automaton: Optional[ahocorasick.Automaton] = None
+        if self.keywords:
+            self._automaton = ahocorasick.Automaton()
+            for i, keyword in enumerate(self.keywords):
+                self._automaton.add_word(keyword, i)
+            self._automaton.make_automaton()
+
+    def match(self, text: str) -> Set[int]:
+        """Indices (into self.keywords) of the keywords occurring in lowercased text."""
+        if self._automaton is None or not text:
+            return set()
+        return {i for _, i in self._automaton.iter(text)}
+
+    def match_many(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Matches a batch of lowercased texts with one scan over their
+        concatenation (repeated texts, e.g. channel names, are scanned once).
+        Returns a (len(texts), len(keywords)) bool matrix.
+        """
+        unique = list(dict.fromkeys(texts))
+        found = np.zeros((len(unique), len(self.keywords)), dtype=bool)
+        if self._automaton is not None and unique:
+            # Keywords never contain a newline, so nothing matches across texts
+            hits = list(self._automaton.iter("\n".join(unique)))
+            if hits:
+                flat = np.fromiter(chain.from_iterable(hits), dtype=np.int64, count=2 * len(hits))
+                starts = np.cumsum([0] + [len(t) + 1 for t in unique[:-1]])
+                rows = np.searchsorted(starts, flat[0::2], side="right") - 1
+                found[rows, flat[1::2]] = True
+        if len(unique) == len(texts):
+            return found
+        row_of = {t: i for i, t in enumerate(unique)}
+        return found[[row_of[t] for t in texts]]
+
+
+class VideoScorer:
+    """
+    Scores a video to determine if it's a high-quality music track.
+    Higher score = better match.
+
+    Title keywords add their weight once each; the best matching channel
+    keyword adds its weight; duration adds the fixed bonus/penalty below.
+    """
+
+    def __init__(self, title_weights: Optional[Dict[str, int]] = None,
+                 channel_weights: Optional[Dict[str, int]] = None):
+        self.title = KeywordMatcher(DEFAULT_TITLE_WEIGHTS if title_weights is None else title_weights)
+        self.channel = KeywordMatcher(DEFAULT_CHANNEL_WEIGHTS if channel_weights is None else channel_weights)
+
+    @classmethod
+    def from_file(cls, path: Optional[str]) -> "VideoScorer":
+        """Built-in weights, with any section present in the JSON file at `path` replacing them."""
+        if not path:
+            return cls()
+        try:
+            with open(path) as f:
+                config = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not load scoring keywords from {path}, using defaults: {e}")
+            return cls()
+        return cls(config.get("title"), config.get("channel"))
+
+    @staticmethod
+    def _duration_score(duration: Optional[float]) -> int:
+        if not duration:
+            return 0
+        if 120 <= duration <= 420: # 2 to 7 mins
+            return 10
+        if duration < 60: # Shorts/Snippets
+            return -20
+        if duration > 720: # > 12 mins (likely jukebox/full movie)
+            return -10
+        return 0
+
+    def score(self, title: str, duration: Optional[float], channel: str) -> int:
+        weights = self.title._weights
+        score = sum(weights[i] for i in self.title.match((title or "").lower()))
+        channel_hits = self.channel.match((channel or "").lower())
+        if channel_hits:
+            score += max(self.channel._weights[i] for i in channel_hits)
+        return score + self._duration_score(duration)
+
+    def score_many(self, entries: Iterable[Dict[str, Any]]) -> np.ndarray:
+        """Scores a batch of search entries (title/duration/uploader dicts) at once."""
+        entries = list(entries)
+        n = len(entries)
+        scores = np.zeros(n, dtype=np.int64)
+        if not n:
+            return scores
+
+        titles = [(e.get('title') or "").lower() for e in entries]
+        scores += self.title.match_many(titles) @ self.title.weights
+
+        channels = [(e.get('uploader') or e.get('channel') or "").lower() for e in entries]
+        channel_hits = self.channel.match_many(channels)
+        if channel_hits.any():
+            best = np.where(channel_hits, self.channel.weights, np.iinfo(np.int64).min).max(axis=1)
+            scores += np.where(channel_hits.any(axis=1), best, 0)
+
+        durations = np.array([e.get('duration') or 0 for e in entries], dtype=np.float64)
+        scores += np.select(
+            [durations == 0, (durations >= 120) & (durations <= 420), durations < 60, durations > 720],
+            [0, 10, -20, -10],
+            default=0,
+        )
+        return scores
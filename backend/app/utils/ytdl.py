@@ -0,0 +1,146 @@
+"""
+Worker-side yt-dlp helpers.
+
+These functions run inside the extraction executor (thread or process pool),
+so they must stay picklable and must not import the rest of the app.
+"""
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+import yt_dlp
+
+logger = logging.getLogger(__name__)
+
+
+class YDLPool:
+    """
+    Pool of warm YoutubeDL instances for one options profile.
+
+    Building a YoutubeDL re-processes options and re-registers every
+    extractor, and throws away the player/signature caches the previous one
+    built. Instances here are reused instead, and recycled after max_uses
+    extractions, as soon as one raises, or when the caller discard()s it
+    (with ignoreerrors a failed extraction returns None instead of raising).
+    """
+
+    def __init__(self, opts: Dict[str, Any], max_uses: int, max_idle: int,
+                 factory: Optional[Callable[[Dict[str, Any]], yt_dlp.YoutubeDL]] = None):
+        self.opts = opts
+        self.max_uses = max_uses
+        self.factory = factory or yt_dlp.YoutubeDL
+        # LIFO so the most recently used (warmest) instance goes out first
+        self._idle: "queue.LifoQueue" = queue.LifoQueue(maxsize=max_idle)
+        self._lock = threading.Lock()
+        self._discarded = set()  # ids of leased instances to retire on return
+        self.created = 0
+        self.reused = 0
+        self.recycled = 0
+
+    @contextmanager
+    def lease(self) -> Iterator[yt_dlp.YoutubeDL]:
+        try:
+            ydl, uses = self._idle.get_nowait()
+            with self._lock:
+                self.reused += 1
+        except queue.Empty:
+            ydl, uses = self.factory(self.opts), 0
+            with self._lock:
+                self.created += 1
+
+        try:
+            yield ydl
+        except BaseException:
+            self._retire(ydl)
+            raise
+        finally:
+            with self._lock:
+                discarded = id(ydl) in self._discarded
+                self._discarded.discard(id(ydl))
+
+        uses += 1
+        if discarded or uses >= self.max_uses:
+            self._retire(ydl)
+            return
+        try:
+            self._idle.put_nowait((ydl, uses))
+        except queue.Full:
+            self._retire(ydl)
+
+    def discard(self, ydl: yt_dlp.YoutubeDL):
+        """Retires a leased instance when its lease ends instead of reusing it."""
+        with self._lock:
+            self._discarded.add(id(ydl))
+
+    def _retire(self, ydl: yt_dlp.YoutubeDL):
+        with self._lock:
+            self.recycled += 1
+        try:
+            ydl.close()
+        except Exception as e:
+            logger.debug(f"Error closing YoutubeDL: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "idle": self._idle.qsize(),
+            "created": self.created,
+            "reused": self.reused,
+            "recycled": self.recycled,
+        }
+
+
+# One pool per options profile, per process
+_pools: Dict[str, YDLPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(profile: str, opts: Dict[str, Any], max_uses: int = 100, max_idle: int = 8) -> YDLPool:
+    pool = _pools.get(profile)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(profile)
+            if pool is None:
+                pool = _pools[profile] = YDLPool(opts, max_uses, max_idle)
+    return pool
+
+
+def pool_stats() -> Dict[str, Dict[str, int]]:
+    return {profile: pool.stats() for profile, pool in _pools.items()}
+
+
+def extract_info(profile: str, opts: Dict[str, Any], url: str,
+                 max_uses: int = 100, max_idle: int = 8) -> Optional[Dict[str, Any]]:
+    """Runs a blocking yt-dlp extraction on a pooled instance and returns the info dict."""
+    pool = get_pool(profile, opts, max_uses, max_idle)
+    with pool.lease() as ydl:
+        info = ydl.extract_info(url, download=False)
+        if info is None:
+            pool.discard(ydl)
+        return info
+
+
+def iter_entries(profile: str, opts: Dict[str, Any], url: str, emit: Callable[[Dict[str, Any]], bool],
+                 max_uses: int = 100, max_idle: int = 8) -> Optional[int]:
+    """
+    Like extract_info, but hands playlist/search entries to emit() one by one
+    while yt-dlp is still paging through them. emit() returns False to stop
+    early. Returns the number of entries emitted, or None if extraction failed.
+
+    emit is a plain callable, so this only works in the thread executor.
+    """
+    emitted = 0
+    pool = get_pool(profile, opts, max_uses, max_idle)
+    with pool.lease() as ydl:
+        # process=False leaves `entries` as yt-dlp's lazy page generator
+        info = ydl.extract_info(url, download=False, process=False)
+        if info is None:
+            pool.discard(ydl)
+            return None
+        for entry in info.get('entries') or ():
+            if entry is None:
+                continue
+            emitted += 1
+            if not emit(entry):
+                break
+    return emitted
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Search Dedup Benchmark
+Pairwise dedup (the original SearchService loop) vs the DedupIndex used now,
+on synthetic candidate pools with ~30% near-duplicates.
+
+    python benchmarks/bench_dedup.py --sizes 50 500 1000 5000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.search_service import SearchService
+
+SUFFIXES = ["", " (Official Audio)", " [Lyrics]", " - Remastered", " (Live)", "!!"]
+
+def make_pool(size: int, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    songs = [(f"Artist {rng.randint(0, 500)} - Song {i}", rng.randint(120, 420)) for i in range(int(size * 0.7) or 1)]
+    pool = []
+    for i in range(size):
+        title, duration = rng.choice(songs) if rng.random() < 0.3 else songs[i % len(songs)]
+        pool.append({
+            "id": f"v{i}",
+            "title": title + rng.choice(SUFFIXES),
+            "duration": duration + rng.randint(-8, 8),
+        })
+    return pool
+
+def legacy_normalize(s: str) -> str:
+    if not s: return ""
+    s = re.sub(r"[\(\[].*?[\)\]]", "", s)
+    s = re.sub(r"[^a-zA-Z0-9\s]", "", s)
+    return s.lower().strip()
+
+def legacy_dedupe(pool: list) -> list:
+    unique = []
+    for item in pool:
+        is_dup = False
+        for existing in unique:
+            if abs(item.get('duration', 0) - existing.get('duration', 0)) > 10:
+                continue
+            if legacy_normalize(item.get('title')) == legacy_normalize(existing.get('title')):
+                is_dup = True
+                break
+        if not is_dup:
+            unique.append(item)
+    return unique
+
+def timed(fn, pool: list, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(pool)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 500, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    service = SearchService()
+
+    print("=" * 60)
+    print("🎵 SEARCH DEDUP BENCHMARK")
+    print("=" * 60)
+    print(f"{'pool':>6} {'unique':>7} {'pairwise':>12} {'index':>10} {'speedup':>8}")
+    for size in args.sizes:
+        pool = make_pool(size)
+        legacy_ms, expected = timed(legacy_dedupe, pool, args.repeat)
+        index_ms, result = timed(service._dedupe, pool, args.repeat)
+        assert result == expected, "index dedup disagrees with pairwise dedup"
+        print(f"{size:>6} {len(result):>7} {legacy_ms:>10.2f}ms {index_ms:>8.2f}ms {legacy_ms / index_ms:>7.1f}x")
+    print("=" * 60)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+ALS Ingestion Memory Benchmark
+Peak RSS of turning N synthetic play events into the training matrix:
+
+  legacy  whole users tree as one dict -> list of dicts -> DataFrame -> CSR
+          (the old get_all_interactions + pandas path)
+  stream  history pages appended into InteractionBuffer -> CSR
+
+Each mode runs in its own subprocess so the peaks don't mix.
+
+    python benchmarks/bench_interactions.py --events 10000000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+EVENTS_PER_USER = 100
+ITEMS = 1_000_000
+
+def rss_mb() -> float:
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def user_pages(events: int, page_size: int, seed: int = 0):
+    """(user_id, page of history entries) in the order Firebase would hand them out."""
+    rng = np.random.default_rng(seed)
+    for u in range(max(1, events // EVENTS_PER_USER)):
+        n = min(EVENTS_PER_USER, events - u * EVENTS_PER_USER)
+        # Zipf-ish popularity, like real listening
+        items = (rng.zipf(1.3, n) - 1) % ITEMS
+        for start in range(0, n, page_size):
+            yield f"user{u:07d}", {
+                f"-push{u:07d}{i:04d}": {"id": f"v{vid:07d}", "title": "Song", "artist": "Artist"}
+                for i, vid in enumerate(items[start:start + page_size], start)
+            }
+
+def run_legacy(events: int, page_size: int):
+    import pandas as pd
+    from scipy.sparse import csr_matrix
+
+    # db.reference('users').get(): the whole tree at once
+    snapshot = {}
+    for user_id, page in user_pages(events, page_size):
+        snapshot.setdefault(user_id, {"profile": {"name": user_id}, "history": {}})["history"].update(page)
+
+    interactions = []
+    for user_id, user_data in snapshot.items():
+        for song_data in user_data.get("history", {}).values():
+            interactions.append({"user_id": user_id, "video_id": song_data.get("id"), "weight": 1})
+    df = pd.DataFrame(interactions)
+    df["user_cat"] = df["user_id"].astype("category")
+    df["item_cat"] = df["video_id"].astype("category")
+    matrix = csr_matrix(
+        (df["weight"], (df["user_cat"].cat.codes, df["item_cat"].cat.codes)),
+        shape=(len(df["user_cat"].cat.categories), len(df["item_cat"].cat.categories)),
+    )
+    return matrix
+
+def run_stream(events: int, page_size: int):
+    from app.utils.interactions import InteractionBuffer
+
+    buffer = InteractionBuffer()
+    for user_id, page in user_pages(events, page_size):
+        buffer.add(user_id, [song_data.get("id") for song_data in page.values()])
+    return buffer.to_csr()
+
+def child(mode: str, events: int, page_size: int):
+    start = time.perf_counter()
+    matrix = (run_legacy if mode == "legacy" else run_stream)(events, page_size)
+    print(json.dumps({
+        "seconds": time.perf_counter() - start,
+        "peak_mb": rss_mb(),
+        "shape": list(matrix.shape),
+        "nnz": int(matrix.nnz),
+    }))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=10_000_000)
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--modes", nargs="+", default=["stream", "legacy"])
+    parser.add_argument("--child", choices=["legacy", "stream"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.events, args.page_size)
+        return
+
+    print("=" * 60)
+    print("🎵 ALS INGESTION MEMORY BENCHMARK")
+    print("=" * 60)
+    print(f"events={args.events:,} page_size={args.page_size}")
+    print(f"{'mode':>8} {'peak RSS':>12} {'time':>9} {'matrix':>22}")
+    for mode in args.modes:
+        proc = subprocess.run(
+            [sys.executable, __file__, "--child", mode, "--events", str(args.events),
+             "--page-size", str(args.page_size)],
+            capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            # Usually the OOM killer on the legacy path
+            print(f"{mode:>8} {'failed':>12} (exit {proc.returncode}) {proc.stderr.strip()[-200:]}")
+            continue
+        r = json.loads(proc.stdout.strip().splitlines()[-1])
+        shape = f"{r['shape'][0]}x{r['shape'][1]} nnz={r['nnz']}"
+        print(f"{mode:>8} {r['peak_mb']:>9.0f} MB {r['seconds']:>8.1f}s {shape:>22}")
+
+if __name__ == "__main__":
+    main()
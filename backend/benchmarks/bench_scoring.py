@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Video Scoring Benchmark
+The original scorer (one substring scan per keyword) vs VideoScorer.score
+(one Aho-Corasick pass per title) and VideoScorer.score_many (one pass per
+batch), with the built-in keyword list and with a larger configured one.
+
+    python benchmarks/bench_scoring.py --titles 20000 --keywords 300
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.scoring import DEFAULT_CHANNEL_WEIGHTS, DEFAULT_TITLE_WEIGHTS, VideoScorer
+
+WORDS = ["love", "night", "official audio", "lyrical", "remix", "live", "song", "tera", "dil",
+         "reaction", "full song", "8d", "slowed", "reverb", "video", "hd", "4k", "topic", "new"]
+CHANNELS = ["Artist - Topic", "ArtistVEVO", "T-Series", "Sony Music Records", "random uploads"]
+
+def legacy_score(title: str, duration: int, channel: str, title_weights: dict) -> int:
+    """The original _score_video loops, generalised to a weights dict."""
+    title_lower = title.lower()
+    score = 0
+    for w, weight in title_weights.items():
+        if w in title_lower:
+            score += weight
+    if duration:
+        if 120 <= duration <= 420:
+            score += 10
+        elif duration < 60:
+            score -= 20
+        elif duration > 720:
+            score -= 10
+    if "topic" in channel.lower() or "vevo" in channel.lower() or "records" in channel.lower():
+        score += 5
+    return score
+
+def make_entries(n: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    return [
+        {
+            "title": " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 9))).title(),
+            "duration": rng.choice([0, 45, 200, 300, 500, 900]),
+            "uploader": rng.choice(CHANNELS),
+        }
+        for _ in range(n)
+    ]
+
+def make_weights(n: int, seed: int = 2) -> dict:
+    """The built-in weights plus synthetic keywords up to n in total."""
+    rng = random.Random(seed)
+    weights = dict(DEFAULT_TITLE_WEIGHTS)
+    while len(weights) < n:
+        word = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(4, 10)))
+        weights[word] = rng.choice([-50, -10, 5, 10])
+    return weights
+
+def run(entries: list, title_weights: dict):
+    scorer = VideoScorer(title_weights, DEFAULT_CHANNEL_WEIGHTS)
+    timings = {}
+
+    start = time.perf_counter()
+    expected = [legacy_score(e["title"], e["duration"], e["uploader"], title_weights) for e in entries]
+    timings["Original substring scans"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    single = [scorer.score(e["title"], e["duration"], e["uploader"]) for e in entries]
+    timings["VideoScorer.score"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = scorer.score_many(entries)
+    timings["VideoScorer.score_many"] = time.perf_counter() - start
+
+    assert single == expected and batch.tolist() == expected, "scores differ from the original scorer"
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--titles", type=int, default=20000)
+    parser.add_argument("--keywords", type=int, default=300, help="Size of the larger keyword list")
+    args = parser.parse_args()
+
+    entries = make_entries(args.titles)
+
+    print("=" * 60)
+    print("🎵 VIDEO SCORING BENCHMARK")
+    print("=" * 60)
+    for weights in (dict(DEFAULT_TITLE_WEIGHTS), make_weights(args.keywords)):
+        timings = run(entries, weights)
+        legacy_s = timings["Original substring scans"]
+        print(f"\n🔑 {len(weights)} title keywords, {args.titles} titles")
+        for name, elapsed in timings.items():
+            print(f"   {name:<26} {args.titles / elapsed:>10,.0f} titles/s  ({legacy_s / elapsed:.1f}x)")
+    print("=" * 60)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+YoutubeDL Pool Benchmark
+Per-call extraction overhead with a fresh YoutubeDL per call vs the warm pool.
+
+Uses a local stub extractor, so no network is involved: the numbers are the
+cost of building/tearing down YoutubeDL plus yt-dlp's own result processing.
+
+    python benchmarks/bench_ydl_pool.py --calls 200
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yt_dlp
+from yt_dlp.extractor.common import InfoExtractor
+from app.utils.ytdl import YDLPool
+
+OPTS = {
+    'format': 'bestaudio/best',
+    'noplaylist': True,
+    'quiet': True,
+    'no_warnings': True,
+}
+
+class StubIE(InfoExtractor):
+    IE_NAME = 'stub'
+    _VALID_URL = r'stub:(?P<id>\w+)'
+
+    def _real_extract(self, url):
+        video_id = self._match_id(url)
+        return {
+            'id': video_id,
+            'title': f'Stub Song {video_id}',
+            'uploader': 'Stub Artist',
+            'duration': 180,
+            'formats': [{
+                'format_id': '140',
+                'url': f'https://example.invalid/{video_id}.m4a?expire=9999999999',
+                'ext': 'm4a',
+                'acodec': 'mp4a.40.2',
+                'vcodec': 'none',
+                'abr': 128,
+            }],
+        }
+
+def make_ydl(opts):
+    ydl = yt_dlp.YoutubeDL(opts)
+    ydl.add_info_extractor(StubIE())
+    return ydl
+
+def bench_fresh(calls: int) -> float:
+    start = time.perf_counter()
+    for i in range(calls):
+        with make_ydl(OPTS) as ydl:
+            ydl.extract_info(f"stub:v{i}", download=False, ie_key='Stub')
+    return (time.perf_counter() - start) / calls * 1000
+
+def bench_pool(calls: int, max_uses: int) -> float:
+    pool = YDLPool(OPTS, max_uses=max_uses, max_idle=4, factory=make_ydl)
+    start = time.perf_counter()
+    for i in range(calls):
+        with pool.lease() as ydl:
+            ydl.extract_info(f"stub:v{i}", download=False, ie_key='Stub')
+    elapsed = (time.perf_counter() - start) / calls * 1000
+    print(f"   pool stats: {pool.stats()}")
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--max-uses", type=int, default=100)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🎵 YOUTUBEDL POOL BENCHMARK")
+    print("=" * 60)
+
+    # Warm imports/lazy extractor loading so neither side pays for it
+    bench_fresh(3)
+
+    fresh_ms = bench_fresh(args.calls)
+    print(f"🔄 Fresh YoutubeDL per call: {fresh_ms:.2f}ms/call")
+    pool_ms = bench_pool(args.calls, args.max_uses)
+    print(f"⚡ Pooled YoutubeDL:         {pool_ms:.2f}ms/call")
+    print(f"\n📈 Speedup: {fresh_ms / pool_ms:.1f}x ({args.calls} calls)")
+    print("=" * 60)
+
+if __name__ == "__main__":
+    main()
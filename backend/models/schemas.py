@@ -28,3 +28,6 @@ class PlaybackState(BaseModel):
     position: int
     is_playing: bool
     device_id: str
+
+class StreamBatchRequest(BaseModel):
+    video_ids: List[str]
@@ -50,6 +50,23 @@ def mock_firebase_setup(mocker):
         "db": mock_db
     }
 
+@pytest.fixture(autouse=True)
+def isolated_catalog(tmp_path, monkeypatch):
+    """
+    Point the shared catalog at a per-test database, so tests never write
+    the real CATALOG_DB_PATH (models/catalog.db).
+    """
+    from app.services.catalog_service import catalog_service
+    monkeypatch.setattr(catalog_service, "path", str(tmp_path / "catalog.db"))
+    monkeypatch.setattr(catalog_service, "_conn", None)
+    monkeypatch.setattr(catalog_service, "_pending", {})
+    monkeypatch.setattr(catalog_service, "_flush_task", None)
+    yield catalog_service
+    with catalog_service._lock:
+        if catalog_service._conn is not None:
+            catalog_service._conn.close()
+            catalog_service._conn = None
+
 @pytest.fixture
 def mock_yt_service(mocker):
     """
@@ -0,0 +1,83 @@
+import json
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from app.utils.cache import CacheService
+
+@pytest.fixture
+def redis_cache(mocker):
+    mocker.patch("app.utils.cache.settings.REDIS_URL", "redis://127.0.0.1:1/0")
+    return CacheService()
+
+@pytest.mark.asyncio
+async def test_async_client_used_for_commands(redis_cache):
+    """
+    Cache calls are awaited on the asyncio client, not run synchronously.
+    """
+    redis_cache.l1_enabled = False
+    client = MagicMock()
+    client.get = AsyncMock(return_value='{"a": 1}')
+    client.setex = AsyncMock()
+    redis_cache.redis_client = client
+
+    await redis_cache.set("k", {"a": 1}, ttl=30)
+    assert await redis_cache.get("k") == {"a": 1}
+    client.setex.assert_awaited_once_with("k", 30, '{"a": 1}')
+    client.get.assert_awaited_once_with("k")
+
+@pytest.mark.asyncio
+async def test_unreachable_redis_falls_back_to_memory(redis_cache):
+    """
+    A connection failure switches to the memory cache and backs off instead of erroring.
+    """
+    await redis_cache.set("k", "v")
+
+    assert redis_cache.use_redis is False
+    assert await redis_cache.get("k") == "v"
+
+    # After the back-off window Redis is tried again
+    redis_cache._redis_down_until = 0
+    assert redis_cache.use_redis is True
+    await redis_cache.close()
+
+@pytest.mark.asyncio
+async def test_l1_serves_repeat_reads_and_honours_invalidation(redis_cache, mocker):
+    """
+    The first read comes from Redis (L2) and fills L1; invalidations from other workers drop it.
+    """
+    pipeline = mocker.patch.object(redis_cache, "_redis_pipeline", AsyncMock(return_value=['{"a": 1}', 60000]))
+    redis_cache.redis_client = MagicMock()
+
+    assert await redis_cache.get("k") == {"a": 1}
+    assert await redis_cache.get("k") == {"a": 1}
+    assert pipeline.await_count == 1
+
+    stats = redis_cache.stats()
+    assert stats["l1"]["hits"] == 1
+    assert stats["l2"]["hits"] == 1
+
+    # Our own messages are ignored, other workers' are applied
+    redis_cache._apply_invalidation(json.dumps({"origin": redis_cache.instance_id, "keys": ["k"]}))
+    assert "k" in redis_cache.l1
+    redis_cache._apply_invalidation(json.dumps({"origin": "other-worker", "keys": ["k"]}))
+    assert "k" not in redis_cache.l1
+
+    await redis_cache.get("k")
+    assert pipeline.await_count == 2
+
+@pytest.mark.asyncio
+async def test_lease_extension_and_channel_dispatch():
+    """
+    Only the lease owner can extend it; messages on subscribed channels reach their handler.
+    """
+    service = CacheService()
+    token = await service.acquire_lock("job", 1000)
+    assert await service.extend_lock("job", token, 1000)
+    assert not await service.extend_lock("job", "someone-else", 1000)
+    await service.release_lock("job", token)
+    assert not await service.extend_lock("job", token, 1000)
+
+    received = []
+    service.subscribe("ml:reload", received.append)
+    service._dispatch("ml:reload", json.dumps({"version": "v2"}))
+    service._dispatch("other", json.dumps({"version": "v3"}))
+    assert received == [{"version": "v2"}]
@@ -0,0 +1,48 @@
+import pytest
+from app.services.catalog_service import CatalogService
+
+@pytest.mark.asyncio
+async def test_recorded_songs_are_found_by_id(tmp_path):
+    """
+    Search results and stream data land in the catalog and can be looked up in one batch.
+    """
+    path = str(tmp_path / "catalog.db")
+    catalog = CatalogService(path)
+    catalog.record_many([
+        {"id": "a", "title": "Song A", "artist": "Artist A", "duration": 180, "thumbnail": "a.jpg", "score": 10},
+        {"id": "b", "title": "Song B", "artist": "Artist B", "duration": 200},
+        {"id": "", "title": "No id"},
+    ])
+    # Buffered rows are visible before they're written
+    assert (await catalog.get_many(["a"]))["a"]["title"] == "Song A"
+    await catalog.flush()
+
+    # A later stream resolution without a thumbnail keeps the known one
+    catalog.record({"video_id": "a", "title": "Song A", "uploader": "Artist A", "duration": 181, "thumbnail": None})
+    await catalog.close()
+
+    reopened = CatalogService(path)
+    songs = await reopened.hydrate(["b", "missing", "a"])
+    assert [s["id"] for s in songs] == ["b", "a"]
+    assert songs[1]["duration"] == 181
+    assert songs[1]["thumbnail"] == "a.jpg"
+    assert reopened.get_stats()["hits"] == 2
+    await reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_songs_since_sees_rows_queued_before_the_watermark(tmp_path):
+    """
+    Rows are stamped when written, so a reader whose watermark passed while
+    they were still queued picks them up, with their channel.
+    """
+    import time
+    catalog = CatalogService(str(tmp_path / "catalog.db"))
+    catalog.record({"video_id": "a", "title": "Bohemian Rhapsody", "artist": "Queen", "channel": "Queen Official"})
+    watermark = time.time()
+    await catalog.flush()
+
+    rows = catalog.songs_since(watermark, 10)
+    assert [row[:4] for row in rows] == [("a", "Bohemian Rhapsody", "Queen", "Queen Official")]
+    assert rows[0][4] >= watermark
+    await catalog.close()
@@ -0,0 +1,31 @@
+import time
+from app.utils.circuit_breaker import CircuitBreaker
+
+def test_opens_on_error_rate_and_recovers_after_trial():
+    """
+    The circuit opens past the failure threshold and closes after a successful trial.
+    """
+    breaker = CircuitBreaker("test", failure_threshold=0.5, min_calls=4, window=60, reset_timeout=0.05)
+
+    breaker.record_success()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"  # Below min_calls
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.allow() is False
+
+    time.sleep(0.06)
+    assert breaker.allow() is True   # Half-open trial
+    assert breaker.allow() is False  # Only one trial at a time
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+def test_failed_trial_reopens():
+    breaker = CircuitBreaker("test", failure_threshold=0.5, min_calls=1, window=60, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow() is True
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.stats()["times_opened"] == 2
@@ -0,0 +1,86 @@
+import numpy as np
+from app.utils import content_index
+from app.utils.content_index import ContentIndex, song_text
+
+SONGS = {
+    "q1": ("Bohemian Rhapsody (Official Video)", "Queen"),
+    "q2": ("Bohemian Rhapsody - Live Aid 1985", "Queen"),
+    "q3": ("Another One Bites the Dust", "Queen"),
+    "e1": ("Shape of You", "Ed Sheeran"),
+    "e2": ("Perfect", "Ed Sheeran"),
+    "a1": ("Rolling in the Deep", "Adele"),
+}
+
+def build(**kwargs) -> ContentIndex:
+    return ContentIndex.build(list(SONGS), [song_text(*song) for song in SONGS.values()],
+                              n_features=1 << 16, **kwargs)
+
+def test_queries_rank_by_title_and_artist():
+    """
+    Near-identical titles come first, then the same artist; excluded ids are skipped.
+    """
+    index = build()
+    [ranked] = index.query([song_text("Bohemian Rhapsody", "Queen")], 3)
+    assert {vid for vid, _ in ranked[:2]} == {"q1", "q2"}
+    assert ranked[2][0] == "q3"
+    assert ranked[0][1] >= ranked[1][1] >= ranked[2][1] > 0
+
+    # One batch, one result list per text
+    batch = index.query([song_text("Bohemian Rhapsody", "Queen"), "perfect ed sheeran"], 2, exclude=["q1", "q2"])
+    assert batch[0][0][0] == "q3"
+    assert batch[1][0][0] == "e2"
+    assert index.query(["zzzzzz"], 3) == [[]]
+
+def test_pruned_queries_match_brute_force(monkeypatch):
+    """
+    With common n-grams left to the rescoring step, scores still equal the exact cosine.
+    """
+    monkeypatch.setattr(content_index, "QUERY_MIN_DF", 0)
+    monkeypatch.setattr(content_index, "QUERY_MAX_DF", 0.2)
+    index = build()
+    text = song_text("Queen Rhapsody", "Ed")
+    q = index._weigh(index._tf([text]))
+    exact = (q @ index._main).toarray().ravel()
+
+    ranked = index.query([text], len(SONGS))[0]
+    for vid, score in ranked:
+        assert np.isclose(score, exact[index.positions[vid]], atol=1e-6)
+
+def test_append_merge_and_save(tmp_path):
+    """
+    Appended songs are searchable right away, survive the merge into main and a save/load.
+    """
+    index = build(max_delta=3)
+    assert index.append(["w1", "q1"], [song_text("Wonderwall", "Oasis"), song_text(*SONGS["q1"])]) == 1
+    assert index._delta.shape[0] == 1
+    assert index.query(["wonderwall oasis"], 1)[0][0][0] == "w1"
+
+    assert index.append(["w2"], [song_text("Don't Look Back in Anger", "Oasis")]) == 1
+    assert {vid for vid, _ in index.query(["oasis"], 2)[0]} == {"w1", "w2"}
+
+    path = str(tmp_path / "content.npz")
+    index.append(["x1"], [song_text("Hello", "Adele")])
+    # Reached max_delta: merged into main
+    assert index._delta.shape[0] == 0 and index._main.shape[1] == len(SONGS) + 3
+    index.save(path, synced_at=42.5)
+    loaded, synced_at = ContentIndex.load(path)
+    assert synced_at == 42.5
+    assert len(loaded) == len(index) and "x1" in loaded
+    assert loaded.query(["hello adele"], 2) == index.query(["hello adele"], 2)
+
+def test_changed_text_is_reindexed(tmp_path):
+    """
+    A song re-cataloged under a new title is found by the new one only, also after a save/load.
+    """
+    index = build()
+    assert index.append(["a1"], [song_text("Rolling in the Deep (Remix)", "Adele")]) == 0
+    assert index.append(["a1"], [song_text("Set Fire to the Rain", "Adele")]) == 1
+    assert len(index) == len(SONGS)
+
+    path = str(tmp_path / "content.npz")
+    index.save(path)
+    for searched in (index, ContentIndex.load(path)[0]):
+        assert [vid for vid, _ in searched.query(["set fire to the rain"], 1)[0]] == ["a1"]
+        ranked = searched.query(["rolling in the deep adele"], len(SONGS))[0]
+        assert [vid for vid, _ in ranked].count("a1") == 1
+        assert ranked[0][1] < 0.9
@@ -0,0 +1,47 @@
+import random
+from app.utils.dedup import DedupIndex, normalize_title
+
+def _legacy_dedupe(items):
+    """The original pairwise dedup, kept as the reference behaviour."""
+    unique = []
+    for item in items:
+        if not any(
+            abs(item['duration'] - other['duration']) <= 10
+            and normalize_title(item['title']) == normalize_title(other['title'])
+            for other in unique
+        ):
+            unique.append(item)
+    return unique
+
+def test_window_spans_neighbouring_buckets():
+    """
+    Durations within 10s match even when they fall into different buckets.
+    """
+    index = DedupIndex()
+    index.add({"id": "1", "title": "Song A (Official Video)", "duration": 179})
+
+    assert {"id": "2", "title": "song a!", "duration": 189} in index
+    assert {"id": "3", "title": "Song A", "duration": 169} in index
+    assert {"id": "4", "title": "Song A", "duration": 190} not in index
+    assert {"id": "5", "title": "Song B", "duration": 179} not in index
+
+def test_matches_pairwise_dedup():
+    """
+    The index keeps exactly the items the pairwise comparison kept.
+    """
+    rng = random.Random(7)
+    titles = ["Song %d" % i for i in range(40)]
+    items = [
+        {
+            "id": str(i),
+            "title": rng.choice(titles) + rng.choice(["", " (Lyrics)", " [HD]", "!"]),
+            "duration": rng.randint(150, 260),
+        }
+        for i in range(1500)
+    ]
+
+    index = DedupIndex()
+    kept = [item for item in items if index.add_if_new(item)]
+
+    assert kept == _legacy_dedupe(items)
+    assert len(index) == len(kept)
@@ -0,0 +1,64 @@
+import asyncio
+import time
+import pytest
+from app.utils.executor import ExtractionExecutor, ExtractionTimeout
+
+def _slow(value, delay):
+    time.sleep(delay)
+    return value
+
+@pytest.mark.asyncio
+async def test_run_does_not_block_event_loop():
+    """
+    Extraction runs in the pool while the loop keeps serving other work.
+    """
+    executor = ExtractionExecutor()
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        for _ in range(5):
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    result, _ = await asyncio.gather(executor.run("stream", _slow, "ok", 0.1), ticker())
+
+    assert result == "ok"
+    assert ticks == 5
+    assert executor.stats()["jobs"]["stream"]["completed"] == 1
+    executor.shutdown()
+
+@pytest.mark.asyncio
+async def test_concurrency_limit_and_queue_metrics():
+    """
+    Jobs beyond the per-kind limit wait in the queue.
+    """
+    executor = ExtractionExecutor()
+    executor._limits["search"] = (1, 5.0)
+
+    results = await asyncio.gather(*[executor.run("search", _slow, i, 0.05) for i in range(3)])
+
+    stats = executor.stats()["jobs"]["search"]
+    assert results == [0, 1, 2]
+    assert stats["max_queue_depth"] >= 2
+    assert stats["max_wait_ms"] > 0
+    executor.shutdown()
+
+@pytest.mark.asyncio
+async def test_timeout_propagates_and_keeps_slot_until_done():
+    """
+    Timeouts surface as ExtractionTimeout; the slot is held until the worker finishes.
+    """
+    executor = ExtractionExecutor()
+    executor._limits["stream"] = (1, 5.0)
+
+    with pytest.raises(ExtractionTimeout):
+        await executor.run("stream", _slow, "late", 0.2, timeout=0.05)
+
+    stats = executor.stats()["jobs"]["stream"]
+    assert stats["timed_out"] == 1
+    assert stats["running"] == 1
+
+    await asyncio.sleep(0.3)
+    assert executor.stats()["jobs"]["stream"]["running"] == 0
+    executor.shutdown()
@@ -0,0 +1,74 @@
+import os
+import numpy as np
+from app.utils.factor_store import current_version, export_factors, load_factors
+
+def test_export_is_memory_mapped_and_scored(tmp_path):
+    """
+    Exported factors load as read-only memory maps and rank items by dot product.
+    """
+    root = str(tmp_path / "als")
+    users = np.array([[1.0, 0.0], [0.0, 1.0]])
+    items = np.array([[0.9, 0.1], [0.1, 0.9], [0.5, 0.5]])
+    version = export_factors(root, ["u1", "u2"], ["a", "b", "c"], users, items)
+
+    factors = load_factors(root)
+    assert factors.version == version == current_version(root)
+    assert isinstance(factors.item_factors, np.memmap)
+    assert factors.item_factors.dtype == np.float32
+
+    assert factors.top_items(factors.user_vector("u1"), 2) == ["a", "c"]
+    assert factors.top_items(factors.user_vector("u2"), 5, exclude=[1]) == ["c", "a"]
+    assert factors.user_vector("nobody") is None
+
+def test_batch_scoring_chunks_to_the_memory_budget(tmp_path):
+    """
+    A small memory budget splits the batch into more multiplies without changing the rankings.
+    """
+    root = str(tmp_path / "als")
+    rng = np.random.default_rng(0)
+    export_factors(root, [f"u{i}" for i in range(20)], [f"v{i}" for i in range(100)],
+                   rng.normal(size=(20, 4)), rng.normal(size=(100, 4)))
+    factors = load_factors(root)
+
+    # 3 users per chunk
+    batch = factors.top_items_batch(factors.user_factors, 5, memory_budget=3 * 100 * 12)
+    assert batch == [factors.top_items(vector, 5) for vector in factors.user_factors]
+    assert factors.top_items_batch(factors.user_factors[:2], 500) == [
+        factors.top_items(vector, 100) for vector in factors.user_factors[:2]]
+
+def test_new_version_swaps_current_and_prunes(tmp_path):
+    """
+    Each export becomes CURRENT; only the newest `keep` versions stay on disk.
+    """
+    root = str(tmp_path / "als")
+    versions = [
+        export_factors(root, ["u1"], ["a"], np.ones((1, 2)), np.ones((1, 2)), keep=2)
+        for _ in range(3)
+    ]
+    assert current_version(root) == versions[-1]
+    on_disk = sorted(d for d in os.listdir(root) if d != "CURRENT")
+    assert on_disk == sorted(versions[-2:])
+    # A worker still on an older version can keep reading it
+    assert load_factors(root, versions[-2]).item_ids.tolist() == ["a"]
+
+def test_fold_in_solves_the_als_user_step(tmp_path):
+    """
+    Fold-in gives the weighted least squares solution against fixed item
+    factors; repeated plays raise an item's confidence, unknown ids are ignored.
+    """
+    root = str(tmp_path / "als")
+    rng = np.random.default_rng(0)
+    items = rng.normal(size=(30, 4))
+    export_factors(root, ["u1"], [f"v{i}" for i in range(30)], np.ones((1, 4)), items)
+    factors = load_factors(root)
+
+    vector = factors.fold_in(["v3", "v7", "v3", "gone"], regularization=0.1)
+
+    confidence = np.ones(30)
+    confidence[3], confidence[7] = 2, 1
+    preference = np.zeros(30)
+    preference[[3, 7]] = 1
+    Y = items.astype(np.float32).astype(np.float64)
+    expected = np.linalg.solve(Y.T @ (confidence[:, None] * Y) + 0.1 * np.eye(4), Y.T @ (confidence * preference))
+    assert np.allclose(vector, expected, atol=1e-5)
+    assert factors.fold_in(["gone"]) is None
@@ -0,0 +1,100 @@
+import pytest
+from app.jobs import aggregate_feedback
+from app.utils.feedback_store import FeedbackStore, load_weights
+
+def _weights(path):
+    w = load_weights(path)
+    return {(str(w.user_ids[u]), str(w.item_ids[i])): float(x) for u, i, x in zip(w.users, w.items, w.weights)}
+
+def test_confidence_from_completion_repeats_likes_and_skips(tmp_path):
+    """
+    Repeats add completion ratios, likes add a bonus, skips subtract, dislikes zero the pair.
+    """
+    path = str(tmp_path / "feedback.npz")
+    store = FeedbackStore()
+    store.add_play("u1", "a", 200, 200, skip_ratio=0.3)
+    store.add_play("u1", "a", 100, 200, skip_ratio=0.3)
+    store.add_play("u1", "b", 10, 200, skip_ratio=0.3)     # skip
+    store.add_play("u1", "b", 200, 200, skip_ratio=0.3)
+    store.add_play("u1", "c", 45, None, skip_ratio=0.3)    # no track length: full play
+    store.add_feedback("u1", "c", "like")
+    store.add_play("u2", "a", 300, 200, skip_ratio=0.3)
+    store.add_feedback("u2", "a", "dislike")
+    store.add_feedback("u2", "a", "bogus")
+    store.save(path, like_weight=5.0, skip_weight=1.0)
+
+    assert _weights(path) == {("u1", "a"): 1.5, ("u1", "b"): 0.0, ("u1", "c"): 6.0, ("u2", "a"): 0.0}
+
+def test_incremental_merge_and_checkpoints(tmp_path):
+    """
+    A reloaded store keeps its aggregates and checkpoints; new events add to them and the latest feedback wins.
+    """
+    path = str(tmp_path / "feedback.npz")
+    store = FeedbackStore()
+    store.add_play("u1", "a", 200, 200, skip_ratio=0.3)
+    store.add_feedback("u1", "a", "dislike")
+    store.checkpoints["u1"] = ("-Nev1", None)
+    store.save(path, like_weight=5.0, skip_weight=1.0)
+
+    store = FeedbackStore.load(path)
+    assert store.checkpoints == {"u1": ("-Nev1", None)}
+    store.add_play("u1", "a", 200, 200, skip_ratio=0.3)
+    store.add_feedback("u1", "a", "like")
+    store.add_play("u3", "z", 200, 200, skip_ratio=0.3)
+    store.save(path, like_weight=5.0, skip_weight=1.0)
+
+    assert _weights(path) == {("u1", "a"): 7.0, ("u3", "z"): 1.0}
+    assert len(FeedbackStore.load(path)) == 2
+
+class FakeRef:
+    """Just enough of firebase_admin's Reference/Query for paged reads."""
+
+    def __init__(self, data, start=None, limit=None):
+        self.data, self.start, self.limit = data, start, limit
+
+    def order_by_key(self):
+        return self
+
+    def start_at(self, key):
+        return FakeRef(self.data, key, self.limit)
+
+    def limit_to_first(self, n):
+        return FakeRef(self.data, self.start, n)
+
+    def get(self, shallow=False):
+        if shallow:
+            return {k: True for k in self.data}
+        keys = sorted(k for k in self.data if self.start is None or k >= self.start)
+        return {k: self.data[k] for k in keys[:self.limit]}
+
+@pytest.mark.asyncio
+async def test_job_reads_only_new_events(tmp_path, mocker):
+    """
+    Each run aggregates the events pushed since the previous run's checkpoints.
+    """
+    path = str(tmp_path / "feedback.npz")
+    analytics = {"u1": {
+        "events": {f"-Ne{i}": {"type": "play", "song_id": "a", "duration_played": 200, "duration": 200}
+                   for i in range(3)},
+        "feedback": {"-Nf0": {"type": "feedback", "song_id": "a", "feedback": "like"}},
+    }}
+
+    def reference(path):
+        node = analytics
+        for part in path.split("/")[1:]:
+            node = node.get(part, {})
+        return FakeRef(node)
+
+    mocker.patch("app.jobs.aggregate_feedback.db.reference", side_effect=reference)
+    mocker.patch("app.jobs.aggregate_feedback.settings.ML_INGEST_PAGE_SIZE", 2)
+
+    stats = await aggregate_feedback.aggregate(path)
+    assert stats["plays"] == 3 and stats["feedback"] == 1 and stats["users"] == 1
+    assert _weights(path) == {("u1", "a"): 8.0}
+
+    analytics["u1"]["events"]["-Ne3"] = {"type": "play", "song_id": "a", "duration_played": 20, "duration": 200}
+    stats = await aggregate_feedback.aggregate(path)
+    assert stats["plays"] == 1 and stats["feedback"] == 0
+    assert _weights(path) == {("u1", "a"): 7.0}
+
+    assert (await aggregate_feedback.aggregate(path))["users"] == 0
@@ -0,0 +1,97 @@
+import pytest
+from app.services.user_service import UserService
+from app.utils.interactions import InteractionBuffer
+
+def test_buffer_grows_and_builds_csr():
+    """
+    Events land in typed arrays past the initial capacity; duplicates add up in the matrix.
+    """
+    buffer = InteractionBuffer(capacity=2)
+    buffer.add("u1", ["a", "b", "a"])
+    buffer.add("u2", ["c", None, ""])
+    buffer.add("u3", [])
+    buffer.add("u1", ["c"], weight=2.0)
+
+    assert len(buffer) == 5
+    assert buffer.user_ids() == ["u1", "u2"]
+    assert buffer.item_ids() == ["a", "b", "c"]
+    matrix = buffer.to_csr()
+    assert matrix.shape == (2, 3)
+    assert matrix.toarray().tolist() == [[2, 1, 2], [0, 0, 1]]
+
+class FakeQuery:
+    """order_by_key / start_at / limit_to_first over a dict, like firebase_admin's db queries."""
+
+    def __init__(self, data, calls, start=None, limit=None):
+        self.data, self.calls, self.start, self.limit = data, calls, start, limit
+
+    def order_by_key(self):
+        return self
+
+    def start_at(self, key):
+        return FakeQuery(self.data, self.calls, key, self.limit)
+
+    def limit_to_first(self, n):
+        return FakeQuery(self.data, self.calls, self.start, n)
+
+    def get(self, shallow=False):
+        self.calls.append((self.start, self.limit))
+        if shallow:
+            return {k: True for k in self.data}
+        keys = sorted(k for k in self.data if self.start is None or k >= self.start)
+        return {k: self.data[k] for k in keys[:self.limit]}
+
+@pytest.mark.asyncio
+async def test_iter_interactions_pages_history(mocker):
+    """
+    History is read per user in key-ordered pages, never as the whole users tree.
+    """
+    users = {
+        "u1": {"history": {f"k{i:02d}": {"id": f"v{i}"} for i in range(5)}, "queue": {"big": "blob"}},
+        "u2": {"history": {}},
+    }
+    calls = []
+
+    def reference(path):
+        parts = path.split("/")
+        if len(parts) == 1:
+            return FakeQuery(users, calls)
+        return FakeQuery(users[parts[1]].get("history", {}), calls)
+
+    mocker.patch("app.services.user_service.db.reference", side_effect=reference)
+
+    pages = [page async for page in UserService().iter_interactions(page_size=2)]
+
+    assert pages == [("u1", ["v0", "v1"]), ("u1", ["v2", "v3"]), ("u1", ["v4"])]
+    # Follow-up pages restart at the last key and drop it
+    assert ("k01", 3) in calls and ("k03", 3) in calls
+
+def test_push_key_prefix_orders_like_push_keys():
+    """
+    Prefixes sort by time, and before any full key pushed in the same millisecond.
+    """
+    from app.utils.rtdb import push_key_prefix
+
+    earlier, later = push_key_prefix(1_700_000_000_000), push_key_prefix(1_700_000_000_001)
+    assert len(earlier) == 8 and earlier < later
+    assert earlier < earlier + "-abcdefghijk" < later
+
+def test_buffer_weight_overrides():
+    """
+    Aggregated weights replace event counts for their pairs, drop pairs at 0 and add new users.
+    """
+    import numpy as np
+
+    buffer = InteractionBuffer()
+    buffer.add("u1", ["a", "a", "b"])
+    buffer.add("u2", ["a"])
+    # (u1, a) -> 7.5, (u1, b) -> 0, (u2, a) -> 2, (u3, b) -> 1
+    buffer.override_weights(["u2", "u1", "u3"], ["b", "a"],
+                            users=np.array([1, 1, 0, 2]), items=np.array([1, 0, 1, 0]),
+                            weights=np.array([7.5, 0.0, 2.0, 1.0]))
+
+    matrix = buffer.to_csr()
+    assert buffer.user_ids() == ["u1", "u2", "u3"]
+    assert buffer.item_ids() == ["a", "b"]
+    assert matrix.toarray().tolist() == [[7.5, 0], [2, 0], [0, 1]]
+    assert matrix.nnz == 3
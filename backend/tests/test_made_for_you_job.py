@@ -0,0 +1,22 @@
+import pytest
+from unittest.mock import AsyncMock
+from app.jobs import made_for_you
+from app.utils.cache import cache
+
+@pytest.mark.asyncio
+async def test_job_caches_hydrated_lists(mocker):
+    """
+    The nightly job caches catalog-hydrated recommendations per user.
+    """
+    mocker.patch.object(made_for_you.ml_service, "known_users", return_value=["u1", "u2"])
+    mocker.patch.object(made_for_you.ml_service, "recommend_batch", return_value={"u1": ["v1", "gone"], "u2": ["gone"]})
+    mocker.patch.object(made_for_you.catalog_service, "get_many",
+                        AsyncMock(return_value={"v1": {"id": "v1", "title": "One"}}))
+    await cache.delete("mfy:u2")
+
+    stats = await made_for_you.run()
+
+    assert stats["cached"] == 1 and stats["empty"] == 1
+    assert await cache.get("mfy:u1") == [{"id": "v1", "title": "One"}]
+    assert await cache.get("mfy:u2") is None
+    await cache.delete("mfy:u1")
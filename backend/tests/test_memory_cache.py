@@ -0,0 +1,46 @@
+import time
+from app.utils.memory_cache import MemoryCache
+
+def test_expired_entries_are_not_served():
+    """
+    Per-entry TTLs are enforced on read.
+    """
+    cache = MemoryCache(max_entries=10, max_bytes=1000)
+    cache.set("a", "value", ttl=0.05)
+    assert cache.get("a") == "value"
+
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+def test_lru_eviction_by_count_and_bytes():
+    """
+    Least recently used entries are evicted first, by count and by size.
+    """
+    cache = MemoryCache(max_entries=2, max_bytes=100)
+    cache.set("a", 1, ttl=60)
+    cache.set("b", 2, ttl=60)
+    cache.get("a")  # 'b' is now least recently used
+    cache.set("c", 3, ttl=60)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+    # Over the byte budget: evicts until the new entry fits
+    cache.set("big", "x", ttl=60, size=100)
+    assert len(cache) == 1
+    assert cache.get("big") == "x"
+    assert cache.stats()["evictions"] == 3
+
+def test_periodic_sweep_drops_expired_entries():
+    """
+    Expired entries are swept even if nobody reads them.
+    """
+    cache = MemoryCache(max_entries=10, max_bytes=1000, sweep_interval=0)
+    cache.set("old", 1, ttl=0.01)
+    time.sleep(0.02)
+    cache.set("new", 2, ttl=60)
+
+    assert cache.stats()["entries"] == 1
+    assert cache.stats()["bytes"] == 1
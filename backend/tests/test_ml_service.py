@@ -1,32 +1,42 @@
 import pytest
-import pandas as pd
+import numpy as np
 from app.services.ml_service import MLService
 from unittest.mock import MagicMock, patch
 
 @pytest.mark.asyncio
-async def test_train_als_model(mocker):
+async def test_train_als_model(mocker, tmp_path):
     """
     Test ALS model training with mocked interactions.
     """
+    async def pages(page_size):
+        yield 'u1', ['v1', 'v2']
+        yield 'u1', ['v1']
+        yield 'u2', ['v2', None]
+
     mock_user_service = mocker.patch("app.services.ml_service.user_service")
-    mock_user_service.get_all_interactions.return_value = [
-        {'user_id': 'u1', 'video_id': 'v1', 'weight': 1},
-        {'user_id': 'u2', 'video_id': 'v2', 'weight': 1}
-    ]
+    mock_user_service.iter_interactions = MagicMock(side_effect=pages)
+    mocker.patch("app.services.ml_service.settings.ML_FACTORS_DIR", str(tmp_path / "als"))
+    mocker.patch("app.services.ml_service.settings.FEEDBACK_PATH", str(tmp_path / "feedback.npz"))
     
     service = MLService()
     
     # Mock implicit to avoid actual heavy training
     mock_als = mocker.patch("implicit.als.AlternatingLeastSquares")
     mock_model_instance = MagicMock()
+    mock_model_instance.user_factors = np.ones((2, 4), dtype=np.float32)
+    mock_model_instance.item_factors = np.ones((2, 4), dtype=np.float32)
     mock_als.return_value = mock_model_instance
     
     await service.train_als_model()
     
-    mock_user_service.get_all_interactions.assert_called_once()
+    mock_user_service.iter_interactions.assert_called_once()
     mock_model_instance.fit.assert_called_once()
-    assert len(service.user_map) > 0
-    assert len(service.item_map) > 0
+    assert service.user_map == {0: 'u1', 1: 'u2'}
+    assert service.item_map == {'v1': 0, 'v2': 1}
+    # Repeated plays add up
+    matrix = mock_model_instance.fit.call_args.args[0]
+    assert matrix.toarray().tolist() == [[2, 1], [0, 1]]
+    assert service.factors.user_ids.tolist() == ['u1', 'u2']
 
 def test_get_recommendations():
     """
@@ -47,3 +57,246 @@ def test_get_recommendations():
     # Test unknown user
     recs = service.get_recommendations('unknown')
     assert recs == []
+
+def test_recommendations_follow_published_factors(tmp_path, mocker):
+    """
+    Workers score against the exported factors and switch when a new version is published.
+    """
+    from app.utils.factor_store import export_factors
+    import numpy as np
+
+    root = str(tmp_path / "als")
+    mocker.patch("app.services.ml_service.settings.ML_FACTORS_DIR", root)
+    mocker.patch("app.services.ml_service.settings.ML_RELOAD_CHECK_INTERVAL", 0)
+    service = MLService()
+    assert service.get_recommendations("u1") == []
+
+    export_factors(root, ["u1"], ["v1", "v2"], np.array([[1.0, 0.0]]), np.array([[1.0, 0.0], [0.0, 1.0]]))
+    assert service.get_recommendations("u1", n=1) == ["v1"]
+
+    export_factors(root, ["u1"], ["v1", "v2"], np.array([[0.0, 1.0]]), np.array([[1.0, 0.0], [0.0, 1.0]]))
+    assert service.get_recommendations("u1", n=1) == ["v2"]
+    assert service.get_recommendations("unknown") == []
+
+def test_recommend_batch_matches_single_user(tmp_path, mocker):
+    """
+    Batch scoring returns the same lists as scoring users one at a time and skips unknown users.
+    """
+    from app.utils.factor_store import export_factors
+    import numpy as np
+
+    root = str(tmp_path / "als")
+    mocker.patch("app.services.ml_service.settings.ML_FACTORS_DIR", root)
+    rng = np.random.default_rng(0)
+    users = [f"u{i}" for i in range(50)]
+    items = [f"v{i}" for i in range(200)]
+    export_factors(root, users, items, rng.normal(size=(50, 8)), rng.normal(size=(200, 8)))
+    service = MLService()
+
+    batch = service.recommend_batch(users + ["unknown"], n=5)
+
+    assert set(batch) == set(users)
+    assert all(batch[uid] == service.get_recommendations(uid, n=5) for uid in users)
+    assert service.known_users() == users
+
+@pytest.mark.asyncio
+async def test_new_users_are_folded_in(tmp_path, mocker):
+    """
+    Users missing from the published factors get recommendations from their recent history.
+    """
+    from app.utils.cache import cache
+    from app.utils.factor_store import export_factors
+    from unittest.mock import AsyncMock
+
+    root = str(tmp_path / "als")
+    mocker.patch("app.services.ml_service.settings.ML_FACTORS_DIR", root)
+    items = np.eye(3)
+    export_factors(root, ["u1"], ["v1", "v2", "v3"], np.array([[1.0, 0.0, 0.0]]), items)
+    history = mocker.patch("app.services.ml_service.user_service.get_recent_history",
+                           AsyncMock(return_value=[{"id": "v3"}, {"id": "v3"}, {"id": "v2"}]))
+    await cache.delete("als_fold:newbie")
+    service = MLService()
+
+    assert await service.recommend("newbie", n=2) == ["v3", "v2"]
+    # Cached until their next play
+    assert await service.recommend("newbie", n=2) == ["v3", "v2"]
+    history.assert_awaited_once()
+    # Known users never read history
+    assert await service.recommend("u1", n=1) == ["v1"]
+    history.assert_awaited_once()
+    await cache.delete("als_fold:newbie")
+
+@pytest.mark.asyncio
+async def test_partial_update_from_watermark(tmp_path, mocker):
+    """
+    The partial retrain re-solves only users with plays since the watermark,
+    adds new users and keeps the item factors.
+    """
+    from app.utils.factor_store import export_factors, load_factors
+    from unittest.mock import AsyncMock
+
+    root = str(tmp_path / "als")
+    mocker.patch("app.services.ml_service.settings.ML_FACTORS_DIR", root)
+    items = np.eye(3)
+    users = np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+    export_factors(root, ["u1", "u2"], ["v1", "v2", "v3"], users, items, meta={"watermark": "-Nabc"})
+
+    calls = []
+    async def since_watermark(page_size, since=None):
+        calls.append(since)
+        yield "u2", ["v3"]
+        yield "new", ["v3"]
+
+    mocker.patch("app.services.ml_service.user_service.iter_interactions", side_effect=since_watermark)
+    mocker.patch("app.services.ml_service.user_service.get_recent_history", AsyncMock(return_value=[{"id": "v3"}]))
+    service = MLService()
+    old_version = service.factors.version
+
+    stats = await service.update_als_model()
+
+    assert calls == ["-Nabc"]
+    assert stats == {"users": 2, "updated": 1, "added": 1}
+    factors = load_factors(root)
+    assert factors.version != old_version
+    assert factors.meta["updated_from"] == old_version
+    assert factors.meta["watermark"] > "-Nabc"
+    assert factors.user_ids.tolist() == ["u1", "u2", "new"]
+    assert np.array_equal(factors.user_factors[0], users[0])
+    assert service.get_recommendations("u2", n=1) == ["v3"]
+    assert service.get_recommendations("new", n=1) == ["v3"]
+    assert np.array_equal(factors.item_factors, items)
+
+@pytest.mark.asyncio
+async def test_partial_update_never_replaces_a_newer_version(tmp_path, mocker):
+    """
+    The partial retrain waits out a running training, and discards its result
+    if another version was published while it read histories.
+    """
+    from app.services.ml_service import TRAIN_LOCK
+    from app.utils.cache import cache
+    from app.utils.factor_store import current_version, export_factors
+    from unittest.mock import AsyncMock
+
+    root = str(tmp_path / "als")
+    mocker.patch("app.services.ml_service.settings.ML_FACTORS_DIR", root)
+    items = np.eye(3)
+    export_factors(root, ["u1"], ["v1", "v2", "v3"], np.array([[1.0, 0.0, 0.0]]), items,
+                   meta={"watermark": "-Nabc"})
+    newer = []
+
+    async def training_publishes_meanwhile(page_size, since=None):
+        newer.append(export_factors(root, ["u1"], ["v1", "v2", "v3"], np.array([[0.0, 1.0, 0.0]]), items,
+                                    meta={"watermark": "-Nxyz"}))
+        yield "u1", ["v3"]
+
+    iter_interactions = mocker.patch("app.services.ml_service.user_service.iter_interactions",
+                                     side_effect=training_publishes_meanwhile)
+    mocker.patch("app.services.ml_service.user_service.get_recent_history", AsyncMock(return_value=[{"id": "v3"}]))
+    service = MLService()
+
+    token = await cache.acquire_lock(TRAIN_LOCK, 5000)
+    try:
+        assert await service.update_als_model() is None
+        iter_interactions.assert_not_called()
+    finally:
+        await cache.release_lock(TRAIN_LOCK, token)
+
+    assert await service.update_als_model() is None
+    assert current_version(root) == newer[0]
+    assert TRAIN_LOCK not in cache.memory_locks
+
+@pytest.mark.asyncio
+async def test_training_uses_feedback_weights(tmp_path, mocker):
+    """
+    Aggregated feedback weights replace play counts for the pairs they cover.
+    """
+    from app.utils.feedback_store import FeedbackStore
+
+    feedback_path = str(tmp_path / "feedback.npz")
+    store = FeedbackStore()
+    store.add_play("u1", "v1", 100, 200, skip_ratio=0.3)
+    store.add_feedback("u1", "v1", "like")
+    store.add_feedback("u1", "v2", "not_relevant")
+    store.save(feedback_path, like_weight=5.0, skip_weight=1.0)
+
+    async def pages(page_size):
+        yield 'u1', ['v1', 'v2', 'v2']
+
+    mocker.patch("app.services.ml_service.user_service.iter_interactions", side_effect=pages)
+    mocker.patch("app.services.ml_service.settings.ML_FACTORS_DIR", str(tmp_path / "als"))
+    mocker.patch("app.services.ml_service.settings.FEEDBACK_PATH", feedback_path)
+    mock_als = mocker.patch("implicit.als.AlternatingLeastSquares")
+    mock_als.return_value.user_factors = np.ones((1, 4), dtype=np.float32)
+    mock_als.return_value.item_factors = np.ones((2, 4), dtype=np.float32)
+
+    stats = await MLService().train_als_model()
+
+    matrix = mock_als.return_value.fit.call_args.args[0]
+    assert matrix.toarray().tolist() == [[5.5, 0]]
+    assert stats["feedback_pairs"] == 2
+
+@pytest.mark.asyncio
+async def test_content_similarity_follows_the_catalog(tmp_path, mocker):
+    """
+    Cold tracks get similar catalog songs by title/artist: from the published
+    index, plus songs cataloged after it was built.
+    """
+    from app.services.catalog_service import CatalogService
+
+    catalog = CatalogService(str(tmp_path / "catalog.db"))
+    mocker.patch("app.services.ml_service.catalog_service", catalog)
+    mocker.patch("app.services.ml_service.settings.CONTENT_INDEX_PATH", str(tmp_path / "content.npz"))
+    mocker.patch("app.services.ml_service.settings.CONTENT_SYNC_INTERVAL", 0)
+    catalog.record_many([
+        {"id": "q1", "title": "Bohemian Rhapsody (Official Video)", "artist": "Queen"},
+        {"id": "q2", "title": "Another One Bites the Dust", "artist": "Queen"},
+        {"id": "e1", "title": "Shape of You", "artist": "Ed Sheeran"},
+    ])
+    await catalog.flush()
+    assert MLService().rebuild_content_index()["songs"] == 3
+
+    service = MLService()
+    assert await service.get_content_similarity("Bohemian Rhapsody", "Queen", n=2) == ["q1", "q2"]
+    assert await service.get_content_similarity("Bohemian Rhapsody", "Queen", n=1, exclude={"q1"}) == ["q2"]
+
+    catalog.record({"id": "e2", "title": "Perfect", "artist": "Ed Sheeran"})
+    await catalog.flush()
+    assert (await service.get_content_similarity("Perfect", "Ed Sheeran", n=1)) == ["e2"]
+    assert len(service.content_index) == 4
+    await catalog.close()
+
+@pytest.mark.asyncio
+async def test_fold_in_uses_feedback_weights(tmp_path, mocker):
+    """
+    Folded-in vectors use the aggregated confidences full training uses:
+    disliked songs drop out instead of counting as plays, likes weigh more.
+    """
+    from app.utils.cache import cache
+    from app.utils.factor_store import export_factors, load_factors
+    from app.utils.feedback_store import FeedbackStore
+    from unittest.mock import AsyncMock
+
+    root = str(tmp_path / "als")
+    path = str(tmp_path / "feedback.npz")
+    mocker.patch("app.services.ml_service.settings.ML_FACTORS_DIR", root)
+    mocker.patch("app.services.ml_service.settings.FEEDBACK_PATH", path)
+    rng = np.random.default_rng(0)
+    export_factors(root, ["u1"], ["v1", "v2", "v3"], rng.normal(size=(1, 4)), rng.normal(size=(3, 4)))
+    store = FeedbackStore()
+    store.add_feedback("newbie", "v2", "dislike")
+    store.add_feedback("newbie", "v3", "like")
+    store.add_feedback("someone", "v1", "dislike")
+    store.save(path, like_weight=5.0, skip_weight=1.0)
+    mocker.patch("app.services.ml_service.user_service.get_recent_history",
+                 AsyncMock(return_value=[{"id": "v1"}, {"id": "v1"}, {"id": "v2"}]))
+    await cache.delete("als_fold:newbie")
+    service = MLService()
+    fold_in = mocker.spy(service.factors, "fold_in")
+
+    await service.recommend("newbie", n=1)
+    video_ids, weights = fold_in.call_args.args
+    assert dict(zip(video_ids, weights)) == {"v1": 2.0, "v3": 5.0}
+    expected = load_factors(root).fold_in(["v1", "v3"], [2.0, 5.0])
+    cached = await cache.get("als_fold:newbie")
+    assert np.allclose(cached["vector"], expected, atol=1e-6)
+    await cache.delete("als_fold:newbie")
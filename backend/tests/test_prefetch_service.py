@@ -0,0 +1,55 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+from app.services.prefetch_service import PrefetchService
+from app.utils.cache import cache
+
+@pytest.mark.asyncio
+async def test_prefetch_warms_next_entries_and_counts_hits(mocker):
+    """
+    The tracks after the current one are warmed, and later plays count as prefetch hits.
+    """
+    get_stream_url = mocker.patch(
+        "app.services.prefetch_service.yt_service.get_stream_url",
+        AsyncMock(return_value={"video_id": "x", "stream_url": "https://warm/url"}),
+    )
+    mocker.patch("app.services.prefetch_service.settings.PREFETCH_AHEAD", 2)
+    for vid in ("q2", "q3", "q4"):
+        await cache.delete(f"yt_audio:{vid}")
+
+    service = PrefetchService()
+    service.start()
+    queue = [{"id": "q1"}, {"id": "q2"}, {"id": "q3"}, {"id": "q4"}]
+    service.schedule_after(queue, "q1")
+    await asyncio.wait_for(service._queue.join(), 1)
+
+    assert [c.args[0] for c in get_stream_url.await_args_list] == ["q2", "q3"]
+
+    service.note_request("q2")
+    service.note_request("q2")  # Counted once
+    service.note_request("q1")
+    stats = service.get_stats()
+    assert stats["warmed"] == 2
+    assert stats["hits"] == 1
+    assert stats["hit_rate"] == 0.5
+    service.stop()
+
+@pytest.mark.asyncio
+async def test_prefetch_yields_to_interactive_requests(mocker):
+    """
+    No prefetch extraction starts while interactive stream jobs hold the executor.
+    """
+    get_stream_url = mocker.patch("app.services.prefetch_service.yt_service.get_stream_url", AsyncMock())
+    busy = mocker.patch("app.services.prefetch_service.extraction_executor.has_capacity", return_value=False)
+    await cache.delete("yt_audio:later1")
+
+    service = PrefetchService()
+    service.start()
+    service.schedule(["later1"])
+    await asyncio.sleep(0.3)
+    assert get_stream_url.await_count == 0
+
+    busy.return_value = True
+    await asyncio.wait_for(service._queue.join(), 1)
+    assert get_stream_url.await_count == 1
+    service.stop()
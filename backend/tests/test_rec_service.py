@@ -1,5 +1,8 @@
+import asyncio
 import pytest
+from unittest.mock import AsyncMock
 from app.services.rec_service import RecService
+from app.utils.cache import cache
 
 @pytest.mark.asyncio
 async def test_smart_queue_generation(mock_yt_service):
@@ -28,3 +31,111 @@ async def test_smart_queue_generation(mock_yt_service):
     assert "old1" not in ids
     assert "next1" in ids
     assert "next2" in ids
+
+@pytest.mark.asyncio
+async def test_home_recommendations_hydrated_from_catalog(mocker):
+    """
+    ALS recommendation IDs are turned into songs via the catalog, not YouTube searches.
+    """
+    service = RecService()
+    await cache.delete("home:uid1")
+    mocker.patch("app.services.rec_service.user_service.get_user_profile", AsyncMock(return_value={}))
+    mocker.patch("app.services.rec_service.user_service.get_recent_history", AsyncMock(return_value=[]))
+    mocker.patch("app.services.rec_service.ml_service.get_recommendations", return_value=["v2", "v1"])
+    mocker.patch("app.services.rec_service.catalog_service.get_many", AsyncMock(return_value={
+        "v1": {"id": "v1", "title": "One"},
+        "v2": {"id": "v2", "title": "Two"},
+    }))
+    mocker.patch("app.services.rec_service.trending_service.get_trending", AsyncMock(return_value=[]))
+    search = mocker.patch("app.services.rec_service.yt_service.search_videos", AsyncMock(return_value=[]))
+
+    home = await service.get_home_recommendations("uid1")
+
+    assert [s["id"] for s in home["made_for_you"]] == ["v2", "v1"]
+    search.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_home_sections_concurrent_with_timeouts(mocker):
+    """
+    A slow section comes back empty without holding up the rest; complete pages are cached per user.
+    """
+    service = RecService()
+    await cache.delete("home:uid2")
+    mocker.patch("app.services.rec_service.settings.HOME_SECTION_TIMEOUT", 0.2)
+
+    async def slow_history(uid, limit=10):
+        await asyncio.sleep(1)
+        return [{"id": "h1"}]
+
+    history = mocker.patch("app.services.rec_service.user_service.get_recent_history", side_effect=slow_history)
+    mocker.patch("app.services.rec_service.user_service.get_user_profile",
+                 AsyncMock(return_value={"onboarding": {"country": "India", "artists": ["A"]}}))
+    mocker.patch("app.services.rec_service.ml_service.get_recommendations", return_value=[])
+    mocker.patch("app.services.rec_service.yt_service.search_videos", AsyncMock(return_value=[{"id": "mix1"}]))
+    trending = mocker.patch("app.services.rec_service.trending_service.get_trending",
+                            AsyncMock(return_value=[{"id": "t1"}]))
+
+    start = asyncio.get_running_loop().time()
+    home = await service.get_home_recommendations("uid2")
+    assert asyncio.get_running_loop().time() - start < 0.5
+
+    assert home == {"jump_back_in": [], "made_for_you": [{"id": "mix1"}], "trending": [{"id": "t1"}]}
+    trending.assert_awaited_once_with("India", limit=10)
+    # Degraded pages aren't cached
+    assert await cache.get("home:uid2") is None
+
+    history.side_effect = None
+    history.return_value = [{"id": "h1"}]
+    home = await service.get_home_recommendations("uid2")
+    assert home["jump_back_in"] == [{"id": "h1"}]
+    assert await service.get_home_recommendations("uid2") == home
+    assert history.await_count == 2
+    await cache.delete("home:uid2")
+
+@pytest.mark.asyncio
+async def test_new_history_invalidates_home_cache(mocker):
+    """
+    Playing a song drops the user's cached home view.
+    """
+    from app.services.user_service import user_service
+
+    await cache.set("home:uid3", {"jump_back_in": []}, ttl=60)
+    await user_service.add_to_history("uid3", {"id": "v1"})
+    assert await cache.get("home:uid3") is None
+
+@pytest.mark.asyncio
+async def test_smart_queue_uses_similarity(mocker):
+    """
+    Known seeds are queued from item similarity plus the catalog; seeds the
+    model doesn't know from content similarity, and the search heuristic
+    only runs when neither finds anything.
+    """
+    service = RecService()
+    similar = mocker.patch("app.services.rec_service.similarity_service.similar_items", return_value=["s1", "s2"])
+    mocker.patch("app.services.rec_service.catalog_service.get_many", AsyncMock(return_value={
+        "s1": {"id": "s1", "title": "One", "artist": "A"},
+        "s2": {"id": "s2", "title": "Two", "artist": "B"},
+    }))
+    search = mocker.patch("app.services.rec_service.yt_service.search_videos", AsyncMock(return_value=[
+        {"id": "r1", "title": "Radio", "artist": "C"},
+    ]))
+
+    queue = await service.generate_smart_queue({"id": "seed", "title": "T", "artist": "A"}, [{"id": "old"}])
+    assert [s["id"] for s in queue] == ["s1", "s2"]
+    assert similar.call_args.kwargs["exclude"] == {"old"}
+    search.assert_not_awaited()
+
+    # Unknown to the model: nearest catalog titles, then the search
+    similar.return_value = None
+    content = mocker.patch("app.services.rec_service.ml_service.get_content_similarity",
+                           AsyncMock(return_value=["s2"]))
+    queue = await service.generate_smart_queue({"id": "unknown", "title": "T", "artist": "A"}, [{"id": "old"}])
+    assert [s["id"] for s in queue] == ["s2"]
+    assert content.call_args.args == ("T", "A")
+    assert content.call_args.kwargs["exclude"] == {"old", "unknown"}
+    search.assert_not_awaited()
+
+    content.return_value = []
+    queue = await service.generate_smart_queue({"id": "unknown", "title": "T", "artist": "A"}, [])
+    assert [s["id"] for s in queue] == ["r1"]
+    search.assert_awaited_once()
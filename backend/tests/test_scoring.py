@@ -0,0 +1,52 @@
+import json
+import numpy as np
+from app.utils.scoring import VideoScorer
+
+ENTRIES = [
+    {"title": "Song Name (Official Audio)", "duration": 200, "uploader": "Artist - Topic"},
+    {"title": "SONG NAME REACTION | Trailer", "duration": 45, "uploader": "Reacts"},
+    {"title": "Song 8D Audio slowed + reverb", "duration": 900, "uploader": "Lofi VEVO Records"},
+    {"title": "Covereaction", "duration": 0, "uploader": ""},
+    {"title": "", "duration": None, "uploader": None},
+]
+
+def test_matches_original_scores():
+    """
+    Nested ("audio" in "official audio") and overlapping keywords count like the old substring checks.
+    """
+    scorer = VideoScorer()
+
+    # +10 official audio, +10 audio, +10 duration, +5 topic channel
+    assert scorer.score("Song Name (Official Audio)", 200, "Artist - Topic") == 35
+    # -50 reaction, -50 trailer, -20 short
+    assert scorer.score("SONG NAME REACTION | Trailer", 45, "Reacts") == -120
+    # "cover" and "reaction" share the "r"
+    assert scorer.score("Covereaction", 0, "") == -100
+    # One channel bonus even when several channel keywords match
+    assert scorer.score("Song", 300, "Lofi VEVO Records") == 15
+
+def test_score_many_matches_score():
+    """
+    The batch API returns the same scores as scoring entries one by one.
+    """
+    scorer = VideoScorer()
+    expected = [scorer.score(e["title"], e["duration"], e["uploader"]) for e in ENTRIES]
+
+    scores = scorer.score_many(ENTRIES + ENTRIES)
+
+    assert isinstance(scores, np.ndarray)
+    assert scores.tolist() == expected + expected
+
+def test_weights_from_file(tmp_path):
+    """
+    A keywords file replaces the built-in weights for the sections it defines.
+    """
+    path = tmp_path / "keywords.json"
+    path.write_text(json.dumps({"title": {"Live": -30, "live at": -5}}))
+    scorer = VideoScorer.from_file(str(path))
+
+    # Both "live" and "live at" match at the same position
+    assert scorer.score("Live at Wembley", 0, "") == -35
+    assert scorer.score("Song (Official Audio)", 0, "") == 0
+    assert scorer.score("Song", 0, "Artist - Topic") == 5
+    assert VideoScorer.from_file(str(tmp_path / "missing.json")).score("Song Audio", 0, "") == 10
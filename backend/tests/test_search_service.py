@@ -1,5 +1,7 @@
 import pytest
+from unittest.mock import AsyncMock
 from app.services.search_service import SearchService, search_service
+from app.utils.cache import cache
 
 @pytest.mark.asyncio
 async def test_search_service_search(mock_yt_service):
@@ -37,3 +39,56 @@ def test_deduplication_logic():
     
     # Different song
     assert service._is_duplicate({"id": "3", "title": "Song B", "artist": "Artist A", "duration": 180}, existing) == False
+
+@pytest.mark.asyncio
+async def test_search_results_cached_by_normalized_query(mocker):
+    """
+    Repeat queries differing only in case/whitespace are served from one cache entry.
+    """
+    service = SearchService()
+    live_search = mocker.patch(
+        "app.services.search_service.yt_service.search_videos",
+        AsyncMock(return_value=[
+            {"id": "a", "title": "Song A", "duration": 180},
+            {"id": "b", "title": "Song A (Official Audio)", "duration": 181},
+            {"id": "c", "title": "Song C", "duration": 200},
+        ]),
+    )
+    await cache.delete("search:artist name")
+
+    first = await service.search("Artist  Name", limit=1)
+    second = await service.search(" artist name ", limit=5)
+
+    assert live_search.call_count == 1
+    live_search.assert_called_with("artist name", limit=50)
+    assert [r["id"] for r in first["results"]] == ["a"]
+    assert [r["id"] for r in second["results"]] == ["a", "c"]
+    assert service.stats == {"hits": 1, "misses": 1, "refreshes": 0}
+
+@pytest.mark.asyncio
+async def test_search_stream_sends_early_results_then_final(mocker):
+    """
+    Streaming search emits acceptable results as they arrive, then the re-ranked, cached list.
+    """
+    service = SearchService()
+
+    async def fake_iter_search(query, fetch_limit=50):
+        yield {"id": "a", "title": "Song A", "duration": 180, "score": 10}
+        yield {"id": "b", "title": "Song A", "duration": 182, "score": 25}
+        yield {"id": "c", "title": "Song C live", "duration": 200, "score": -5}
+        yield {"id": "d", "title": "Song D", "duration": 210, "score": 15}
+
+    mocker.patch("app.services.search_service.yt_service.iter_search", side_effect=fake_iter_search)
+    await cache.delete("search:streaming query")
+
+    events = [e async for e in service.search_stream("Streaming  Query", limit=5)]
+
+    # Duplicates and low scores are held back from the early events
+    assert [e["result"]["id"] for e in events if e["type"] == "result"] == ["a", "d"]
+    final = events[-1]
+    assert final["type"] == "final"
+    assert [r["id"] for r in final["results"]] == ["b", "d", "c"]
+
+    # The non-streaming search now hits the same cache entry
+    cached = await service.search("streaming query", limit=5)
+    assert [r["id"] for r in cached["results"]] == ["b", "d", "c"]
@@ -0,0 +1,56 @@
+import numpy as np
+from app.services.similarity_service import SimilarityService
+from app.utils.factor_store import export_factors, load_factors
+from app.utils.ivf_index import IVFIndex, normalize, top_k_cosine
+
+def _clustered(n_clusters=20, per_cluster=50, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, dim))
+    return np.repeat(centers, per_cluster, axis=0) + 0.1 * rng.normal(size=(n_clusters * per_cluster, dim))
+
+def test_ivf_recall_against_exact():
+    """
+    Probing a handful of lists finds (nearly) the same neighbours as brute force.
+    """
+    vectors = _clustered().astype(np.float32)
+    norms = np.linalg.norm(vectors, axis=1)
+    index = IVFIndex.build(vectors, n_lists=20)
+    assert index.offsets[-1] == len(vectors)
+
+    hits = total = 0
+    for q in range(0, len(vectors), 37):
+        exact, _ = top_k_cosine(vectors, norms, vectors[q], 10, exclude=[q])
+        approx, _ = top_k_cosine(vectors, norms, vectors[q], 10,
+                                 rows=index.candidates(normalize(vectors[q]), 4), exclude=[q])
+        hits += len(set(exact) & set(approx))
+        total += len(exact)
+    assert hits / total >= 0.95
+
+def test_similar_items_exact_and_ivf(tmp_path, mocker):
+    """
+    Small models are searched exactly, large ones via the exported IVF index;
+    unknown seeds return None so callers can fall back.
+    """
+    vectors = _clustered(n_clusters=5, per_cluster=20)
+    ids = [f"v{i}" for i in range(len(vectors))]
+    root = str(tmp_path / "als")
+    export_factors(root, ["u1"], ids, np.ones((1, vectors.shape[1])), vectors,
+                   extra_arrays=IVFIndex.build(vectors, n_lists=5).arrays())
+    factors = load_factors(root)
+    assert factors.ivf is not None
+    mocker.patch("app.services.similarity_service.ml_service.current_factors", return_value=factors)
+
+    service = SimilarityService()
+    exact = service.similar_items("v0", n=10, exclude=["v1"])
+    assert len(exact) == 10
+    assert "v0" not in exact and "v1" not in exact
+    # Neighbours come from v0's own cluster (rows 0-19)
+    assert all(int(v[1:]) < 20 for v in exact)
+
+    mocker.patch("app.services.similarity_service.settings.SIMILARITY_EXACT_MAX_ITEMS", 10)
+    approx = service.similar_items("v0", n=10, exclude=["v1"])
+    assert set(approx) == set(exact)
+    assert service.stats["exact"] == 1 and service.stats["ivf"] == 1
+
+    assert service.similar_items("nope") is None
+    assert service.stats["unknown_seed"] == 1
@@ -0,0 +1,104 @@
+import asyncio
+import sys
+import pytest
+import pytest_asyncio
+from app.services.training_service import STATUS_KEY, TRAIN_LOCK, TrainingService
+from app.utils.cache import cache
+
+FAKE_WORKER = """
+import json, sys, time
+print(json.dumps({"stage": "reading", "interactions": 10}), flush=True)
+time.sleep(float(sys.argv[1]))
+print("not json", flush=True)
+print(json.dumps({"stage": "done", "version": "v-new", "seconds": 1.5}), flush=True)
+"""
+
+def fake_spawn(seconds: float):
+    async def spawn():
+        return await asyncio.create_subprocess_exec(
+            sys.executable, "-c", FAKE_WORKER, str(seconds), stdout=asyncio.subprocess.PIPE)
+    return spawn
+
+@pytest_asyncio.fixture
+async def clean_training():
+    await cache.delete(STATUS_KEY)
+    cache.memory_locks.pop(TRAIN_LOCK, None)
+    yield
+    await cache.delete(STATUS_KEY)
+    cache.memory_locks.pop(TRAIN_LOCK, None)
+
+@pytest.mark.asyncio
+async def test_one_leader_trains_and_workers_reload(mocker, clean_training):
+    """
+    Only the lease holder trains; the new version is reloaded here and announced to other workers.
+    """
+    reload = mocker.patch("app.services.training_service.ml_service.reload")
+    publish = mocker.patch("app.services.training_service.cache.publish")
+    leader, follower = TrainingService(), TrainingService()
+    mocker.patch.object(leader, "_spawn", fake_spawn(0.3))
+    follower_spawn = mocker.patch.object(follower, "_spawn")
+
+    run = asyncio.create_task(leader.run_if_due(force=True))
+    await asyncio.sleep(0.15)
+    assert (await cache.get(STATUS_KEY))["state"] == "running"
+    assert await follower.run_if_due(force=True) is None
+    follower_spawn.assert_not_called()
+
+    result = await run
+    assert result == {"version": "v-new", "seconds": 1.5}
+    status = await cache.get(STATUS_KEY)
+    assert status["state"] == "succeeded" and status["version"] == "v-new" and status["exit_code"] == 0
+    reload.assert_called_once_with("v-new")
+    publish.assert_awaited_once()
+    # Lease released for the next run
+    assert TRAIN_LOCK not in cache.memory_locks
+
+@pytest.mark.asyncio
+async def test_lost_lease_kills_training(mocker, clean_training):
+    """
+    If the lease can't be renewed the training process is stopped and the run marked failed.
+    """
+    mocker.patch("app.services.training_service.settings.ML_TRAIN_LEASE_TTL", 0.3)
+    mocker.patch("app.services.training_service.cache.extend_lock", return_value=False)
+    reload = mocker.patch("app.services.training_service.ml_service.reload")
+    service = TrainingService()
+    mocker.patch.object(service, "_spawn", fake_spawn(30))
+
+    assert await asyncio.wait_for(service.run_if_due(force=True), 5) is None
+    assert service.stats["lease_lost"] == 1
+    assert (await cache.get(STATUS_KEY))["state"] == "failed"
+    reload.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_due_only_when_model_is_stale(mocker, clean_training):
+    """
+    Training is due when the model is older than ML_TRAIN_INTERVAL, with failed runs spaced out.
+    """
+    factors = mocker.MagicMock(meta={"trained_at": 0})
+    mocker.patch("app.services.training_service.ml_service.current_factors", return_value=factors)
+    service = TrainingService()
+    assert await service.is_due()
+
+    await service._set_status(state="failed", finished_at=10**12)
+    assert not await service.is_due()
+
+    factors.meta["trained_at"] = 10**12
+    await cache.delete(STATUS_KEY)
+    assert not await service.is_due()
+
+def test_child_env_caps_threads(mocker):
+    mocker.patch("app.services.training_service.settings.ML_TRAIN_THREADS", 3)
+    env = TrainingService._child_env()
+    assert env["OMP_NUM_THREADS"] == env["OPENBLAS_NUM_THREADS"] == "3"
+
+def test_worker_limits_itself(mocker):
+    from app.jobs import train
+    mocker.patch("app.jobs.train.settings.ML_TRAIN_NICE", 5)
+    mocker.patch("app.jobs.train.settings.ML_TRAIN_MAX_CPU_SECONDS", 600)
+    mocker.patch("app.jobs.train.os.getpriority", return_value=0)
+    setpriority = mocker.patch("app.jobs.train.os.setpriority")
+    setrlimit = mocker.patch("app.jobs.train.resource.setrlimit")
+    train._limit_self()
+    assert setpriority.call_count >= 1
+    assert {call.args[2] for call in setpriority.call_args_list} == {5}
+    setrlimit.assert_called_once_with(train.resource.RLIMIT_CPU, (600, 600))
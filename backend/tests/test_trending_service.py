@@ -0,0 +1,71 @@
+import pytest
+import pytest_asyncio
+from unittest.mock import AsyncMock, PropertyMock
+from app.services.trending_service import TrendingService
+from app.utils.cache import cache
+
+@pytest_asyncio.fixture
+async def clean_trending():
+    for key in ("trending:global", "trending:india"):
+        await cache.delete(key)
+    yield
+    for key in ("trending:global", "trending:india"):
+        await cache.delete(key)
+
+@pytest.mark.asyncio
+async def test_snapshot_shared_and_kept_on_failure(mocker, clean_trending):
+    """
+    One search builds the snapshot everyone reads; a failed refresh keeps the old one.
+    """
+    mocker.patch("app.services.trending_service.settings.TRENDING_COUNTRIES", "India")
+    search = mocker.patch(
+        "app.services.trending_service.yt_service.search_videos",
+        AsyncMock(return_value=[{"id": "t1"}, {"id": "t2"}]),
+    )
+    service = TrendingService()
+
+    assert [s["id"] for s in await service.get_trending(None, limit=1)] == ["t1"]
+    assert [s["id"] for s in await service.get_trending("Narnia")] == ["t1", "t2"]
+    assert search.await_count == 1
+
+    search.return_value = []
+    await service.refresh_region("global")
+    assert [s["id"] for s in await service.get_trending(None)] == ["t1", "t2"]
+    assert service.stats["refresh_failures"] == 1
+
+    # Configured countries get their own shelf
+    search.return_value = [{"id": "in1"}]
+    assert [s["id"] for s in await service.get_trending(" india ")] == ["in1"]
+    search.assert_awaited_with("Top 50 Music india", limit=50)
+
+@pytest.mark.asyncio
+async def test_refresh_skipped_while_another_worker_holds_the_lock(mocker, clean_trending):
+    """
+    Only the lock holder refreshes, and only snapshots that are due.
+    """
+    search = mocker.patch("app.services.trending_service.yt_service.search_videos", AsyncMock(return_value=[{"id": "t1"}]))
+    service = TrendingService()
+
+    token = await cache.acquire_lock("trending:refresh", 5000)
+    await service.refresh_all()
+    search.assert_not_awaited()
+    await cache.release_lock("trending:refresh", token)
+
+    await service.refresh_all()
+    await service.refresh_all()  # Fresh snapshot: nothing due
+    assert search.await_count == 1
+
+@pytest.mark.asyncio
+async def test_snapshot_ttl_is_whole_seconds(mocker, clean_trending):
+    """
+    Redis SETEX rejects float TTLs, which would leave the snapshot in one worker's memory.
+    """
+    mocker.patch("app.services.trending_service.settings.TRENDING_REFRESH_INTERVAL", 1800.0)
+    mocker.patch("app.services.trending_service.yt_service.search_videos", AsyncMock(return_value=[{"id": "t1"}]))
+    mocker.patch.object(type(cache), "use_redis", new_callable=PropertyMock, return_value=True)
+    redis = mocker.patch.object(cache, "_redis", AsyncMock())
+
+    await TrendingService().refresh_region("global")
+    setex = next(c for c in redis.await_args_list if c.args[0] == "setex")
+    assert setex.args[1] == "trending:global"
+    assert type(setex.args[2]) is int
@@ -0,0 +1,251 @@
+import asyncio
+import threading
+import time
+import pytest
+from unittest.mock import AsyncMock
+from app.services.yt_service import YTService
+from app.utils.cache import cache
+from app.utils.circuit_breaker import CircuitOpenError
+
+def _fake_info(video_id="v1"):
+    return {
+        "url": f"https://rr1---sn-test.googlevideo.com/videoplayback?id={video_id}",
+        "duration": 180,
+        "title": "Test Song",
+        "uploader": "Test Artist",
+        "thumbnail": "https://i.ytimg.com/test.jpg",
+    }
+
+@pytest.fixture
+def fake_extractor(mocker):
+    calls = []
+
+    async def fake_run(kind, fn, profile, opts, url, *args, **kwargs):
+        calls.append(url)
+        await asyncio.sleep(0.05)
+        return _fake_info(url.rsplit("=", 1)[-1])
+
+    mocker.patch("app.services.yt_service.extraction_executor.run", side_effect=fake_run)
+    return calls
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_extraction(fake_extractor):
+    """
+    Concurrent cache misses for one video trigger a single extraction.
+    """
+    service = YTService()
+    await cache.delete("yt_audio:coalesce1")
+
+    results = await asyncio.gather(*[service.get_stream_url("coalesce1") for _ in range(10)])
+
+    assert len(fake_extractor) == 1
+    assert all(r["video_id"] == "coalesce1" for r in results)
+    # Callers get independent copies
+    results[0]["title"] = "changed"
+    assert results[1]["title"] == "Test Song"
+    assert service.stream_flight.stats()["shared"] == 9
+
+@pytest.mark.asyncio
+async def test_distributed_lock_waits_for_peer(fake_extractor, mocker):
+    """
+    When another worker holds the extraction lease, we wait for its cached result.
+    """
+    mocker.patch("app.services.yt_service.settings.STREAM_DISTRIBUTED_LOCK", True)
+    service = YTService()
+    cache_key = "yt_audio:peer1"
+    await cache.delete(cache_key)
+
+    token = await cache.acquire_lock(cache_key, 5000)
+    assert token is not None
+
+    async def peer_finishes():
+        await asyncio.sleep(0.1)
+        await cache.set(cache_key, {"video_id": "peer1", "stream_url": "https://peer/url"})
+        await cache.release_lock(cache_key, token)
+
+    result, _ = await asyncio.gather(service.get_stream_url("peer1"), peer_finishes())
+
+    assert result["stream_url"] == "https://peer/url"
+    assert fake_extractor == []
+
+@pytest.mark.asyncio
+async def test_waiters_stop_when_the_lock_holder_fails(fake_extractor, mocker):
+    """
+    Waiters return the holder's negative result as soon as it lands, and a
+    holder that lets go without any result hands the lease to one waiter
+    instead of every waiter sleeping out the lease and extracting.
+    """
+    mocker.patch("app.services.yt_service.settings.STREAM_DISTRIBUTED_LOCK", True)
+    mocker.patch("app.services.yt_service.settings.STREAM_LOCK_POLL_INTERVAL", 0.01)
+    service = YTService()
+    for key in ("yt_audio:peerfail1", "yt_neg:peerfail1", "yt_audio:peerfail2", "yt_neg:peerfail2"):
+        await cache.delete(key)
+
+    token = await cache.acquire_lock("yt_audio:peerfail1", 15000)
+    async def peer_fails():
+        await asyncio.sleep(0.05)
+        await cache.set("yt_neg:peerfail1", {"reason": "unavailable", "error": "gone"}, ttl=60)
+        await cache.release_lock("yt_audio:peerfail1", token)
+
+    started = time.monotonic()
+    result, _ = await asyncio.gather(service._resolve_stream("peerfail1", "yt_audio:peerfail1"), peer_fails())
+    assert result is None
+    assert fake_extractor == []
+    assert time.monotonic() - started < 1
+
+    token = await cache.acquire_lock("yt_audio:peerfail2", 15000)
+    async def peer_gives_up():
+        await asyncio.sleep(0.05)
+        await cache.release_lock("yt_audio:peerfail2", token)
+
+    started = time.monotonic()
+    result, _ = await asyncio.gather(service._resolve_stream("peerfail2", "yt_audio:peerfail2"), peer_gives_up())
+    assert result["video_id"] == "peerfail2"
+    assert len(fake_extractor) == 1
+    assert time.monotonic() - started < 1
+    assert "yt_audio:peerfail2" not in cache.memory_locks
+
+def test_stream_cache_ttl_follows_url_expiry():
+    """
+    TTL tracks the URL's own expiry minus the safety margin and never outlives it.
+    """
+    service = YTService()
+    now = 1_700_000_000
+
+    url = f"https://rr1---sn-test.googlevideo.com/videoplayback?expire={now + 6 * 3600}&id=x"
+    assert service._stream_cache_ttl(url, now) == 6 * 3600 - 300
+
+    # Path-style expiry (manifest URLs)
+    url = f"https://manifest.googlevideo.com/api/manifest/hls/expire/{now + 3600}/id/x"
+    assert service._stream_cache_ttl(url, now) == 3600 - 300
+
+    # Expiring sooner than the margin: keep half of the remaining lifetime
+    url = f"https://rr1---sn-test.googlevideo.com/videoplayback?expire={now + 200}"
+    assert service._stream_cache_ttl(url, now) == 100
+
+    # Already expired: don't cache
+    url = f"https://rr1---sn-test.googlevideo.com/videoplayback?expire={now - 10}"
+    assert service._stream_cache_ttl(url, now) == 0
+
+    # No expiry parameter: default TTL
+    assert service._stream_cache_ttl("https://example.com/audio.m4a", now) == 600
+
+@pytest.mark.asyncio
+async def test_stale_entry_served_while_refreshing(fake_extractor):
+    """
+    Entries inside the stale window are served immediately and refreshed in the background.
+    """
+    service = YTService()
+    now = time.time()
+    await cache.set("yt_audio:stale1", {
+        "video_id": "stale1",
+        "stream_url": "https://old/url",
+        "expires_at": now + 60,
+        "stale_at": now - 1,
+    })
+
+    result = await service.get_stream_url("stale1")
+    assert result["stream_url"] == "https://old/url"
+    assert result["cache_status"] == "stale"
+
+    await asyncio.sleep(0.1)
+    assert len(fake_extractor) == 1
+    refreshed = await service.get_stream_url("stale1")
+    assert refreshed["cache_status"] == "hit"
+    assert "googlevideo" in refreshed["stream_url"]
+    assert service.stream_cache_stats()["refreshes"] == 1
+
+@pytest.mark.asyncio
+async def test_failed_video_is_negative_cached(mocker):
+    """
+    A video that can't be resolved is remembered and not re-extracted on retry.
+    """
+    run = mocker.patch(
+        "app.services.yt_service.extraction_executor.run",
+        AsyncMock(side_effect=Exception("ERROR: [youtube] gone1: Video unavailable")),
+    )
+    service = YTService()
+    await cache.delete("yt_audio:gone1")
+    await cache.delete("yt_neg:gone1")
+
+    assert await service.get_stream_url("gone1") is None
+    assert await service.get_stream_url("gone1") is None
+
+    assert run.await_count == 1
+    assert (await cache.get("yt_neg:gone1"))["reason"] == "unavailable"
+    # A video-specific failure doesn't count against the upstream
+    assert service.breaker.stats()["window_failures"] == 0
+
+@pytest.mark.asyncio
+async def test_open_circuit_fails_fast(mocker):
+    """
+    Once upstream failures trip the breaker, misses fail fast without extracting.
+    """
+    run = mocker.patch(
+        "app.services.yt_service.extraction_executor.run",
+        AsyncMock(side_effect=Exception("HTTP Error 429: Too Many Requests")),
+    )
+    service = YTService()
+    service.breaker.min_calls = 2
+
+    for vid in ("busy1", "busy2"):
+        await cache.delete(f"yt_audio:{vid}")
+        await cache.delete(f"yt_neg:{vid}")
+        assert await service.get_stream_url(vid) is None
+    assert service.breaker.state == "open"
+
+    await cache.delete("yt_audio:busy3")
+    with pytest.raises(CircuitOpenError):
+        await service.get_stream_url("busy3")
+    assert run.await_count == 2
+
+@pytest.mark.asyncio
+async def test_batch_yields_cache_hits_then_resolved_misses(fake_extractor, mocker):
+    """
+    Batch resolution reads hits with one MGET and resolves only the misses.
+    """
+    service = YTService()
+    await cache.set("yt_audio:batch1", {"video_id": "batch1", "stream_url": "https://cached/url"})
+    await cache.delete("yt_audio:batch2")
+    await cache.delete("yt_neg:batch2")
+    mget = mocker.spy(cache, "mget")
+
+    results = [r async for r in service.get_stream_urls(["batch1", "batch2", "batch1"])]
+
+    assert mget.call_count == 1
+    assert [vid for vid, _, _ in results] == ["batch1", "batch2"]
+    assert results[0][1]["cache_status"] == "hit"
+    assert results[1][1]["cache_status"] == "miss"
+    assert fake_extractor == ["https://www.youtube.com/watch?v=batch2"]
+
+@pytest.mark.asyncio
+async def test_iter_search_yields_before_extraction_finishes(mocker):
+    """
+    Streaming search hands out candidates while yt-dlp is still producing entries.
+    """
+    service = YTService()
+    first_seen = threading.Event()
+
+    def worker(emit):
+        emit({"id": "a", "title": "Song A (Official Audio)", "duration": 200, "uploader": "Artist - Topic",
+              "thumbnails": [{"url": "small.jpg"}, {"url": "large.jpg"}]})
+        # Only continues once the consumer got the first result
+        assert first_seen.wait(2)
+        emit({"id": "b", "title": "Song A reaction", "duration": 200, "uploader": "Someone"})
+        emit({"id": "c", "title": "Song C", "duration": 190, "uploader": "Artist"})
+        return 3
+
+    async def fake_run(kind, fn, profile, opts, url, emit, *args, **kwargs):
+        return await asyncio.to_thread(worker, emit)
+
+    mocker.patch("app.services.yt_service.extraction_executor.run", side_effect=fake_run)
+
+    results = []
+    async for candidate in service.iter_search("song a"):
+        results.append(candidate)
+        first_seen.set()
+
+    # The reaction video is filtered out by scoring
+    assert [r["id"] for r in results] == ["a", "c"]
+    assert results[0]["thumbnail"] == "large.jpg"
+    assert service.breaker.stats()["window_calls"] == 1
@@ -0,0 +1,44 @@
+import pytest
+from unittest.mock import MagicMock
+from app.utils.ytdl import YDLPool
+
+def test_pool_reuses_and_recycles_instances():
+    """
+    Instances are reused across leases and recycled after max_uses or an error.
+    """
+    factory = MagicMock(side_effect=lambda opts: MagicMock())
+    pool = YDLPool({"quiet": True}, max_uses=2, max_idle=4, factory=factory)
+
+    with pool.lease() as first:
+        pass
+    with pool.lease() as second:
+        pass
+    assert first is second
+    # Second use hit max_uses, so the next lease builds a new instance
+    with pool.lease() as third:
+        pass
+    assert third is not first
+    first.close.assert_called_once()
+
+    with pytest.raises(RuntimeError):
+        with pool.lease() as failing:
+            raise RuntimeError("extractor blew up")
+    failing.close.assert_called_once()
+
+    assert pool.stats() == {"idle": 0, "created": 2, "reused": 2, "recycled": 2}
+
+
+def test_failed_extraction_retires_the_instance(mocker):
+    """
+    With ignoreerrors, yt-dlp returns None instead of raising; that instance isn't reused.
+    """
+    from app.utils import ytdl
+    broken = MagicMock()
+    broken.extract_info.return_value = None
+    pool = YDLPool({"ignoreerrors": True}, max_uses=10, max_idle=4, factory=lambda opts: broken)
+    mocker.patch.object(ytdl, "get_pool", return_value=pool)
+
+    assert ytdl.extract_info("search", {}, "ytsearch5:x") is None
+    assert ytdl.iter_entries("search", {}, "ytsearch5:x", emit=lambda entry: True) is None
+    assert broken.close.call_count == 2
+    assert pool.stats() == {"idle": 0, "created": 2, "reused": 0, "recycled": 2}
@@ -1,6 +1,14 @@
+import re
+import unicodedata
+
 def format_duration(seconds: int) -> str:
     m, s = divmod(seconds, 60)
     return f"{m}:{s:02d}"
 
 def clean_search_query(query: str) -> str:
     return query.strip().lower()
+
+def normalize_search_query(query: str) -> str:
+    """Canonical form of a search query, used as the search cache key."""
+    query = unicodedata.normalize("NFKC", query)
+    return re.sub(r"\s+", " ", clean_search_query(query))